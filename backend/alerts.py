@@ -0,0 +1,256 @@
+"""Server-side weather alerts for every monitored district.
+
+The engine takes the hourly forecast of every monitored place (the
+gazetteer's districts), applies threshold rules to whole hourly arrays at
+once and keeps the result, grouped by state, until the next refresh, so
+/api/alerts is a dictionary lookup. Evaluation runs in a worker thread so
+the event loop keeps serving requests meanwhile. numpy (in requirements.txt)
+makes each rule one comparison over a districts x hours matrix; if it is
+missing the same rules run column by column in Python, several times slower,
+and stats() reports "vectorized": false.
+
+A rule fires for a place when at least `min_hours` of the first `hours`
+forecast hours satisfy `variable <op> threshold`. Rules sharing a `group`
+(e.g. heat advisory / extreme heat) report only the most severe one that
+fired. The defaults mirror the thresholds the frontend's WeatherAlerts
+component uses for current conditions; ALERT_RULES_FILE may point to a JSON
+list of rule objects (the AlertRule fields) to replace them.
+"""
+import asyncio
+import json
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback, see stats()["vectorized"]
+    np = None
+
+SEVERITY = {"info": 0, "warning": 1, "danger": 2}
+
+
+class AlertRule:
+    def __init__(self, id, title, variable, threshold, op=">=", severity="warning", group=None,
+                 min_hours=1, message=""):
+        if op not in (">=", "<="):
+            raise ValueError(f"Alert rule {id}: op must be '>=' or '<='")
+        if severity not in SEVERITY:
+            raise ValueError(f"Alert rule {id}: unknown severity {severity!r}")
+        self.id = id
+        self.title = title
+        self.variable = variable  # Open-Meteo hourly variable
+        self.threshold = threshold
+        self.op = op
+        self.severity = severity
+        self.group = group or id
+        self.min_hours = min_hours
+        self.message = message
+
+
+DEFAULT_RULES = [
+    AlertRule("extreme_heat", "Extreme Heat Warning", "temperature_2m", 40, severity="danger", group="heat",
+              message="Temperature exceeds 40°C. Stay indoors, stay hydrated, and avoid direct sunlight."),
+    AlertRule("heat", "Heat Advisory", "temperature_2m", 35, severity="warning", group="heat",
+              message="High temperature expected. Limit outdoor activities and drink plenty of water."),
+    AlertRule("cold", "Cold Weather Alert", "temperature_2m", 5, op="<=", severity="warning",
+              message="Very cold conditions. Dress warmly and protect exposed skin."),
+    AlertRule("heavy_rain", "Heavy Rain Likely", "precipitation_probability", 80, severity="warning", min_hours=3,
+              message="Rain is very likely for several hours. Carry an umbrella and avoid flood-prone areas."),
+    AlertRule("high_wind", "High Wind Warning", "wind_speed_10m", 40, severity="danger", group="wind",
+              message="Strong winds expected. Secure loose objects and avoid outdoor activities."),
+    AlertRule("windy", "Windy Conditions", "wind_speed_10m", 25, severity="info", group="wind", min_hours=3,
+              message="Moderate winds expected. Be cautious with outdoor items."),
+]
+
+
+def load_rules(path=None):
+    """Rules from a JSON file of AlertRule fields, or the defaults."""
+    if not path:
+        return list(DEFAULT_RULES)
+    with open(path, "r", encoding="utf-8") as f:
+        return [AlertRule(**spec) for spec in json.load(f)]
+
+
+def _matches(rule, values, hours):
+    """(count, first, last, peak) of the hours in `values` matching `rule`, pure Python."""
+    count, first, last, peak = 0, None, None, None
+    pick = max if rule.op == ">=" else min
+    for i, v in enumerate(values[:hours]):
+        if v is None or (v < rule.threshold if rule.op == ">=" else v > rule.threshold):
+            continue
+        count += 1
+        if first is None:
+            first = i
+        last = i
+        peak = v if peak is None else pick(peak, v)
+    return count, first, last, None if peak is None else float(peak)
+
+
+def _matrix(columns, hours):
+    """places x hours float matrix of one variable; missing values are nan."""
+    rows = [values[:hours] for values in columns]
+    if all(len(row) == hours for row in rows):
+        return np.array(rows, dtype=float)  # one conversion; None -> nan
+    matrix = np.full((len(rows), hours), np.nan)
+    for i, row in enumerate(rows):
+        if row:
+            matrix[i, :len(row)] = np.array(row, dtype=float)
+    return matrix
+
+
+def _matches_matrix(rule, matrix):
+    """One _matches() tuple per row of `matrix`, as a single numpy comparison."""
+    hours = matrix.shape[1]
+    mask = matrix >= rule.threshold if rule.op == ">=" else matrix <= rule.threshold
+    counts = mask.sum(axis=1)
+    firsts = mask.argmax(axis=1)
+    lasts = hours - 1 - mask[:, ::-1].argmax(axis=1)
+    if rule.op == ">=":
+        peaks = np.where(mask, matrix, -np.inf).max(axis=1)
+    else:
+        peaks = np.where(mask, matrix, np.inf).min(axis=1)
+    return [
+        (int(c), int(f), int(l), float(p)) if c else (0, None, None, None)
+        for c, f, l, p in zip(counts, firsts, lasts, peaks)
+    ]
+
+
+class AlertEngine:
+    def __init__(self, rules, places, fetch_many, hours=168, interval=3600):
+        self.rules = rules
+        self.places = places  # () -> [(state, district, lat, lon), ...]
+        # async [(lat, lon), ...] -> [forecast payload, or the exception that replaced it, ...]
+        self.fetch_many = fetch_many
+        self.hours = hours
+        self.interval = interval  # seconds between refreshes
+        self.generated_at = None
+        self.elapsed_ms = None
+        self.evaluated = 0
+        self.unavailable = 0  # places skipped in the last refresh because their fetch failed
+        self.refreshes = 0
+        self.errors = 0
+        self._by_state = {}  # state (lower-case) -> {"state", "districts": [...]}
+        self._refreshing = None
+        self._task = None
+
+    def evaluate(self, places, payloads):
+        """{state_key: {"state", "districts"}} for the places with at least one alert."""
+        hourly = [p.get("hourly") or {} for p in payloads]
+        # rule -> one (count, first, last, peak) per place
+        results = {}
+        matrices = {}  # variable -> matrix, shared by the rules on that variable
+        for rule in self.rules:
+            columns = [h.get(rule.variable) or [] for h in hourly]
+            if np is not None and columns:
+                if rule.variable not in matrices:
+                    matrices[rule.variable] = _matrix(columns, self.hours)
+                results[rule] = _matches_matrix(rule, matrices[rule.variable])
+            else:
+                results[rule] = [_matches(rule, values, self.hours) for values in columns]
+
+        by_state = {}
+        for i, (state, district, lat, lon) in enumerate(places):
+            fired = {}
+            for rule in self.rules:
+                count, first, last, peak = results[rule][i]
+                if count < rule.min_hours:
+                    continue
+                best = fired.get(rule.group)
+                if best is not None and SEVERITY[best[0].severity] >= SEVERITY[rule.severity]:
+                    continue
+                fired[rule.group] = (rule, count, first, last, peak)
+            if not fired:
+                continue
+            times = hourly[i].get("time") or []
+            alerts = [
+                {
+                    "id": rule.id,
+                    "title": rule.title,
+                    "severity": rule.severity,
+                    "message": rule.message,
+                    "variable": rule.variable,
+                    "threshold": rule.threshold,
+                    "peak": peak,
+                    "hours": count,
+                    "start": times[first] if first < len(times) else None,
+                    "end": times[last] if last < len(times) else None,
+                }
+                for rule, count, first, last, peak in fired.values()
+            ]
+            alerts.sort(key=lambda a: (-SEVERITY[a["severity"]], a["start"] or ""))
+            entry = by_state.setdefault(state.strip().lower(), {"state": state, "districts": []})
+            entry["districts"].append({"district": district, "latitude": lat, "longitude": lon, "alerts": alerts})
+        return by_state
+
+    async def refresh(self):
+        """Fetch every monitored place's forecast and recompute all alerts."""
+        places = list(self.places())
+        payloads = await self.fetch_many([(p[2], p[3]) for p in places]) if places else []
+        fetched = [(place, p) for place, p in zip(places, payloads) if not isinstance(p, Exception)]
+        if places and not fetched:
+            raise payloads[0]  # nothing to go on; keep the previous results
+        self.unavailable = len(places) - len(fetched)
+        places, payloads = [f[0] for f in fetched], [f[1] for f in fetched]
+        started = time.perf_counter()
+        self._by_state = await asyncio.to_thread(self.evaluate, places, payloads)
+        self.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.evaluated = len(places)
+        self.generated_at = time.time()
+        self.refreshes += 1
+
+    async def _shared_refresh(self):
+        # The background loop and on-demand callers share one refresh at a time
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self.refresh())
+        await asyncio.shield(self._refreshing)
+
+    async def ensure_fresh(self):
+        """Refresh now if there are no results yet or they are older than `interval`."""
+        if self.generated_at is None or self.expires_in() <= 0:
+            await self._shared_refresh()
+
+    def for_state(self, state=None):
+        """Districts with alerts in `state` (any case), or in every state."""
+        if state is None:
+            return [d for entry in self._by_state.values() for d in entry["districts"]]
+        entry = self._by_state.get(state.strip().lower())
+        return entry["districts"] if entry else []
+
+    def expires_in(self):
+        if self.generated_at is None:
+            return 0
+        return max(0, self.generated_at + self.interval - time.time())
+
+    async def _loop(self):
+        while True:
+            try:
+                await self._shared_refresh()
+            except Exception as e:
+                self.errors += 1
+                print(f"Alert refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "rules": len(self.rules),
+            "vectorized": np is not None,
+            "places": self.evaluated,
+            "unavailable": self.unavailable,
+            "states_with_alerts": len(self._by_state),
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "last_evaluation_ms": self.elapsed_ms,
+            "generated_at": self.generated_at,
+        }
@@ -0,0 +1,238 @@
+"""Load test for the API against local upstream stand-ins (mock_upstreams.py).
+
+Each scenario drives one endpoint at a fixed concurrency, with traffic
+skewed toward a few popular places like real usage. It reports throughput,
+latency percentiles, status codes and how many calls reached each upstream.
+Every scenario runs against a freshly imported app, so no cache, index,
+circuit breaker, concurrency limit or counter carries over from the one
+before: each starts cold. Run from backend/:
+
+    python bench_load.py                                # every scenario
+    python bench_load.py current by-region -c 100 -n 5000
+    python bench_load.py hourly --latency 200 --error-rate 0.05
+    python bench_load.py ai --openai                    # exercise the OpenAI path too
+
+By default the app runs in-process with its outbound calls answered by the
+stand-ins (no sockets, no internet). With --url the same traffic is sent to
+a running server instead; upstream counts are then not available.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from mock_upstreams import Places
+
+QUESTIONS = [
+    "Will it rain today?",
+    "What should I wear?",
+    "How windy is it?",
+    "Is it a good day for a picnic?",
+    "how hot is it",
+    "do I need an umbrella this evening",
+]
+
+
+class Workload:
+    """Request generators for each scenario, with Zipf-like place popularity."""
+
+    def __init__(self, places, locations, seed):
+        self.rng = random.Random(seed)
+        self.places = places.places[:]
+        self.rng.shuffle(self.places)
+        self.places = self.places[:locations]
+        self.weights = [1 / (rank + 1) for rank in range(len(self.places))]
+
+    def place(self):
+        return self.rng.choices(self.places, self.weights)[0]
+
+    def coords(self):
+        lat, lon = Places.coords(*self.place())
+        # Jitter within the forecast cache grid cell, like GPS fixes do
+        return round(lat + self.rng.uniform(-0.004, 0.004), 5), round(lon + self.rng.uniform(-0.004, 0.004), 5)
+
+    def current(self):
+        lat, lon = self.coords()
+        return "GET", f"/api/weather/current?lat={lat}&lon={lon}", None
+
+    def hourly(self):
+        lat, lon = self.coords()
+        return "GET", f"/api/weather/hourly?lat={lat}&lon={lon}&hours=168", None
+
+    def hourly_columnar(self):
+        lat, lon = self.coords()
+        return "GET", f"/api/weather/hourly?lat={lat}&lon={lon}&hours=168&format=columnar", None
+
+    def by_region(self):
+        name, state = self.place()
+        district = "" if name == state else f"&district={name}"
+        return "GET", f"/api/weather/by-region?state={state}{district}", None
+
+    def batch(self):
+        locations = []
+        for _ in range(20):
+            lat, lon = self.coords()
+            locations.append({"lat": lat, "lon": lon})
+        return "POST", "/api/weather/batch", {"locations": locations}
+
+    def suggest(self):
+        name, state = self.place()
+        return "GET", f"/api/geocode/suggest?state={state}&q={name[:self.rng.randint(3, 5)]}", None
+
+    def ai(self):
+        lat, lon = self.coords()
+        return "POST", "/api/ai/query", {"query": self.rng.choice(QUESTIONS), "lat": lat, "lon": lon}
+
+
+SCENARIOS = {
+    "current": Workload.current,
+    "hourly": Workload.hourly,
+    "hourly-columnar": Workload.hourly_columnar,
+    "by-region": Workload.by_region,
+    "batch": Workload.batch,
+    "suggest": Workload.suggest,
+    "ai": Workload.ai,
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+async def drive(client, make_request, total, concurrency):
+    latencies = []
+    statuses = Counter()
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            method, path, body = make_request()
+            started = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                statuses[r.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), statuses
+
+
+def report(name, elapsed, latencies, statuses, upstream_calls=None):
+    ms = lambda p: percentile(latencies, p) * 1000
+    print(f"\n== {name}: {len(latencies)} requests in {elapsed:.2f}s, {len(latencies) / elapsed:.0f} req/s")
+    print(f"   latency ms  p50 {ms(50):7.1f}  p95 {ms(95):7.1f}  p99 {ms(99):7.1f}  max {latencies[-1] * 1000:7.1f}")
+    print(f"   status      {dict(sorted(statuses.items(), key=str))}")
+    if upstream_calls is not None:
+        print(f"   upstream    {dict(upstream_calls) or 'none'}")
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(ms(50), 2),
+        "p95_ms": round(ms(95), 2),
+        "p99_ms": round(ms(99), 2),
+        "status": {str(k): v for k, v in statuses.items()},
+        "upstream_calls": dict(upstream_calls) if upstream_calls is not None else None,
+    }
+
+
+async def run(args):
+    workload = Workload(Places(), args.locations, args.seed)
+    names = args.scenarios or list(SCENARIOS)
+    results = []
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=30.0,
+                                     limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            for name in names:
+                results.append(report(name, *await drive(client, lambda: SCENARIOS[name](workload),
+                                                         args.requests, args.concurrency)))
+        return results
+
+    from mock_upstreams import MockUpstreams
+
+    # Keep the bench's geocode results and observations out of data/
+    os.environ["GEOCODE_STORE"] = "memory"
+    os.environ["HISTORY_ENABLED"] = "0"
+
+    mock = MockUpstreams(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                         error_rate=args.error_rate, timeout_rate=args.timeout_rate, seed=args.seed)
+    for name in names:
+        app = fresh_app(mock, args.openai)
+        mock.reset()
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench",
+                                         timeout=30.0) as client:
+                results.append(report(name, *await drive(client, lambda: SCENARIOS[name](workload),
+                                                         args.requests, args.concurrency), mock.calls))
+        finally:
+            await close_app(app)
+    return results
+
+
+def fresh_app(mock, openai):
+    """Import a new copy of main, with upstream state and metrics reset."""
+    import http_clients
+    import metrics
+
+    sys.modules.pop("main", None)
+    # Breakers and limiters outlive clients (and re-imports); start over
+    http_clients._breakers.clear()
+    http_clients._limiters.clear()
+    metrics.REGISTRY.reset()
+    import main
+
+    main.OPENAI_API_KEY = "bench" if openai else None
+    http_clients.open_clients(transport=mock.transport())
+    return main
+
+
+async def close_app(app):
+    import http_clients
+
+    # Let SWR refreshes and other spawned work finish against this scenario's app
+    await asyncio.gather(*app.BACKGROUND_TASKS, return_exceptions=True)
+    await app.GEOCODE_CACHE.flush()
+    await app.NOMINATIM.close()
+    await http_clients.close_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"one or more of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--locations", type=int, default=300, help="distinct places in the traffic mix")
+    parser.add_argument("--latency", type=float, default=80, help="mock upstream base latency, ms")
+    parser.add_argument("--jitter", type=float, default=40, help="extra random upstream latency, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of upstream calls timing out")
+    parser.add_argument("--openai", action="store_true", help="pretend an OpenAI key is set (mocked)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--json", type=Path, help="also write results to this file")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = asyncio.run(run(args))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmark for the rule-based answer engine (rules.py).
+
+Compares the old per-request substring scan with the precompiled intent
+lexicon, then times full rule_based_answer() calls. Run from backend/:
+
+    python bench_rules.py [iterations]
+"""
+import sys
+import time
+
+from rules import INTENT_KEYWORDS, classify, rule_based_answer
+
+# Questions as users actually type them into the assistant
+CORPUS = [
+    "Will it rain today?",
+    "will it rain",
+    "Do I need an umbrella?",
+    "is it going to pour this evening",
+    "Any showers expected this afternoon?",
+    "how hot is it",
+    "What's the temperature right now?",
+    "is it cold outside",
+    "will it get warmer later",
+    "How windy is it?",
+    "is there a breeze near the beach",
+    "what should I wear",
+    "do I need a jacket tonight",
+    "what clothes for office today",
+    "Is it a good day for a picnic?",
+    "can I go out for a run",
+    "good weather for hiking?",
+    "what can we do this weekend",
+    "is it sunny",
+    "will the sky be clear tonight",
+    "how cloudy is it",
+    "what time is sunrise",
+    "should I open the window",
+    "how humid is it",
+    "it feels sticky, why?",
+    "what's the barometric pressure",
+    "how's the weather",
+    "tell me about today's weather",
+    "weather update please",
+    "is it safe to drive",
+    "will it rain while I walk the dog",
+    "cold and windy, what should I wear?",
+]
+
+SAMPLE_WEATHER = {
+    "temperature_2m": 31.4,
+    "apparent_temperature": 35.2,
+    "relative_humidity_2m": 78,
+    "wind_speed_10m": 14.0,
+    "wind_direction_10m": 210,
+    "precipitation": 0.0,
+    "weather_code": 3,
+    "cloud_cover": 64,
+    "pressure_msl": 1006.5,
+}
+SAMPLE_HOURLY = {
+    "temperature_2m": [31.4, 31.9, 32.3, 31.0, 29.6, 28.8, 28.1, 27.7, 27.4, 27.0, 26.8, 26.5],
+    "precipitation_probability": [10, 15, 30, 55, 70, 65, 40, 20, 10, 5, 5, 5],
+}
+
+
+def legacy_classify(question):
+    """What ai_query used to do: rebuild the lists and substring-scan each one."""
+    q = question.lower()
+    keyword_lists = {intent: list(words) for intent, words in INTENT_KEYWORDS.items()}
+    return [intent for intent, words in keyword_lists.items() if any(w in q for w in words)]
+
+
+def bench(label, fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for question in CORPUS:
+            fn(question)
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / (iterations * len(CORPUS)) * 1e6
+    print(f"{label:<28} {per_call:8.2f} us/query")
+    return per_call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{len(CORPUS)} queries x {iterations} iterations\n")
+    old = bench("legacy substring scan", legacy_classify, iterations)
+    new = bench("compiled intent lexicon", classify, iterations)
+    bench("full rule_based_answer", lambda q: rule_based_answer(q.lower(), SAMPLE_WEATHER, SAMPLE_HOURLY), iterations)
+    print(f"\nclassifier speedup: {old / new:.1f}x")
+
+    print("\nIntent changes vs legacy matching:")
+    for question in CORPUS:
+        before = legacy_classify(question)
+        after = [intent for intent, _ in classify(question)]
+        if before[:1] != after[:1]:
+            print(f"  {question!r}: {before} -> {after}")
+
+
+if __name__ == "__main__":
+    main()
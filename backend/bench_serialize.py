@@ -0,0 +1,94 @@
+"""Micro-benchmark for /api/weather/hourly serialization at 168 hours.
+
+Compares the old path (per-hour dicts with bounds checks, then FastAPI's
+jsonable_encoder and the stdlib encoder) with the current one (zipped rows or
+columnar arrays rendered straight through FastJSONResponse). Run from
+backend/:
+
+    python bench_serialize.py [iterations]
+"""
+import json
+import os
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from fast_json import ORJSON_AVAILABLE, FastJSONResponse
+
+os.environ.setdefault("GEOCODE_STORE", "memory")  # don't create data/ just to import main
+os.environ.setdefault("HISTORY_ENABLED", "0")
+from main import hourly_columns, hourly_rows
+
+HOURS = 168
+
+SAMPLE_HOURLY = {
+    "time": [f"2026-10-{18 + i // 24:02d}T{i % 24:02d}:00" for i in range(HOURS)],
+    "temperature_2m": [round(24 + 6 * ((i % 24) / 23), 1) for i in range(HOURS)],
+    "relative_humidity_2m": [60 + i % 30 for i in range(HOURS)],
+    "precipitation_probability": [(i * 7) % 100 for i in range(HOURS)],
+    "weather_code": [(0, 1, 2, 3, 61, 80)[i % 6] for i in range(HOURS)],
+    "wind_speed_10m": [round(8 + (i % 12) * 0.7, 1) for i in range(HOURS)],
+}
+
+
+def legacy_rows(hourly, hours):
+    """What hourly_forecast used to do before returning the list to FastAPI."""
+    times = hourly.get("time", [])
+    temps = hourly.get("temperature_2m", [])
+    humidity = hourly.get("relative_humidity_2m", [])
+    precip_prob = hourly.get("precipitation_probability", [])
+    weather_codes = hourly.get("weather_code", [])
+    wind_speeds = hourly.get("wind_speed_10m", [])
+    forecast = []
+    for i in range(min(len(times), hours)):
+        forecast.append({
+            "time": times[i],
+            "temperature_c": temps[i] if i < len(temps) else None,
+            "humidity": humidity[i] if i < len(humidity) else None,
+            "precipitation_probability": precip_prob[i] if i < len(precip_prob) else None,
+            "weather_code": weather_codes[i] if i < len(weather_codes) else None,
+            "wind_speed_kph": wind_speeds[i] if i < len(wind_speeds) else None,
+        })
+    return forecast
+
+
+def legacy(hourly):
+    body = {"forecast": legacy_rows(hourly, HOURS), "source": "open-meteo"}
+    # Starlette's JSONResponse.render after FastAPI's serialize_response
+    return json.dumps(jsonable_encoder(body), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows(hourly):
+    body = {"forecast": hourly_rows(hourly_columns(hourly, HOURS)), "source": "open-meteo"}
+    return FastJSONResponse(body).body
+
+
+def columnar(hourly):
+    body = {"hourly": hourly_columns(hourly, HOURS), "source": "open-meteo"}
+    return FastJSONResponse(body).body
+
+
+def bench(label, fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(SAMPLE_HOURLY)
+    per_call = (time.perf_counter() - started) / iterations * 1e6
+    size = len(fn(SAMPLE_HOURLY))
+    print(f"{label:<32} {per_call:9.1f} us/response {size:7d} bytes")
+    return per_call
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    encoder = "orjson" if ORJSON_AVAILABLE else "stdlib json (orjson not installed)"
+    print(f"{HOURS} hours x {iterations} iterations, encoder: {encoder}\n")
+    assert json.loads(legacy(SAMPLE_HOURLY)) == json.loads(rows(SAMPLE_HOURLY))
+    old = bench("legacy rows + jsonable_encoder", legacy, iterations)
+    new = bench("zipped rows, direct render", rows, iterations)
+    col = bench("columnar, direct render", columnar, iterations)
+    print(f"\nrows speedup: {old / new:.1f}x, columnar speedup: {old / col:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
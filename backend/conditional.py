@@ -0,0 +1,51 @@
+"""Conditional GET support (ETag / If-None-Match) for weather endpoints.
+
+ETags are derived from what actually determines the body: the upstream
+observation `time`, the snapped location and any response-shaping query
+parameters. A client polling between upstream updates gets an empty 304
+instead of the full payload. `Cache-Control: max-age` is set to the time left
+until the forecast cache entry expires, so browsers and proxies stop asking
+exactly when there could be something new.
+"""
+import hashlib
+
+from fastapi import Response
+
+from fast_json import FastJSONResponse
+
+
+def make_etag(*parts):
+    """Weak ETag over `parts` (the body is re-encoded, so it's not byte-stable)."""
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode("utf-8"), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header against `etag` (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def cache_headers(etag, max_age):
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max(0, int(max_age))}",
+    }
+
+
+def not_modified(request, etag, max_age):
+    """A 304 response if the client already holds `etag`, else None.
+
+    Checked before the body is built, so a matching poll costs no serialization.
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers(etag, max_age))
+    return None
+
+
+def cacheable_json(body, etag, max_age):
+    return FastJSONResponse(body, headers=cache_headers(etag, max_age))
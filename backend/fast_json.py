@@ -0,0 +1,29 @@
+"""Compact JSON responses, encoded with orjson when it is installed.
+
+FastAPI's default path runs every return value through jsonable_encoder and
+then the stdlib encoder. For plain dict/list payloads (all this app returns)
+that walk is pure overhead, so hot endpoints build a `FastJSONResponse`
+directly and it is also the app's default response class.
+"""
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to compact stdlib encoding
+    orjson = None
+
+ORJSON_AVAILABLE = orjson is not None
+
+
+def dumps(content):
+    """Serialize `content` to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
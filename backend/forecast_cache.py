@@ -0,0 +1,109 @@
+"""In-process TTL cache for Open-Meteo forecast responses.
+
+Entries are keyed on coordinates snapped to a grid plus the requested
+variable set, so nearby requests (e.g. everyone in one district) share a
+single upstream fetch. Expiry is aligned to the upstream update interval:
+Open-Meteo refreshes `current` every 15 minutes on the quarter hour, so an
+entry fetched at 10:07 is good until shortly after 10:15, not until 10:22.
+
+Expired entries are kept for up to `max_stale` seconds so callers can serve
+them stale (stale-while-revalidate / stale-if-error) via get_stale().
+"""
+import math
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    def __init__(self, maxsize=2048, interval=900, grace=60, grid=0.01, max_stale=0):
+        self.maxsize = maxsize
+        self.interval = interval  # upstream model update interval (seconds)
+        self.grace = grace  # wait a little past the boundary for new data
+        self.grid = grid
+        self.max_stale = max_stale  # keep expired entries this long for get_stale()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries = OrderedDict()  # key -> (expires_at, fetched_at, data)
+
+    def snap(self, value):
+        """Round a coordinate to the cache grid (e.g. 0.01° ~ 1 km)."""
+        if not self.grid:
+            return value
+        return round(round(value / self.grid) * self.grid, 6)
+
+    def key(self, lat, lon, params):
+        return (self.snap(lat), self.snap(lon), tuple(sorted(params.items())))
+
+    def expiry(self, now=None):
+        now = time.time() if now is None else now
+        boundary = (math.floor(now / self.interval) + 1) * self.interval
+        return boundary + self.grace
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is None or entry[0] <= now:
+            if entry is not None and entry[0] + self.max_stale <= now:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def get_stale(self, key):
+        """Return (data, age, expired_for) for an expired entry still within max_stale, else None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        expired_for = now - entry[0]
+        if expired_for > self.max_stale:
+            del self._entries[key]
+            return None
+        return entry[2], now - entry[1], expired_for
+
+    def expires_in(self, key):
+        """Seconds until `key` expires (negative once stale), or None if absent."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0] - time.time()
+
+    def expires_at(self, key):
+        """Epoch time `key` expires at, or None if absent."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def set(self, key, data, expires_at=None, fetched_at=None):
+        """Cache `data` until the next update boundary (or the given `expires_at`,
+        e.g. an entry taken from the shared tier); returns (expires_at, fetched_at)."""
+        entry = (expires_at or self.expiry(), fetched_at or time.time(), data)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry[0], entry[1]
+
+    def expire(self, key, fetched_before=None):
+        """Mark `key` expired now, keeping it for get_stale(); a copy fetched at
+        or after `fetched_before` is left alone. True if the entry was expired."""
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is None or entry[0] <= now or (fetched_before is not None and entry[1] >= fetched_before):
+            return False
+        self._entries[key] = (now, entry[1], entry[2])
+        return True
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
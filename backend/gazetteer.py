@@ -0,0 +1,187 @@
+"""Offline gazetteer for the state/district pairs the frontend offers.
+
+`frontend/src/data/indianStates.json` enumerates every state and district a
+user can pick, so their coordinates are resolved once ahead of time and
+shipped as `gazetteer.json`. At startup it is loaded into a flat dict, and
+`weather_by_region` consults it before the geocode cache or any network call.
+
+Build (or top up) the file with:
+
+    cd backend && python gazetteer.py build [--refresh]
+
+The build runs the same fallback chain as the app (Open-Meteo full name,
+district only, then Nominatim) one step at a time, straight on the
+providers, so it doesn't import main or touch the app's stores. It pauses
+between lookups to stay within Nominatim's usage policy. Commit the result:
+`version` (GAZETTEER_VERSION) and `source_digest` (of indianStates.json)
+tell a running app whether the file matches the code and the district list.
+"""
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+GAZETTEER_VERSION = 1
+BACKEND_DIR = Path(__file__).resolve().parent
+DEFAULT_GAZETTEER_FILE = BACKEND_DIR / "gazetteer.json"
+STATES_FILE = BACKEND_DIR.parent / "frontend" / "src" / "data" / "indianStates.json"
+
+
+def region_key(state, district=None):
+    return f"{state.strip().lower()}|{(district or '').strip().lower()}"
+
+
+def _file_digest(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()[:16]
+
+
+class Gazetteer:
+    def __init__(self, entries=None, version=GAZETTEER_VERSION, source_digest=None):
+        # region_key -> (state, district, lat, lon, display_name)
+        self._index = {}
+        self.version = version
+        self.source_digest = source_digest
+        for entry in entries or ():
+            state, district = entry[0], entry[1]
+            self._index[region_key(state, district)] = tuple(entry)
+
+    @classmethod
+    def load(cls, path=DEFAULT_GAZETTEER_FILE):
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except Exception as e:
+            print(f"Failed to load gazetteer {path}: {e}")
+            return cls()
+        if doc.get("version") != GAZETTEER_VERSION:
+            print(f"Ignoring gazetteer {path}: version {doc.get('version')} != {GAZETTEER_VERSION}")
+            return cls()
+        gazetteer = cls(doc.get("entries"), doc["version"], doc.get("source_digest"))
+        if STATES_FILE.exists() and gazetteer.source_digest != _file_digest(STATES_FILE):
+            print("Gazetteer is older than indianStates.json; run `python gazetteer.py build` to top it up")
+        return gazetteer
+
+    def lookup(self, state, district=None):
+        """Return (lat, lon, display_name) or None."""
+        entry = self._index.get(region_key(state, district))
+        return entry[2:] if entry else None
+
+    def __len__(self):
+        return len(self._index)
+
+    def entries(self):
+        """Yield (state, district, lat, lon, display_name); district is None for states."""
+        return iter(self._index.values())
+
+
+async def _resolve(geocoder, nominatim, state, district, priority):
+    """(lat, lon, display_name) of a state/district, or None if no step finds it."""
+    import httpx
+    import providers
+
+    async def open_meteo(query, match_state):
+        results = await geocoder.search(query, count=5)
+        if match_state:
+            return providers.admin1_match(results, state)
+        return providers.open_meteo_place(results[0], state) if results else None
+
+    async def nominatim_search():
+        q = f"{district}, {state}, India" if district else f"{state}, India"
+        found = await nominatim.search(q, count=1, priority=priority)
+        return (found[0]["latitude"], found[0]["longitude"], found[0]["display_name"]) if found else None
+
+    steps = [lambda: open_meteo(f"{district} {state}" if district else state, bool(district))]
+    if district:
+        steps.append(lambda: open_meteo(district, True))
+    steps.append(nominatim_search)
+    error = None
+    for step in steps:
+        try:
+            place = await step()
+        except httpx.HTTPError as e:
+            error = e
+            continue
+        if place:
+            return place
+    if error is not None:
+        raise error
+    return None
+
+
+async def build(out_file=DEFAULT_GAZETTEER_FILE, refresh=False, pause=1.1):
+    """Resolve every state/district in indianStates.json and write the gazetteer."""
+    import http_clients
+    import providers
+    from rate_limit import BACKGROUND
+
+    with STATES_FILE.open("r", encoding="utf-8") as f:
+        states = json.load(f)
+
+    existing = {} if refresh else {
+        region_key(s, d): (s, d, lat, lon, name)
+        for s, d, lat, lon, name in _read_entries(out_file)
+    }
+    geocoder = providers.geocoding_provider()
+    nominatim = providers.nominatim_provider()
+    entries = []
+    failed = []
+    for item in states:
+        state = item["state"]
+        for district in [None] + list(item.get("districts", [])):
+            key = region_key(state, district)
+            if key in existing:
+                entries.append(existing[key])
+                continue
+            name = f"{district} {state}" if district else state
+            try:
+                place, reason = await _resolve(geocoder, nominatim, state, district, BACKGROUND), "not found"
+            except Exception as e:
+                place, reason = None, e
+            if place:
+                lat, lon, display_name = place
+                entries.append((state, district, round(lat, 5), round(lon, 5), display_name))
+                print(f"  ok   {name}")
+            else:
+                failed.append(name)
+                print(f"  FAIL {name}: {reason}")
+            await asyncio.sleep(pause)
+    await nominatim.close()
+    await http_clients.close_clients()
+
+    doc = {
+        "version": GAZETTEER_VERSION,
+        "built_at": datetime.utcnow().isoformat(),
+        "source_digest": _file_digest(STATES_FILE),
+        "entries": entries,
+    }
+    tmp = Path(out_file).with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(out_file)
+    print(f"Wrote {len(entries)} entries to {out_file} ({len(failed)} failed)")
+    return failed
+
+
+def _read_entries(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return doc.get("entries", []) if doc.get("version") == GAZETTEER_VERSION else []
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python gazetteer.py build [--refresh]")
+        sys.exit(2)
+    started = time.time()
+    failed = asyncio.run(build(refresh="--refresh" in sys.argv))
+    print(f"Done in {time.time() - started:.0f}s")
+    sys.exit(1 if failed else 0)
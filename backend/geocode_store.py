@@ -0,0 +1,195 @@
+"""Persistent geocode store.
+
+Replaces the old whole-file JSON rewrite with a pluggable store:
+
+- ``sqlite`` (default): one row per place in a WAL-mode SQLite database.
+  Lookups and single-row upserts run off the event loop, on separate
+  reader and writer connections so a read never queues behind a write;
+  readers in other uvicorn workers see new rows immediately, and startup
+  doesn't load anything.
+- ``memory``: process-local dict, for tests and throwaway deployments.
+
+Both keep an in-process LRU memo (at most `memo_size` entries) in front of
+the backing store so repeat lookups never touch disk. set() only updates
+the memo and queues the row; a background task writes queued rows in
+batches, so a request never waits on SQLite. flush() waits for the queue
+to drain (the app calls it on shutdown).
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class MemoryGeocodeStore:
+    def __init__(self, memo_size=10000):
+        self._memo = OrderedDict()
+        self.memo_size = memo_size
+        self._pending = {}  # key -> value waiting for the writer task
+        self._writer = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, key):
+        return None
+
+    async def _lookup(self, key):
+        return self._load(key)
+
+    def _write_many(self, items):
+        pass
+
+    def _remember(self, key, value):
+        self._memo[key] = value
+        self._memo.move_to_end(key)
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    async def get(self, key):
+        value = self._memo.get(key)
+        if value is not None:
+            self._memo.move_to_end(key)
+        else:
+            value = self._pending.get(key)
+            if value is None:
+                value = await self._lookup(key)
+            if value is not None:
+                self._remember(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Memoize `value` and queue it for the background writer."""
+        self._remember(key, value)
+        self._pending[key] = value
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._drain())
+
+    async def _drain(self):
+        # Whatever is queued while a batch is being written goes in the next one
+        while self._pending:
+            batch = list(self._pending.items())
+            self._pending.clear()
+            await asyncio.to_thread(self._write_many, batch)
+
+    async def flush(self):
+        """Wait until every set() so far has been written."""
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def __len__(self):
+        return len(self._memo)
+
+    def close(self):
+        pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "memo": len(self._memo),
+            "pending_writes": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SqliteGeocodeStore(MemoryGeocodeStore):
+    def __init__(self, path, legacy_json=None, memo_size=10000):
+        super().__init__(memo_size)
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        # WAL lets reads run alongside a write, so they get their own connection
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        if legacy_json is not None:
+            self._migrate(Path(legacy_json))
+        # Counted once here and kept up to date by _write_many, so stats() (served
+        # from /api/health and /metrics on the loop) never runs a COUNT(*).
+        # Rows added by other workers show up after a restart.
+        with self._lock:
+            self._rows = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def _migrate(self, legacy_json):
+        """One-time import of the old geocode_cache.json, if present."""
+        if not legacy_json.exists():
+            return
+        try:
+            with legacy_json.open("r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Failed to read legacy geocode cache: {e}")
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO geocode (key, value) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in legacy.items()],
+            )
+            self._conn.commit()
+        try:
+            legacy_json.rename(legacy_json.with_suffix(".json.migrated"))
+        except OSError:
+            pass  # another worker migrated it first
+
+    def _load(self, key):
+        with self._read_lock:
+            row = self._reader.execute("SELECT value FROM geocode WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def _lookup(self, key):
+        return await asyncio.to_thread(self._load, key)
+
+    def _write_many(self, items):
+        """Upsert (key, value) pairs in one transaction."""
+        try:
+            with self._lock:
+                added = 0
+                for key, value in items:
+                    encoded = json.dumps(value, ensure_ascii=False)
+                    if not self._conn.execute(
+                        "UPDATE geocode SET value = ? WHERE key = ?", (encoded, key)
+                    ).rowcount:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO geocode (key, value) VALUES (?, ?)", (key, encoded)
+                        )
+                        added += 1
+                self._conn.commit()
+                self._rows += added
+        except sqlite3.Error as e:
+            print(f"Failed to save {len(items)} geocode entries: {e}")
+
+    def __len__(self):
+        return self._rows
+
+    def close(self):
+        with self._read_lock:
+            self._reader.close()
+        with self._lock:
+            self._conn.close()
+
+
+def open_geocode_store(kind, data_dir, memo_size=10000):
+    """Build the configured store (`GEOCODE_STORE` env var in main.py)."""
+    if kind == "memory":
+        return MemoryGeocodeStore(memo_size)
+    if kind == "sqlite":
+        return SqliteGeocodeStore(
+            Path(data_dir) / "geocode_cache.sqlite3",
+            legacy_json=Path(data_dir) / "geocode_cache.json",
+            memo_size=memo_size,
+        )
+    raise ValueError(f"Unknown GEOCODE_STORE: {kind}")
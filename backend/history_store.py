@@ -0,0 +1,341 @@
+"""Memory-mapped store of observed conditions per location.
+
+Every forecast fetched from upstream carries a `current` observation; the
+store appends it, so /api/weather/history can answer "how has it changed"
+without another upstream call. Everything lives in one preallocated file,
+mapped into memory:
+
+    header (metadata JSON) | location table | slot 0 | slot 1 | ...
+
+Each location (forecast grid cell) owns one fixed-size slot holding two
+ring buffers of fixed-width columns (uint32 epoch seconds, then one float32
+column per variable):
+
+- raw: one row per observation (every 15 minutes), kept `raw_capacity` rows
+- hourly: per-hour means (last value for codes and directions), kept
+  `hourly_capacity` rows, so older history survives at a coarser resolution
+
+Rings give retention for free: the oldest row is overwritten. Range queries
+binary-search the time column and slice the value columns straight out of
+the mapping. Only pages that are touched become resident, and unused slots
+cost nothing on filesystems with sparse files.
+
+Once all `max_locations` slots are taken, a new location takes over the
+slot whose latest observation is oldest (least recently appended), so
+locations nobody asks about any more make way for current ones.
+
+Appends and slot allocation take an exclusive file lock (where fcntl exists)
+so several uvicorn workers can share the file; observations already stored
+(same or older time) are skipped. append_many() writes a batch under one
+lock, e.g. from a worker thread. flock doesn't exclude threads of the same
+process, so the store also holds a thread lock around every append and
+query; call query() from a worker thread too, so a batch being written
+doesn't stall the event loop.
+
+Every slot allocation or takeover bumps a counter in the file header, so a
+lookup for a location that isn't in this process's table only rescans the
+location table when another worker has changed it since the last scan.
+"""
+import json
+import math
+import mmap
+import struct
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker assumed
+    fcntl = None
+
+FORMAT_VERSION = 2
+MAGIC = b"WXHIST\x00\x01"
+HEADER_SIZE = 4096
+GENERATION_WORD = HEADER_SIZE // 4 - 1  # uint32 at the end of the header: location table changes
+LOCATION = struct.Struct("<ddii")  # lat, lon, used, utc_offset_seconds
+SLOT_HEADER = struct.Struct("<IIII")  # raw count, raw head, hourly count, hourly head
+# Averaging these makes no sense; the hourly row keeps the latest value
+LAST_VALUE_VARS = frozenset({"weather_code", "wind_direction_10m"})
+# Stored as float32 like the rest, returned as integers
+INTEGER_VARS = frozenset({"weather_code"})
+
+
+class _FileLock:
+    """Exclusive flock on `fd` plus `mutex` for this process's threads;
+    re-entrant, so a batch can hold it across appends."""
+
+    def __init__(self, fd, mutex):
+        self.fd = fd
+        self.mutex = mutex
+        self.depth = 0
+
+    def __enter__(self):
+        self.mutex.acquire()
+        if self.depth == 0 and fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        self.depth += 1
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0 and fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.mutex.release()
+
+
+class _Ring:
+    """Offsets (in 4-byte words) of one ring's columns inside a slot."""
+
+    def __init__(self, capacity, columns, base):
+        self.capacity = capacity
+        self.columns = columns  # column 0 is time
+        self.base = base  # word offset of column 0, relative to the slot
+        self.words = capacity * columns
+
+    def column(self, slot_word, column):
+        return slot_word + self.base + column * self.capacity
+
+
+class HistoryStore:
+    def __init__(self, path, variables, raw_capacity=672, hourly_capacity=2160, max_locations=1000):
+        self.path = Path(path)
+        self.variables = list(variables)
+        self.max_locations = max_locations
+        nvars = len(self.variables)
+        header_words = SLOT_HEADER.size // 4
+        self.raw = _Ring(raw_capacity, 1 + nvars, header_words)
+        # hourly: time, one sample count per variable (missing values don't
+        # count towards the mean), then the variables
+        self.hourly = _Ring(hourly_capacity, 1 + 2 * nvars, header_words + self.raw.words)
+        self.slot_words = header_words + self.raw.words + self.hourly.words
+        table_size = LOCATION.size * max_locations
+        self.slots_offset = HEADER_SIZE + -(-table_size // 4096) * 4096
+        self.size = self.slots_offset + self.slot_words * 4 * max_locations
+        self.metadata = {
+            "version": FORMAT_VERSION,
+            "variables": self.variables,
+            "raw_capacity": raw_capacity,
+            "hourly_capacity": hourly_capacity,
+            "max_locations": max_locations,
+        }
+        self._slots = {}  # (lat, lon) -> slot index
+        self._scanned = None  # header generation self._slots was built from
+        self._mutex = threading.RLock()
+        self.appended = 0
+        self.skipped = 0
+        self.evicted = 0
+        self._open()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self._read_metadata() != self.metadata:
+            # Layout changed (variables, retention, capacity): keep the old file aside
+            self.path.replace(self.path.with_suffix(self.path.suffix + ".old"))
+            print(f"History store layout changed; moved old file to {self.path}.old")
+        self._file = open(self.path, "a+b")
+        self._lock = _FileLock(self._file.fileno(), self._mutex)
+        with self._lock:
+            if self._file.seek(0, 2) < self.size:
+                self._file.truncate(self.size)  # sparse where supported
+            self._file.flush()
+        self._mm = mmap.mmap(self._file.fileno(), self.size)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            meta = json.dumps(self.metadata).encode()
+            self._mm[:len(MAGIC) + 4 + len(meta)] = MAGIC + struct.pack("<I", len(meta)) + meta
+        self._u32 = memoryview(self._mm).cast("I")
+        self._f32 = memoryview(self._mm).cast("f")
+
+    def _read_metadata(self):
+        with open(self.path, "rb") as f:
+            head = f.read(HEADER_SIZE)
+        if head[:len(MAGIC)] != MAGIC:
+            return None
+        (length,) = struct.unpack_from("<I", head, len(MAGIC))
+        try:
+            return json.loads(head[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+        except ValueError:
+            return None
+
+    # Location table
+
+    def _scan(self):
+        self._scanned = self._u32[GENERATION_WORD]
+        slots = {}
+        for i in range(self.max_locations):
+            lat, lon, used, _ = LOCATION.unpack_from(self._mm, HEADER_SIZE + i * LOCATION.size)
+            if not used:
+                break
+            slots[(lat, lon)] = i
+        self._slots = slots
+
+    def _owns(self, slot, lat, lon):
+        """True if `slot` still belongs to lat/lon (another worker may have reused it)."""
+        return LOCATION.unpack_from(self._mm, HEADER_SIZE + slot * LOCATION.size)[:2] == (lat, lon)
+
+    def _slot(self, lat, lon, create=False, utc_offset=0):
+        slot = self._slots.get((lat, lon))
+        if slot is not None and self._owns(slot, lat, lon):
+            return slot
+        if slot is not None or self._scanned != self._u32[GENERATION_WORD]:
+            self._scan()  # another worker has added or reused a slot
+            slot = self._slots.get((lat, lon))
+        if slot is not None or not create:
+            return slot
+        with self._lock:
+            self._scan()
+            slot = self._slots.get((lat, lon))
+            if slot is None:
+                if len(self._slots) < self.max_locations:
+                    slot = len(self._slots)
+                else:
+                    slot = self._least_recent()
+                    del self._slots[LOCATION.unpack_from(self._mm, HEADER_SIZE + slot * LOCATION.size)[:2]]
+                    SLOT_HEADER.pack_into(self._mm, self._slot_word(slot) * 4, 0, 0, 0, 0)
+                    self.evicted += 1
+                LOCATION.pack_into(self._mm, HEADER_SIZE + slot * LOCATION.size, lat, lon, 1, utc_offset)
+                self._slots[(lat, lon)] = slot
+                self._u32[GENERATION_WORD] = self._scanned = (self._u32[GENERATION_WORD] + 1) % 2 ** 32
+        return slot
+
+    def _least_recent(self):
+        """The slot whose latest observation is oldest."""
+        oldest, victim = None, 0
+        for slot in range(self.max_locations):
+            raw_count, raw_head, _, _ = self._counts(slot)
+            latest = self._u32[self.raw.column(self._slot_word(slot), 0) + (raw_head - 1) % self.raw.capacity] \
+                if raw_count else 0
+            if oldest is None or latest < oldest:
+                oldest, victim = latest, slot
+        return victim
+
+    def _slot_word(self, slot):
+        return self.slots_offset // 4 + slot * self.slot_words
+
+    def _counts(self, slot):
+        return SLOT_HEADER.unpack_from(self._mm, self._slot_word(slot) * 4)
+
+    # Writing
+
+    def append(self, lat, lon, epoch, values, utc_offset=0):
+        """Record observation `values` ({variable: number}) at `epoch`; False if not stored."""
+        row = [math.nan if values.get(v) is None else float(values[v]) for v in self.variables]
+        with self._lock:
+            slot = self._slot(lat, lon, create=True, utc_offset=utc_offset)
+            word = self._slot_word(slot)
+            raw_count, raw_head, hourly_count, hourly_head = self._counts(slot)
+            if raw_count and self._u32[self.raw.column(word, 0) + (raw_head - 1) % self.raw.capacity] >= epoch:
+                self.skipped += 1
+                return False
+            self._write_row(word, self.raw, raw_head, epoch, row)
+            raw_head = (raw_head + 1) % self.raw.capacity
+            raw_count = min(raw_count + 1, self.raw.capacity)
+            hourly_count, hourly_head = self._downsample(word, hourly_count, hourly_head, epoch, row)
+            SLOT_HEADER.pack_into(self._mm, word * 4, raw_count, raw_head, hourly_count, hourly_head)
+        self.appended += 1
+        return True
+
+    def append_many(self, observations):
+        """append() each (lat, lon, epoch, values, utc_offset) under one lock; number stored."""
+        with self._lock:
+            return sum(self.append(*observation) for observation in observations)
+
+    def _write_row(self, word, ring, index, epoch, row):
+        self._u32[ring.column(word, 0) + index] = epoch
+        for column, value in enumerate(row, start=ring.columns - len(row)):
+            self._f32[ring.column(word, column) + index] = value
+
+    def _downsample(self, word, count, head, epoch, row):
+        hour = epoch - epoch % 3600
+        ring = self.hourly
+        last = (head - 1) % ring.capacity
+        if count and self._u32[ring.column(word, 0) + last] == hour:
+            for j, (var, value) in enumerate(zip(self.variables, row)):
+                if math.isnan(value):
+                    continue
+                counted = ring.column(word, 1 + j) + last
+                n = self._f32[counted] + 1
+                self._f32[counted] = n
+                at = ring.column(word, 1 + len(row) + j) + last
+                if var in LAST_VALUE_VARS or n == 1:
+                    self._f32[at] = value
+                else:
+                    self._f32[at] += (value - self._f32[at]) / n
+            return count, head
+        self._write_row(word, ring, head, hour, [0.0 if math.isnan(v) else 1.0 for v in row] + row)
+        return min(count + 1, ring.capacity), (head + 1) % ring.capacity
+
+    # Reading
+
+    def query(self, lat, lon, start, end, resolution="raw"):
+        """Rows with start <= time < end as columns: {"time": [epoch...], variable: [...]}.
+
+        Returns None for a location never recorded. Missing values are None.
+        Blocks while another thread is appending.
+        """
+        with self._mutex:
+            return self._query(lat, lon, start, end, resolution)
+
+    def _query(self, lat, lon, start, end, resolution):
+        slot = self._slot(lat, lon)
+        if slot is None:
+            return None
+        word = self._slot_word(slot)
+        raw_count, raw_head, hourly_count, hourly_head = self._counts(slot)
+        ring, count, head = (self.raw, raw_count, raw_head) if resolution == "raw" else \
+            (self.hourly, hourly_count, hourly_head)
+        oldest = (head - count) % ring.capacity
+        time_base = ring.column(word, 0)
+        lo = self._search(time_base, oldest, count, ring.capacity, start)
+        hi = self._search(time_base, oldest, count, ring.capacity, end)
+        first = ring.columns - len(self.variables)
+        columns = {"time": self._column(self._u32, time_base, (oldest + lo) % ring.capacity, hi - lo, ring.capacity)}
+        for j, var in enumerate(self.variables):
+            values = self._column(self._f32, ring.column(word, first + j), (oldest + lo) % ring.capacity,
+                                  hi - lo, ring.capacity)
+            if var in INTEGER_VARS:
+                columns[var] = [None if v != v else int(v) for v in values]
+            else:
+                columns[var] = [None if v != v else round(v, 2) for v in values]
+        return columns
+
+    def _search(self, base, oldest, count, capacity, epoch):
+        """Number of rows (in time order) older than `epoch`, by binary search in place."""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._u32[base + (oldest + mid) % capacity] < epoch:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @staticmethod
+    def _column(view, base, oldest, count, capacity):
+        """`count` values of a ring column in time order, as at most two slices."""
+        tail = min(count, capacity - oldest)
+        values = view[base + oldest:base + oldest + tail].tolist()
+        if count > tail:
+            values += view[base:base + count - tail].tolist()
+        return values
+
+    def utc_offset(self, lat, lon):
+        with self._mutex:
+            slot = self._slot(lat, lon)
+            if slot is None:
+                return 0
+            return LOCATION.unpack_from(self._mm, HEADER_SIZE + slot * LOCATION.size)[3]
+
+    def close(self):
+        self._u32.release()
+        self._f32.release()
+        self._mm.close()
+        self._file.close()
+
+    def stats(self):
+        return {
+            "locations": len(self._slots),
+            "max_locations": self.max_locations,
+            "appended": self.appended,
+            "skipped": self.skipped,
+            "evicted": self.evicted,
+            "file_bytes": self.size,
+        }
@@ -0,0 +1,124 @@
+"""Shared, pooled httpx clients for upstream providers.
+
+One AsyncClient per upstream is opened in the FastAPI lifespan hook and
+reused by every handler, so connections (and their TLS sessions) stay warm
+across requests instead of being rebuilt per call. Each client's transport
+is wrapped with that upstream's circuit breaker and adaptive concurrency
+limit (see resilience.py).
+"""
+import os
+
+import httpx
+
+from metrics import observe_upstream
+from resilience import AIMDLimiter, CircuitBreaker, GuardedTransport
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx when installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per-upstream pool defaults. Each value can be overridden from the
+# environment, e.g. NOMINATIM_MAX_CONNECTIONS=1 or OPENAI_TIMEOUT=30.
+# `latency_target` is the response time above which the concurrency limit
+# backs off.
+UPSTREAMS = {
+    "open-meteo": {"max_connections": 50, "max_keepalive": 20, "timeout": 10.0, "latency_target": 2.0},
+    "geocoding": {"max_connections": 20, "max_keepalive": 10, "timeout": 10.0, "latency_target": 2.0},
+    # Nominatim's usage policy allows ~1 req/s, so a tiny pool is plenty.
+    "nominatim": {
+        "max_connections": 2,
+        "max_keepalive": 1,
+        "timeout": 10.0,
+        "latency_target": 3.0,
+        "headers": {"User-Agent": "WeatherAI/1.0 (weather forecast app)"},
+    },
+    "openai": {"max_connections": 20, "max_keepalive": 10, "timeout": 15.0, "latency_target": 10.0},
+}
+
+BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+# How long a call may queue for a concurrency slot before it is refused with
+# a 503; per upstream as e.g. OPEN_METEO_LIMIT_WAIT
+LIMIT_WAIT = float(os.getenv("UPSTREAM_LIMIT_WAIT", "10"))
+
+_clients = {}
+_breakers = {}
+_limiters = {}
+
+
+def _env_key(name):
+    return name.upper().replace("-", "_")
+
+
+def _setting(name, field, cast):
+    value = os.getenv(f"{_env_key(name)}_{field.upper()}")
+    return cast(value) if value else UPSTREAMS[name][field]
+
+
+def _build_client(name, transport=None):
+    cfg = UPSTREAMS[name]
+    timeout = _setting(name, "timeout", float)
+    connect_timeout = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+    keepalive_expiry = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+    limits = httpx.Limits(
+        max_connections=_setting(name, "max_connections", int),
+        max_keepalive_connections=_setting(name, "max_keepalive", int),
+        keepalive_expiry=keepalive_expiry,
+    )
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=min(connect_timeout, timeout)),
+        headers=cfg.get("headers"),
+        transport=GuardedTransport(name, transport, breaker(name), limiter(name), observe=observe_upstream),
+    )
+
+
+def breaker(name):
+    """The circuit breaker for an upstream; it outlives client reopening."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(failures=BREAKER_FAILURES, reset_after=BREAKER_RESET)
+    return _breakers[name]
+
+
+def limiter(name):
+    if name not in _limiters:
+        _limiters[name] = AIMDLimiter(
+            max_limit=_setting(name, "max_connections", int),
+            latency_target=_setting(name, "latency_target", float),
+            max_wait=float(os.getenv(f"{_env_key(name)}_LIMIT_WAIT") or LIMIT_WAIT),
+        )
+    return _limiters[name]
+
+
+def available(name):
+    """False while an upstream's circuit is open, so fallbacks can skip it."""
+    return not breaker(name).is_open()
+
+
+def open_clients(transport=None):
+    """Create one pooled client per upstream. `transport` is for tests/benchmarks."""
+    for name in UPSTREAMS:
+        if name not in _clients:
+            _clients[name] = _build_client(name, transport)
+
+
+async def close_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def stats():
+    return {name: {**breaker(name).stats(), **limiter(name).stats()} for name in UPSTREAMS}
+
+
+def get_client(name):
+    """Return the shared client for an upstream, opening it lazily if needed."""
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = _build_client(name)
+    return client
@@ -0,0 +1,107 @@
+"""Server-push fan-out of forecast updates (/api/weather/stream).
+
+Clients subscribe to forecast cache keys instead of polling. Each key with
+at least one subscriber gets a single poller task, however many clients
+watch it: the poller reads the forecast through the normal cache path,
+compares its `version` (the upstream observation time) with the last one
+sent, and pushes to every subscriber only when it changed. It then sleeps
+until the cached entry is due to expire, so a watched location costs one
+fetch per upstream update interval. The poller stops when its last
+subscriber leaves.
+
+A subscriber's queue is bounded; a client too slow to drain it loses the
+oldest pending update rather than holding memory for it.
+"""
+import asyncio
+
+
+class Subscriber:
+    def __init__(self, keys, max_pending=32):
+        self.keys = tuple(keys)
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def push(self, key, data):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((key, data))
+
+
+class LiveHub:
+    def __init__(self, fetch, version, next_poll, min_interval=15, max_interval=900, retry_after=30):
+        self.fetch = fetch  # async key -> data
+        self.version = version  # data -> value whose change is worth a push
+        self.next_poll = next_poll  # key -> seconds until new data may exist (or None)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_after = retry_after  # seconds between polls while fetches fail
+        self._subscribers = {}  # key -> set of Subscriber
+        self._latest = {}  # key -> (version, data)
+        self._pollers = {}  # key -> task
+        self.polls = 0
+        self.pushes = 0
+        self.errors = 0
+
+    def subscribe(self, keys, max_pending=32):
+        """Watch `keys`; the latest known data for each is queued straight away."""
+        sub = Subscriber(dict.fromkeys(keys), max_pending)
+        for key in sub.keys:
+            self._subscribers.setdefault(key, set()).add(sub)
+            if key in self._latest:
+                sub.push(key, self._latest[key][1])
+            if key not in self._pollers:
+                self._pollers[key] = asyncio.ensure_future(self._poll(key))
+        return sub
+
+    def unsubscribe(self, sub):
+        for key in sub.keys:
+            watchers = self._subscribers.get(key)
+            if watchers is None:
+                continue
+            watchers.discard(sub)
+            if not watchers:
+                del self._subscribers[key]
+                self._latest.pop(key, None)
+                poller = self._pollers.pop(key, None)
+                if poller is not None:
+                    poller.cancel()
+
+    async def _poll(self, key):
+        while key in self._subscribers:
+            try:
+                self.polls += 1
+                data = await self.fetch(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"Live update poll for {key[:2]} failed: {e}")
+                await asyncio.sleep(self.retry_after)
+                continue
+            version = self.version(data)
+            if key not in self._latest or self._latest[key][0] != version:
+                self._latest[key] = (version, data)
+                for sub in self._subscribers.get(key, ()):
+                    sub.push(key, data)
+                    self.pushes += 1
+            wait = self.next_poll(key)
+            await asyncio.sleep(min(self.max_interval, max(self.min_interval, wait or 0)))
+
+    async def close(self):
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        self._pollers.clear()
+        self._subscribers.clear()
+        self._latest.clear()
+
+    def stats(self):
+        return {
+            "locations": len(self._pollers),
+            "subscribers": len({sub for subs in self._subscribers.values() for sub in subs}),
+            "polls": self.polls,
+            "pushes": self.pushes,
+            "errors": self.errors,
+        }
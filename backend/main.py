@@ -1,17 +1,81 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import json
+import re
+import time
 from pathlib import Path
 import httpx
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from dotenv import load_dotenv
 
+import http_clients
+from http_clients import get_client
+from forecast_cache import ForecastCache
+from shared_cache import SharedCache, open_backend
+from singleflight import SingleFlight
+from geocode_store import open_geocode_store
+from gazetteer import Gazetteer, DEFAULT_GAZETTEER_FILE
+from suggest_index import SuggestIndex, normalize as normalize_place
+from rules import rule_based_answer
+from prefetch import PrefetchScheduler
+from live_updates import LiveHub
+from alerts import AlertEngine, load_rules
+from history_store import HistoryStore
+import providers
+from rate_limit import INTERACTIVE
+from resilience import UpstreamUnavailable
+from fast_json import FastJSONResponse
+from conditional import make_etag, not_modified, cacheable_json
+import metrics
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional; gzip only
+    BrotliMiddleware = None
+
 load_dotenv()
 
-app = FastAPI(title="Local Weather App - Minimal")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per upstream for the lifetime of the app
+    http_clients.open_clients()
+    if SHARED_FORECASTS is not None and SHARED_FORECASTS.invalidate:
+        await SHARED_FORECASTS.subscribe(_expire_forecast)
+    if PREFETCH_ENABLED:
+        PREFETCH.start()
+    if ALERTS_ENABLED and len(GAZETTEER):
+        ALERTS.start()
+    elif ALERTS_ENABLED:
+        print("No gazetteer entries; alerts are off until `python gazetteer.py build` has been run")
+    try:
+        yield
+    finally:
+        await ALERTS.stop()
+        await PREFETCH.stop()
+        await LIVE_UPDATES.close()
+        await NOMINATIM.close()
+        await http_clients.close_clients()
+        if SHARED_BACKEND is not None:
+            await SHARED_BACKEND.close()
+        await GEOCODE_CACHE.flush()
+        GEOCODE_CACHE.close()
+        if HISTORY is not None:
+            if _history_writer is not None:
+                await asyncio.gather(_history_writer, return_exceptions=True)
+            HISTORY.close()
+
+
+app = FastAPI(title="Local Weather App - Minimal", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Read OpenAI key from env; if present we'll use OpenAI for AI responses
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -23,245 +87,814 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# Simple geocode cache persisted to disk to reduce external calls
-DATA_DIR = Path(__file__).resolve().parents[1] / "data"
-GEOCODE_CACHE_FILE = DATA_DIR / "geocode_cache.json"
+# Compress larger JSON bodies (a week of hourly rows is ~20 KB); brotli when
+# brotli-asgi is installed and the client accepts it, gzip otherwise. SSE
+# streams are left alone so events aren't buffered.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1000"))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_SIZE, gzip_fallback=True,
+                       excluded_handlers=[r"/stream$"])
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=6)
+
+# Outermost, so timings include CORS and compression (see /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Geocode cache persisted to disk to reduce external calls (see geocode_store.py)
+DATA_DIR = Path(os.getenv("DATA_DIR") or Path(__file__).resolve().parents[1] / "data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+GEOCODE_CACHE = open_geocode_store(
+    os.getenv("GEOCODE_STORE", "sqlite"), DATA_DIR, memo_size=int(os.getenv("GEOCODE_MEMO_SIZE", "10000"))
+)
 
-try:
-    if GEOCODE_CACHE_FILE.exists():
-        with GEOCODE_CACHE_FILE.open("r", encoding="utf-8") as f:
-            GEOCODE_CACHE = json.load(f)
-    else:
-        GEOCODE_CACHE = {}
-except Exception:
-    GEOCODE_CACHE = {}
-
-def save_geocode_cache():
+# Precomputed coordinates for every state/district the frontend offers
+GAZETTEER = Gazetteer.load(os.getenv("GAZETTEER_FILE") or DEFAULT_GAZETTEER_FILE)
+
+# Local typeahead index, seeded from the gazetteer and grown from upstream results
+SUGGEST_INDEX = SuggestIndex(max_learned=int(os.getenv("SUGGEST_INDEX_SIZE", "20000")))
+SUGGEST_MIN_LOCAL = int(os.getenv("SUGGEST_MIN_LOCAL", "3"))
+# Upstream answers per normalized query, so a prefix is asked about once a day
+SUGGEST_UPSTREAM_CACHE = ForecastCache(
+    maxsize=int(os.getenv("SUGGEST_CACHE_SIZE", "4096")),
+    interval=86400,
+)
+for _state, _district, _lat, _lon, _ in GAZETTEER.entries():
+    SUGGEST_INDEX.add(_district or _state, _lat, _lon, _state)
+
+# Forecast responses cached per snapped coordinate + variable set.
+# After expiry an entry may still be served for FORECAST_STALE_WHILE_REVALIDATE
+# seconds while it refreshes in the background, and for FORECAST_STALE_IF_ERROR
+# seconds if the refresh fails.
+FORECAST_STALE_WHILE_REVALIDATE = int(os.getenv("FORECAST_STALE_WHILE_REVALIDATE", "300"))
+FORECAST_STALE_IF_ERROR = int(os.getenv("FORECAST_STALE_IF_ERROR", "3600"))
+FORECAST_CACHE = ForecastCache(
+    maxsize=int(os.getenv("FORECAST_CACHE_SIZE", "2048")),
+    interval=int(os.getenv("FORECAST_TTL", "900")),
+    grid=float(os.getenv("FORECAST_GRID", "0.01")),
+    max_stale=max(FORECAST_STALE_WHILE_REVALIDATE, FORECAST_STALE_IF_ERROR),
+)
+
+# Optional second tier shared by every worker and replica (see shared_cache.py).
+# Forecasts keep their boundary-aligned expiry there; geocodes are kept for
+# SHARED_GEOCODE_TTL seconds.
+SHARED_BACKEND = open_backend(os.getenv("SHARED_CACHE_URL"))
+SHARED_CACHE_TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", "0.05"))
+SHARED_CACHE_WRITE_TIMEOUT = float(os.getenv("SHARED_CACHE_WRITE_TIMEOUT", "1.0"))
+SHARED_GEOCODE_TTL = int(os.getenv("SHARED_GEOCODE_TTL", str(30 * 86400)))
+SHARED_FORECASTS = SHARED_GEOCODES = None
+if SHARED_BACKEND is not None:
+    SHARED_FORECASTS = SharedCache(SHARED_BACKEND, "forecast", SHARED_CACHE_TIMEOUT,
+                                   invalidate=os.getenv("SHARED_CACHE_INVALIDATE", "1") == "1",
+                                   write_timeout=SHARED_CACHE_WRITE_TIMEOUT)
+    SHARED_GEOCODES = SharedCache(SHARED_BACKEND, "geocode", SHARED_CACHE_TIMEOUT,
+                                  write_timeout=SHARED_CACHE_WRITE_TIMEOUT)
+
+# Coalesces concurrent identical geocode / forecast / suggest fetches
+INFLIGHT = SingleFlight()
+
+# Upstreams and variable sets come from config (see providers.py)
+FORECAST_PROVIDER = providers.forecast_provider()
+GEOCODER = providers.geocoding_provider()
+NOMINATIM = providers.nominatim_provider()
+# The union of what every endpoint needs, fetched once per location and cached
+# as one record that current/hourly/by-region/batch/AI all project from.
+FORECAST_PARAMS = FORECAST_PROVIDER.params
+
+# Observed `current` conditions per grid cell, recorded on every fetch (see
+# history_store.py): 15-minute rows for HISTORY_RAW_DAYS, hourly means for
+# HISTORY_HOURLY_DAYS.
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "1") == "1"
+HISTORY_RAW_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "7"))
+HISTORY_HOURLY_DAYS = int(os.getenv("HISTORY_HOURLY_DAYS", "90"))
+HISTORY = None
+if HISTORY_ENABLED:
+    HISTORY = HistoryStore(
+        DATA_DIR / "history.bin",
+        [v for v in FORECAST_PARAMS.get("current", "").split(",") if v],
+        raw_capacity=HISTORY_RAW_DAYS * 86400 // FORECAST_CACHE.interval,
+        hourly_capacity=HISTORY_HOURLY_DAYS * 24,
+        max_locations=int(os.getenv("HISTORY_MAX_LOCATIONS", "1000")),
+    )
+
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+BACKGROUND_TASKS = set()
+
+
+def spawn(coro, label):
+    """Run `coro` in the background, logging (not raising) its failure."""
+    task = asyncio.ensure_future(coro)
+    BACKGROUND_TASKS.add(task)
+
+    def done(t):
+        BACKGROUND_TASKS.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            print(f"Background {label} failed: {t.exception()}")
+
+    task.add_done_callback(done)
+    return task
+
+
+def upstream_error(e):
+    """HTTPException for a failed upstream call: 503 with Retry-After when the
+    call was refused here (circuit open, concurrency or queue limit), else 502."""
+    if isinstance(e, UpstreamUnavailable):
+        return HTTPException(status_code=503, detail=f"Upstream busy: {e}",
+                             headers={"Retry-After": str(e.retry_after)})
+    return HTTPException(status_code=502, detail=f"Upstream error: {e}")
+
+
+def _stale(data, age):
+    """Copy of a cached payload flagged with its age in seconds."""
+    FORECAST_CACHE.stale_hits += 1
+    return {**data, "stale_age": int(age)}
+
+
+def freshness(data):
+    """Response fields telling the client it got an older forecast, if it did."""
+    if "stale_age" not in data:
+        return {}
+    return {"stale": True, "age_seconds": data["stale_age"]}
+
+
+async def fetch_forecast(lat, lon, params=FORECAST_PARAMS, record=True, revalidate=False):
+    """Fetch an Open-Meteo forecast, served from FORECAST_CACHE (or the shared
+    tier, when configured) while fresh.
+
+    A recently expired entry is returned immediately (flagged via
+    `stale_age`) while a background task refreshes it; an older one is only
+    used if the upstream fetch fails. revalidate=True waits for that refresh
+    instead, for callers that want new data as soon as it exists. Background
+    readers pass record=False, as for fetch_forecasts().
+    """
+    key = FORECAST_CACHE.key(lat, lon, params)
+    if record:
+        PREFETCH.record(key)
+    data = FORECAST_CACHE.get(key)
+    if data is not None:
+        return data
+    stale = FORECAST_CACHE.get_stale(key)
+
+    def fetch():
+        return _fetch_forecast_upstream(key, params, record)
+
+    if stale and stale[2] <= FORECAST_STALE_WHILE_REVALIDATE and not revalidate:
+        spawn(INFLIGHT.do(("forecast", key), fetch), "forecast refresh")
+        return _stale(stale[0], stale[1])
     try:
-        with GEOCODE_CACHE_FILE.open("w", encoding="utf-8") as f:
-            json.dump(GEOCODE_CACHE, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Failed to save geocode cache: {e}")
+        return await INFLIGHT.do(("forecast", key), fetch)
+    except httpx.HTTPError as e:
+        if stale and stale[2] <= FORECAST_STALE_IF_ERROR:
+            print(f"Serving stale forecast for {key[:2]} after upstream error: {e}")
+            return _stale(stale[0], stale[1])
+        raise
+
+
+async def _fetch_forecast_upstream(key, params, record=True):
+    if SHARED_FORECASTS is not None:
+        found = {}
+        await _from_shared([key], found, record)
+        if key in found:
+            return found[key]
+    data = await FORECAST_PROVIDER.fetch(key[0], key[1], params)
+    _store_forecast(key, data, record)
+    return data
+
+
+@lru_cache(maxsize=64)
+def _params_digest(params):
+    return hashlib.blake2b(repr(params).encode(), digest_size=6).hexdigest()
+
+
+# Variable set per digest, to map invalidation messages back to cache keys
+_DIGEST_PARAMS = {}
+
+
+def _shared_forecast_key(key):
+    lat, lon, params = key
+    digest = _params_digest(params)
+    _DIGEST_PARAMS.setdefault(digest, params)
+    return f"{lat}:{lon}:{digest}"
+
+
+def _expire_forecast(shared_key, fetched_at):
+    """Invalidation from another process: expire our copy of `shared_key` if it
+    is older, so the next read takes the new entry from the shared tier (the
+    old copy still serves stale-while-revalidate and stale-if-error)."""
+    lat, lon, digest = shared_key.split(":")
+    params = _DIGEST_PARAMS.get(digest)
+    if params is not None:
+        FORECAST_CACHE.expire((float(lat), float(lon), params), fetched_before=fetched_at)
+
+
+def _store_forecast(key, data, record=True):
+    """Cache a freshly fetched forecast locally and in the shared tier."""
+    if record:
+        _record_history(key, data)
+    expires_at, fetched_at = FORECAST_CACHE.set(key, data)
+    if SHARED_FORECASTS is not None:
+        spawn(SHARED_FORECASTS.set(_shared_forecast_key(key), data, expires_at, fetched_at), "shared cache write")
+
+
+async def _from_shared(keys, found, record=True):
+    """Fill `found` (and FORECAST_CACHE) from the shared tier; return the keys still missing.
+
+    Only entries newer than the local copy count, so a refresh of an entry
+    about to expire doesn't just get the same entry back.
+    """
+    entries = await SHARED_FORECASTS.get_many([_shared_forecast_key(k) for k in keys])
+    missing = []
+    for key, entry in zip(keys, entries):
+        local = FORECAST_CACHE.expires_at(key)
+        if entry is None or (local is not None and entry[1] <= local):
+            missing.append(key)
+            continue
+        FORECAST_CACHE.set(key, entry[0], expires_at=entry[1], fetched_at=entry[2])
+        if record:
+            _record_history(key, entry[0])
+        found[key] = entry[0]
+    return missing
+
+
+# Observations waiting for the history writer; appended in batches off the event loop
+HISTORY_PENDING = []
+_history_writer = None
+
+
+def _record_history(key, data):
+    """Queue the payload's `current` observation for HISTORY (repeats are skipped)."""
+    global _history_writer
+    current = data.get("current") or {}
+    if HISTORY is None or not current.get("time"):
+        return
+    offset = int(data.get("utc_offset_seconds") or 0)
+    try:
+        local = datetime.fromisoformat(current["time"]).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return
+    HISTORY_PENDING.append((key[0], key[1], int(local.timestamp()) - offset, current, offset))
+    if _history_writer is None or _history_writer.done():
+        _history_writer = spawn(_write_history(), "history append")
+
+
+async def _write_history():
+    # Whatever queued up while a batch was being written goes in the next one
+    while HISTORY_PENDING:
+        batch = HISTORY_PENDING[:]
+        HISTORY_PENDING.clear()
+        await asyncio.to_thread(HISTORY.append_many, batch)
+
+
+BATCH_MAX_LOCATIONS = int(os.getenv("BATCH_MAX_LOCATIONS", "200"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))
+
+
+async def fetch_forecasts(coords, params=FORECAST_PARAMS, record=True):
+    """Fetch forecasts for many (lat, lon) pairs, one upstream call per chunk of misses.
+
+    Open-Meteo accepts comma-separated coordinate lists and then returns a
+    list of per-location payloads in the same order. Returns one entry per
+    input pair: its payload, or, like gather(return_exceptions=True), the
+    httpx.HTTPError of the chunk that failed for it when no stale copy can
+    stand in, so one bad chunk doesn't sink the rest. Background sweeps pass
+    record=False: their keys then don't count as demand for PREFETCH and
+    their observations skip HISTORY.
+    """
+    keys = [FORECAST_CACHE.key(lat, lon, params) for lat, lon in coords]
+    found = {}
+    missing = []
+    refresh = []
+    stale = {}
+    for key in dict.fromkeys(keys):
+        if record:
+            PREFETCH.record(key)
+        data = FORECAST_CACHE.get(key)
+        if data is not None:
+            found[key] = data
+            continue
+        entry = FORECAST_CACHE.get_stale(key)
+        if entry and entry[2] <= FORECAST_STALE_WHILE_REVALIDATE:
+            found[key] = _stale(entry[0], entry[1])
+            refresh.append(key)
+        else:
+            missing.append(key)
+            if entry:
+                stale[key] = entry
+    if refresh:
+        spawn(_fetch_forecasts_shared(refresh, params, record), "batch forecast refresh")
+    for key, data in (await _fetch_forecasts_shared(missing, params, record)).items():
+        entry = stale.get(key)
+        if isinstance(data, Exception) and entry and entry[2] <= FORECAST_STALE_IF_ERROR:
+            data = _stale(entry[0], entry[1])
+        found[key] = data
+    return [found[key] for key in keys]
+
+
+async def _fetch_forecasts_shared(keys, params, record=True):
+    """_fetch_forecast_chunks() through INFLIGHT, under the same keys as
+    fetch_forecast(): keys another request is already fetching are awaited,
+    and concurrent requests join this fetch per key.
+
+    Returns {key: payload or the exception that replaced it}.
+    """
+    async def fetch(flights):
+        errors = {}
+        found = await _fetch_forecast_chunks([f[1] for f in flights], params, record, errors)
+        return {("forecast", key): data for key, data in {**found, **errors}.items()}
+
+    if not keys:
+        return {}
+    outcomes = await INFLIGHT.do_many([("forecast", key) for key in keys], fetch)
+    return {flight[1]: data for flight, data in outcomes.items()}
+
+
+async def _fetch_forecast_chunks(keys, params, record=True, errors=None):
+    """Fetch and cache `keys` with one multi-location upstream call per chunk.
+
+    A failing chunk raises, unless `errors` is given: then its keys map to
+    the exception there and the remaining chunks are still fetched.
+    """
+    found = {}
+    if SHARED_FORECASTS is not None and keys:
+        keys = await _from_shared(keys, found, record)
+    for i in range(0, len(keys), BATCH_CHUNK_SIZE):
+        chunk = keys[i:i + BATCH_CHUNK_SIZE]
+        try:
+            payload = await FORECAST_PROVIDER.fetch_many([k[:2] for k in chunk], params)
+        except httpx.HTTPError as e:
+            if errors is None:
+                raise
+            print(f"Forecast chunk of {len(chunk)} locations failed: {e}")
+            errors.update(dict.fromkeys(chunk, e))
+            continue
+        for key, data in zip(chunk, payload):
+            _store_forecast(key, data, record)
+            found[key] = data
+    return found
+
+
+# Refreshes the most requested forecasts just before they expire
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH = PrefetchScheduler(
+    FORECAST_CACHE,
+    _fetch_forecast_chunks,
+    top_k=int(os.getenv("PREFETCH_TOP_K", "200")),
+    interval=int(os.getenv("PREFETCH_INTERVAL", "30")),
+    lead=int(os.getenv("PREFETCH_LEAD", "45")),
+    max_calls=int(os.getenv("PREFETCH_MAX_CALLS", "10")),
+    chunk_size=BATCH_CHUNK_SIZE,
+    min_requests=int(os.getenv("PREFETCH_MIN_REQUESTS", "2")),
+    window=FORECAST_CACHE.interval,
+)
+
+
+def normalize_current(current):
+    """Map an Open-Meteo `current` block to the API's current-weather shape."""
+    return {
+        "temperature_c": current.get("temperature_2m"),
+        "feels_like_c": current.get("apparent_temperature"),
+        "humidity": current.get("relative_humidity_2m"),
+        "precipitation": current.get("precipitation"),
+        "windspeed_kph": current.get("wind_speed_10m"),
+        "winddirection": current.get("wind_direction_10m"),
+        "weathercode": current.get("weather_code"),
+        "time": current.get("time"),
+        "source": "open-meteo",
+        "raw": current,
+    }
+
 
 class AIQuery(BaseModel):
     query: str
     lat: Optional[float] = None
     lon: Optional[float] = None
 
+class BatchLocation(BaseModel):
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    state: Optional[str] = None
+    district: Optional[str] = None
+
+class BatchQuery(BaseModel):
+    locations: List[BatchLocation]
+
+@metrics.REGISTRY.collector
+def _app_metrics():
+    caches = metrics.cache_metrics({
+        "forecast": FORECAST_CACHE.stats(),
+        "geocode": GEOCODE_CACHE.stats(),
+        "ai_answer": AI_ANSWER_CACHE.stats(),
+        **({"forecast_shared": SHARED_FORECASTS.stats(), "geocode_shared": SHARED_GEOCODES.stats()}
+           if SHARED_BACKEND is not None else {}),
+    })
+    stale = metrics.Counter("weather_forecast_stale_served_total", "Expired forecasts served (SWR / stale-if-error).")
+    stale.inc(FORECAST_CACHE.stale_hits)
+    inflight = metrics.Gauge("weather_singleflight_in_flight", "Coalesced upstream fetches in progress.")
+    inflight.set(INFLIGHT.stats()["in_flight"])
+    circuit = metrics.Gauge("weather_upstream_circuit_open", "1 while an upstream's circuit breaker is open.", ("upstream",))
+    limit = metrics.Gauge("weather_upstream_concurrency_limit", "Current adaptive concurrency limit.", ("upstream",))
+    upstream_inflight = metrics.Gauge("weather_upstream_in_flight", "Outbound calls in progress.", ("upstream",))
+    for name, stats in http_clients.stats().items():
+        circuit.set(int(stats["state"] != "closed"), upstream=name)
+        limit.set(stats["limit"], upstream=name)
+        upstream_inflight.set(stats["in_flight"], upstream=name)
+    queue = NOMINATIM.dispatcher.stats()
+    queued = metrics.Gauge("weather_nominatim_queue_depth", "Nominatim calls waiting for a rate-limit token.")
+    queued.set(queue["queued"])
+    dropped = metrics.Counter("weather_nominatim_dropped_total", "Queued Nominatim calls not sent.", ("reason",))
+    for reason in ("expired", "abandoned", "rejected", "shed"):
+        dropped.inc(queue[reason], reason=reason)
+    waited = metrics.Gauge("weather_nominatim_queue_wait_seconds", "Average wait before dispatch.")
+    waited.set(queue["avg_wait"])
+    live = LIVE_UPDATES.stats()
+    watched = metrics.Gauge("weather_stream_locations", "Locations with at least one stream subscriber.")
+    watched.set(live["locations"])
+    streams = metrics.Gauge("weather_stream_subscribers", "Open /api/weather/stream connections.")
+    streams.set(live["subscribers"])
+    pushes = metrics.Counter("weather_stream_pushes_total", "Updates pushed to stream subscribers.")
+    pushes.inc(live["pushes"])
+    alert_stats = ALERTS.stats()
+    alerting = metrics.Gauge("weather_alert_states", "States with at least one active alert.")
+    alerting.set(alert_stats["states_with_alerts"])
+    evaluation = metrics.Gauge("weather_alert_evaluation_seconds", "Time the last alert evaluation took.")
+    evaluation.set((alert_stats["last_evaluation_ms"] or 0) / 1000)
+    return caches + [stale, inflight, circuit, limit, upstream_inflight, queued, dropped, waited,
+                     watched, streams, pushes, alerting, evaluation]
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, upstream and cache metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/health")
-def health():
-    return {"ok": True, "time": datetime.utcnow().isoformat()}
+async def health():
+    # On the event loop, like every other reader of these structures; the
+    # geocode store keeps its row count in memory, so nothing here touches disk
+    geocode_stats = GEOCODE_CACHE.stats()
+    return {
+        "ok": True,
+        "time": datetime.utcnow().isoformat(),
+        "forecast_cache": FORECAST_CACHE.stats(),
+        "geocode_cache": geocode_stats,
+        "gazetteer": {"version": GAZETTEER.version, "entries": len(GAZETTEER)},
+        "suggest_index": SUGGEST_INDEX.stats(),
+        "suggest_upstream_cache": SUGGEST_UPSTREAM_CACHE.stats(),
+        "ai_answer_cache": AI_ANSWER_CACHE.stats(),
+        "shared_cache": None if SHARED_BACKEND is None else {
+            "backend": type(SHARED_BACKEND).__name__,
+            "forecast": SHARED_FORECASTS.stats(),
+            "geocode": SHARED_GEOCODES.stats(),
+        },
+        "inflight": INFLIGHT.stats(),
+        "upstreams": http_clients.stats(),
+        "nominatim_queue": NOMINATIM.dispatcher.stats(),
+        "providers": {
+            "forecast": FORECAST_PROVIDER.describe(),
+            "geocoding": GEOCODER.describe(),
+            "nominatim": NOMINATIM.describe(),
+        },
+        "prefetch": PREFETCH.stats(),
+        "live_updates": LIVE_UPDATES.stats(),
+        "alerts": ALERTS.stats(),
+        "history": HISTORY.stats() if HISTORY is not None else None,
+    }
+
+def forecast_validators(data, lat, lon, *extra):
+    """(etag, max_age) for a response built from forecast `data` at lat/lon.
+
+    The ETag changes only when upstream publishes a new observation `time`
+    for the grid cell; max-age runs to the cache entry's expiry, or 0 when
+    the data is already stale.
+    """
+    snapped = (FORECAST_CACHE.snap(lat), FORECAST_CACHE.snap(lon))
+    etag = make_etag(*snapped, (data.get("current") or {}).get("time"), *extra)
+    if "stale_age" in data:
+        return etag, 0
+    return etag, FORECAST_CACHE.expires_in(FORECAST_CACHE.key(lat, lon, FORECAST_PARAMS)) or 0
+
 
 @app.get("/api/weather/current")
-async def current_weather(lat: float, lon: float):
+async def current_weather(request: Request, lat: float, lon: float):
     """Return normalized current weather for a given lat/lon using Open-Meteo."""
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            "&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m"
-            "&timezone=auto"
-        )
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=10.0)
-            r.raise_for_status()
-            data = r.json()
-            current = data.get("current") or {}
-            result = {
-                "temperature_c": current.get("temperature_2m"),
-                "feels_like_c": current.get("apparent_temperature"),
-                "humidity": current.get("relative_humidity_2m"),
-                "precipitation": current.get("precipitation"),
-                "windspeed_kph": current.get("wind_speed_10m"),
-                "winddirection": current.get("wind_direction_10m"),
-                "weathercode": current.get("weather_code"),
-                "time": current.get("time"),
-                "source": "open-meteo",
-                "raw": current,
-            }
-            return result
+        data = await fetch_forecast(lat, lon)
+        etag, max_age = forecast_validators(data, lat, lon, "current")
+        unchanged = not_modified(request, etag, max_age)
+        if unchanged:
+            return unchanged
+        return cacheable_json({**normalize_current(data.get("current") or {}), **freshness(data)}, etag, max_age)
     except httpx.HTTPError as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Response field -> Open-Meteo hourly variable
+HOURLY_FIELDS = {
+    "time": "time",
+    "temperature_c": "temperature_2m",
+    "humidity": "relative_humidity_2m",
+    "precipitation_probability": "precipitation_probability",
+    "weather_code": "weather_code",
+    "wind_speed_kph": "wind_speed_10m",
+}
+
+
+def hourly_columns(hourly, hours):
+    """Slice Open-Meteo's hourly arrays to `hours` steps, keyed by response field.
+
+    Columns already the right length are passed through without copying; short
+    ones are padded with None so every column lines up with `time`.
+    """
+    n = max(0, min(len(hourly.get("time") or ()), hours))
+    columns = {}
+    for field, var in HOURLY_FIELDS.items():
+        values = hourly.get(var) or []
+        if len(values) != n:
+            values = values[:n] + [None] * (n - len(values[:n]))
+        columns[field] = values
+    return columns
+
+
+def hourly_rows(columns):
+    fields = tuple(columns)
+    return [dict(zip(fields, row)) for row in zip(*columns.values())]
+
+
 @app.get("/api/weather/hourly")
-async def hourly_forecast(lat: float, lon: float, hours: int = 24):
-    """Return hourly forecast for the next N hours."""
+async def hourly_forecast(request: Request, lat: float, lon: float, hours: int = 24, format: str = "rows"):
+    """Return hourly forecast for the next N hours.
+
+    `format=columnar` returns {"hourly": {field: [...]}} with one array per
+    field instead of a list of per-hour objects; it is much smaller and cheaper
+    to produce for week-long forecasts.
+    """
+    if format not in ("rows", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be 'rows' or 'columnar'")
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            f"&hourly=temperature_2m,relative_humidity_2m,precipitation_probability,weather_code,wind_speed_10m"
-            f"&forecast_hours={min(hours, 168)}&timezone=auto"
-        )
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=10.0)
-            r.raise_for_status()
-            data = r.json()
-            hourly = data.get("hourly") or {}
-            
-            # Format hourly data
-            times = hourly.get("time", [])
-            temps = hourly.get("temperature_2m", [])
-            humidity = hourly.get("relative_humidity_2m", [])
-            precip_prob = hourly.get("precipitation_probability", [])
-            weather_codes = hourly.get("weather_code", [])
-            wind_speeds = hourly.get("wind_speed_10m", [])
-            
-            forecast = []
-            for i in range(min(len(times), hours)):
-                forecast.append({
-                    "time": times[i],
-                    "temperature_c": temps[i] if i < len(temps) else None,
-                    "humidity": humidity[i] if i < len(humidity) else None,
-                    "precipitation_probability": precip_prob[i] if i < len(precip_prob) else None,
-                    "weather_code": weather_codes[i] if i < len(weather_codes) else None,
-                    "wind_speed_kph": wind_speeds[i] if i < len(wind_speeds) else None,
-                })
-            
-            return {"forecast": forecast, "source": "open-meteo"}
+        data = await fetch_forecast(lat, lon)
+        etag, max_age = forecast_validators(data, lat, lon, "hourly", hours, format)
+        unchanged = not_modified(request, etag, max_age)
+        if unchanged:
+            return unchanged
+        columns = hourly_columns(data.get("hourly") or {}, hours)
+        if format == "columnar":
+            body = {"hourly": columns}
+        else:
+            body = {"forecast": hourly_rows(columns)}
+        return cacheable_json({**body, "source": "open-meteo", **freshness(data)}, etag, max_age)
     except httpx.HTTPError as e:
-        raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/weather/by-region")
-async def weather_by_region(state: str, district: Optional[str] = None):
-    """Geocode a state+district in India and return current weather.
-    Uses multiple search strategies and fallbacks to ensure location is found.
-    Example: /api/weather/by-region?state=Karnataka&district=Bengaluru
+@app.get("/api/weather/history")
+async def weather_history(lat: float, lon: float, hours: int = 24, resolution: str = "auto"):
+    """Observed conditions recorded for lat/lon over the last `hours`, oldest first.
+
+    Returns {"history": {"time": [...], variable: [...]}} with one array per
+    Open-Meteo `current` variable. `resolution` is "raw" (every observation),
+    "hourly" (hourly means) or "auto": raw while `hours` is within the raw
+    retention, hourly beyond it. Times are local, like the forecast's.
     """
+    if HISTORY is None:
+        raise HTTPException(status_code=404, detail="History is disabled (HISTORY_ENABLED=0)")
+    if resolution not in ("auto", "raw", "hourly"):
+        raise HTTPException(status_code=400, detail="resolution must be 'auto', 'raw' or 'hourly'")
+    if not 0 < hours <= HISTORY_HOURLY_DAYS * 24:
+        raise HTTPException(status_code=400, detail=f"hours must be between 1 and {HISTORY_HOURLY_DAYS * 24}")
+    if resolution == "auto":
+        resolution = "raw" if hours <= HISTORY_RAW_DAYS * 24 else "hourly"
+    lat, lon = FORECAST_CACHE.snap(lat), FORECAST_CACHE.snap(lon)
+    now = int(time.time())
+
+    def read():
+        # In a thread: the store's lock may be held by a batch being appended
+        return HISTORY.query(lat, lon, now - hours * 3600, now + 1, resolution), HISTORY.utc_offset(lat, lon)
+
+    columns, offset = await asyncio.to_thread(read)
+    if columns is None:
+        raise HTTPException(status_code=404, detail="No history recorded for this location yet")
+    columns["time"] = [datetime.utcfromtimestamp(t + offset).strftime("%Y-%m-%dT%H:%M") for t in columns["time"]]
+    return FastJSONResponse({
+        "latitude": lat,
+        "longitude": lon,
+        "utc_offset_seconds": offset,
+        "resolution": resolution,
+        "history": columns,
+        "source": "open-meteo",
+    })
+
+
+# "parallel" runs the Open-Meteo searches concurrently and hedges Nominatim;
+# "sequential" tries full name, district only, then Nominatim one at a time.
+GEOCODE_STRATEGY = os.getenv("GEOCODE_STRATEGY", "parallel")
+# Start Nominatim this many seconds into a parallel lookup if Open-Meteo
+# hasn't answered yet (< 0: only after Open-Meteo comes back empty).
+GEOCODE_HEDGE_AFTER = float(os.getenv("GEOCODE_HEDGE_AFTER", "2.0"))
+
+
+async def _geocode_open_meteo(query, state, match_state):
+    """Search Open-Meteo geocoding; with `match_state`, only accept results in `state`."""
+    results = await GEOCODER.search(query, count=5)
+    if match_state:
+        return providers.admin1_match(results, state)
+    # Just take first result if no district specified
+    return providers.open_meteo_place(results[0], state) if results else None
+
+
+async def _geocode_nominatim(state, district, priority=INTERACTIVE):
+    q = f"{district}, {state}, India" if district else f"{state}, India"
+    nom = await NOMINATIM.search(q, count=1, priority=priority)
+    if not nom:
+        return None
+    return nom[0]["latitude"], nom[0]["longitude"], nom[0]["display_name"]
+
+
+def _geocode_strategies(state, district, name, priority=INTERACTIVE):
+    """[(label, coroutine factory)] in preference order: full name, district only, Nominatim."""
+    strategies = []
+    # Open-Meteo geocoding is skipped outright while its circuit is open
+    if http_clients.available("geocoding"):
+        strategies.append(("full", lambda: _geocode_open_meteo(name, state, match_state=bool(district))))
+        if district:
+            strategies.append(("district", lambda: _geocode_open_meteo(district, state, match_state=True)))
+    strategies.append(("nominatim", lambda: _geocode_nominatim(state, district, priority)))
+    return strategies
+
+
+async def _geocode_sequential(strategies):
+    error = None
+    for label, run in strategies:
+        try:
+            place = await run()
+        except httpx.HTTPError as e:
+            print(f"Geocoding strategy {label} failed: {e}")
+            error = e
+            continue
+        if place:
+            return place
+    if error is not None:
+        raise error
+    return None
+
+
+async def _geocode_parallel(strategies, hedge_after):
+    """Run the Open-Meteo strategies concurrently, starting Nominatim once they
+    come back empty/failed or after `hedge_after` seconds. The best-ranked
+    answer wins as soon as every higher-ranked strategy has finished; once
+    the hedge has fired, the best answer in hand wins.
+    """
+    *primary, (fallback_label, fallback) = strategies
+    ranked = [label for label, _ in strategies]
+    tasks = {label: asyncio.ensure_future(run()) for label, run in primary}
+    if not tasks or hedge_after == 0:
+        tasks[fallback_label] = asyncio.ensure_future(fallback())
+    loop = asyncio.get_running_loop()
+    hedge_at = loop.time() + hedge_after
+    hedged = False
+    error = None
+    try:
+        while True:
+            settled = True
+            for label in ranked:
+                task = tasks.get(label)
+                if task is None or not task.done():
+                    settled = False
+                    continue
+                if task.exception() is not None:
+                    error = task.exception()
+                elif task.result() and (settled or hedged):
+                    return task.result()
+            if settled:
+                # Every strategy has run and none found the place
+                if error is not None:
+                    raise error
+                return None
+            pending = [t for t in tasks.values() if not t.done()]
+            if fallback_label not in tasks:
+                timeout = hedge_at - loop.time() if hedge_after > 0 else None
+                if not pending or (timeout is not None and timeout <= 0):
+                    hedged = bool(pending)
+                    tasks[fallback_label] = asyncio.ensure_future(fallback())
+                    continue
+                await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark retrieved so asyncio doesn't log it
+
+
+async def geocode_region(state, district, name, cache_key, priority=INTERACTIVE):
+    """Resolve a state/district to (lat, lon, display_name) via the geocoding fallback chain.
+
+    `priority` orders the Nominatim fallback against other queued calls
+    (rate_limit.BACKGROUND for bulk jobs like the gazetteer build).
+    """
+    strategies = _geocode_strategies(state, district, name, priority)
+    try:
+        if GEOCODE_STRATEGY == "sequential":
+            place = await _geocode_sequential(strategies)
+        else:
+            place = await _geocode_parallel(strategies, GEOCODE_HEDGE_AFTER)
+
+        # If still no results, raise error
+        if not place or not place[0] or not place[1]:
+            raise HTTPException(
+                status_code=404, 
+                detail=f"Location not found: {name}. Please check spelling and try again."
+            )
+        lat, lon, display_name = place
+
+        # Cache the result
+        SUGGEST_INDEX.add(district or state, lat, lon, state)
+        entry = {"latitude": lat, "longitude": lon, "display_name": display_name}
+        GEOCODE_CACHE.set(cache_key, entry)
+        if SHARED_GEOCODES is not None:
+            now = time.time()
+            spawn(SHARED_GEOCODES.set(cache_key, entry, now + SHARED_GEOCODE_TTL, now), "shared cache write")
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=502, 
+            detail=f"Geocoding service error: {e.response.status_code}"
+        )
+    except httpx.TransportError as e:
+        if isinstance(e, UpstreamUnavailable):
+            raise upstream_error(e)
+        raise HTTPException(
+            status_code=502,
+            detail=f"Geocoding service unavailable: {e}"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Geocoding failed: {str(e)}"
+        )
+    return lat, lon, display_name
+
+
+async def resolve_region(state, district=None):
+    """Resolve a state/district to (lat, lon, display_name): gazetteer, geocode cache, then upstream."""
     # Build search name
     name = f"{district} {state}" if district else state
     cache_key = f"geo:{name.lower()}"
     
-    # Check cache first
-    if cache_key in GEOCODE_CACHE:
-        cached = GEOCODE_CACHE[cache_key]
-        lat = float(cached["latitude"])
-        lon = float(cached["longitude"])
-        display_name = cached.get("display_name") or name
-    else:
-        # Try multiple geocoding strategies
-        lat, lon, display_name = None, None, None
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                # Strategy 1: Try Open-Meteo with full name
-                geocode_url = "https://geocoding-api.open-meteo.com/v1/search"
-                params = {"name": name, "country": "IN", "count": 5}
-                r = await client.get(geocode_url, params=params, timeout=10.0)
-                r.raise_for_status()
-                results = r.json().get("results") or []
-                
-                # Filter results by state if we have district
-                if results and district:
-                    state_lower = state.lower()
-                    for result in results:
-                        admin1 = (result.get("admin1") or "").lower()
-                        if state_lower in admin1 or admin1 in state_lower:
-                            lat = float(result.get("latitude"))
-                            lon = float(result.get("longitude"))
-                            display_name = f"{result.get('name')}, {result.get('admin1', state)}, India"
-                            break
-                elif results:
-                    # Just take first result if no district specified
-                    result = results[0]
-                    lat = float(result.get("latitude"))
-                    lon = float(result.get("longitude"))
-                    display_name = f"{result.get('name')}, {result.get('admin1', state)}, India"
-                
-                # Strategy 2: If Open-Meteo failed, try with just district name
-                if not lat and district:
-                    params = {"name": district, "country": "IN", "count": 5}
-                    r = await client.get(geocode_url, params=params, timeout=10.0)
-                    r.raise_for_status()
-                    results = r.json().get("results") or []
-                    
-                    state_lower = state.lower()
-                    for result in results:
-                        admin1 = (result.get("admin1") or "").lower()
-                        if state_lower in admin1 or admin1 in state_lower:
-                            lat = float(result.get("latitude"))
-                            lon = float(result.get("longitude"))
-                            display_name = f"{result.get('name')}, {result.get('admin1', state)}, India"
-                            break
-                
-                # Strategy 3: Fallback to Nominatim (more comprehensive database)
-                if not lat:
-                    nom_url = "https://nominatim.openstreetmap.org/search"
-                    q = f"{district}, {state}, India" if district else f"{state}, India"
-                    params2 = {"format": "json", "q": q, "limit": 1, "addressdetails": 1}
-                    headers = {"User-Agent": "WeatherAI/1.0 (weather forecast app)"}
-                    r2 = await client.get(nom_url, params=params2, headers=headers, timeout=10.0)
-                    r2.raise_for_status()
-                    nom = r2.json()
-                    
-                    if nom:
-                        loc0 = nom[0]
-                        lat = float(loc0.get("lat"))
-                        lon = float(loc0.get("lon"))
-                        display_name = loc0.get("display_name")
-                
-                # If still no results, raise error
-                if not lat or not lon:
-                    raise HTTPException(
-                        status_code=404, 
-                        detail=f"Location not found: {name}. Please check spelling and try again."
-                    )
-                
-                # Cache the result
-                GEOCODE_CACHE[cache_key] = {
-                    "latitude": lat, 
-                    "longitude": lon, 
-                    "display_name": display_name
-                }
-                save_geocode_cache()
-                
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=502, 
-                detail=f"Geocoding service error: {e.response.status_code}"
-            )
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Geocoding failed: {str(e)}"
-            )
+    # Check the offline gazetteer, then the geocode cache
+    known = GAZETTEER.lookup(state, district)
+    if known:
+        return known
+    cached = await GEOCODE_CACHE.get(cache_key)
+    if cached:
+        return float(cached["latitude"]), float(cached["longitude"]), cached.get("display_name") or name
+    # Concurrent misses for the same place share one geocoding run
+    return await INFLIGHT.do(cache_key, lambda: _resolve_uncached(state, district, name, cache_key))
+
+
+async def _resolve_uncached(state, district, name, cache_key):
+    """Another worker may have geocoded the place already; else geocode it."""
+    if SHARED_GEOCODES is not None:
+        shared = await SHARED_GEOCODES.get(cache_key)
+        if shared is not None:
+            place = shared[0]
+            GEOCODE_CACHE.set(cache_key, place)
+            return float(place["latitude"]), float(place["longitude"]), place.get("display_name") or name
+    return await geocode_region(state, district, name, cache_key)
+
+
+@app.get("/api/weather/by-region")
+async def weather_by_region(request: Request, state: str, district: Optional[str] = None):
+    """Geocode a state+district in India and return current weather.
+    Uses multiple search strategies and fallbacks to ensure location is found.
+    Example: /api/weather/by-region?state=Karnataka&district=Bengaluru
+    """
+    lat, lon, display_name = await resolve_region(state, district)
     
     # Now fetch weather data
     try:
-        om_url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            "&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m"
-            "&timezone=auto"
-        )
-        async with httpx.AsyncClient() as client:
-            r3 = await client.get(om_url, timeout=10.0)
-            r3.raise_for_status()
-            data = r3.json()
-            current = data.get("current") or {}
-            result = {
-                "location": display_name,
-                "latitude": lat,
-                "longitude": lon,
-                "temperature_c": current.get("temperature_2m"),
-                "feels_like_c": current.get("apparent_temperature"),
-                "humidity": current.get("relative_humidity_2m"),
-                "precipitation": current.get("precipitation"),
-                "windspeed_kph": current.get("wind_speed_10m"),
-                "winddirection": current.get("wind_direction_10m"),
-                "weathercode": current.get("weather_code"),
-                "time": current.get("time"),
-                "source": "open-meteo",
-                "raw": current,
-            }
-            return result
+        data = await fetch_forecast(lat, lon)
+        etag, max_age = forecast_validators(data, lat, lon, "by-region", display_name, lat, lon)
+        unchanged = not_modified(request, etag, max_age)
+        if unchanged:
+            return unchanged
+        result = {
+            "location": display_name,
+            "latitude": lat,
+            "longitude": lon,
+            **normalize_current(data.get("current") or {}),
+            **freshness(data),
+        }
+        return cacheable_json(result, etag, max_age)
     except HTTPException:
         raise
     except httpx.HTTPStatusError as e:
@@ -269,6 +902,8 @@ async def weather_by_region(state: str, district: Optional[str] = None):
             status_code=502, 
             detail=f"Weather service error: {e.response.status_code}"
         )
+    except httpx.HTTPError as e:
+        raise upstream_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -276,381 +911,447 @@ async def weather_by_region(state: str, district: Optional[str] = None):
         )
 
 
+@app.post("/api/weather/batch")
+async def weather_batch(req: BatchQuery):
+    """Current weather for many locations in one request.
+
+    Each location is either {lat, lon} or {state, district}. Duplicates are
+    fetched once, and cache misses go upstream as multi-location requests.
+    Results keep the request order; a location that can't be resolved or
+    whose forecast chunk failed upstream gets an `error` entry instead of
+    failing the whole batch (only a batch where every forecast failed is an
+    error response).
+    """
+    if len(req.locations) > BATCH_MAX_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_LOCATIONS} locations per batch")
+
+    async def resolve(loc):
+        if loc.lat is not None and loc.lon is not None:
+            return loc.lat, loc.lon, None
+        if loc.state:
+            return await resolve_region(loc.state, loc.district)
+        raise HTTPException(status_code=400, detail="Each location needs lat/lon or state")
+
+    resolved = await asyncio.gather(*(resolve(loc) for loc in req.locations), return_exceptions=True)
+    coords = [(r[0], r[1]) for r in resolved if not isinstance(r, Exception)]
+    payloads = await fetch_forecasts(coords)
+    failures = [p for p in payloads if isinstance(p, Exception)]
+    if failures and len(failures) == len(payloads):
+        e = failures[0]
+        if isinstance(e, httpx.HTTPStatusError):
+            raise HTTPException(status_code=502, detail=f"Weather service error: {e.response.status_code}")
+        raise upstream_error(e)
+
+    payloads = iter(payloads)
+    results = []
+    for r in resolved:
+        if isinstance(r, Exception):
+            results.append({"error": getattr(r, "detail", str(r))})
+            continue
+        lat, lon, display_name = r
+        data = next(payloads)
+        if isinstance(data, Exception):
+            results.append({"latitude": lat, "longitude": lon, "error": upstream_error(data).detail})
+            continue
+        result = {"latitude": lat, "longitude": lon, **normalize_current(data.get("current") or {}), **freshness(data)}
+        if display_name:
+            result["location"] = display_name
+        results.append(result)
+    return {"results": results}
+
+
+# One poller per watched grid cell; it sleeps until the cached forecast is
+# due to expire, but never less than STREAM_MIN_INTERVAL seconds.
+STREAM_MAX_LOCATIONS = int(os.getenv("STREAM_MAX_LOCATIONS", "20"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+LIVE_UPDATES = LiveHub(
+    # Polls aren't demand (PREFETCH), and a just-expired entry is refetched
+    # rather than served stale, so a new observation is pushed without delay
+    fetch=lambda key: fetch_forecast(key[0], key[1], dict(key[2]), record=False, revalidate=True),
+    version=lambda data: (data.get("current") or {}).get("time"),
+    next_poll=FORECAST_CACHE.expires_in,
+    min_interval=float(os.getenv("STREAM_MIN_INTERVAL", "15")),
+)
+
+
+def _parse_loc(value):
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"loc must be 'lat,lon', got {value!r}")
+    return lat, lon
+
+
+@app.get("/api/weather/stream")
+async def weather_stream(loc: List[str] = Query(default=[]), state: Optional[str] = None,
+                         district: Optional[str] = None):
+    """Server-Sent Events with current weather for the given locations.
+
+    Pass `loc=lat,lon` (repeatable) and/or `state` + `district`. Each location
+    gets an `update` event straight away and then again whenever upstream
+    publishes a new observation; a comment line is sent every
+    STREAM_KEEPALIVE seconds so proxies keep the connection open. Event data
+    is the /api/weather/current shape plus `id` (the `loc` value, or
+    "state/district") and `latitude`/`longitude`.
+    """
+    if len(loc) + bool(state) > STREAM_MAX_LOCATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {STREAM_MAX_LOCATIONS} locations per stream")
+    targets = [(value, *_parse_loc(value), None) for value in loc]
+    if state:
+        lat, lon, display_name = await resolve_region(state, district)
+        targets.append((f"{state}/{district}" if district else state, lat, lon, display_name))
+    if not targets:
+        raise HTTPException(status_code=400, detail="Give at least one loc=lat,lon or a state")
+
+    # Clients in the same grid cell share a key, so map keys back to every target
+    by_key = {}
+    for target in targets:
+        by_key.setdefault(FORECAST_CACHE.key(target[1], target[2], FORECAST_PARAMS), []).append(target)
+
+    async def events():
+        sub = LIVE_UPDATES.subscribe(by_key)
+        try:
+            while True:
+                try:
+                    key, data = await asyncio.wait_for(sub.queue.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                for target_id, lat, lon, display_name in by_key[key]:
+                    update = {"id": target_id, "latitude": lat, "longitude": lon,
+                              **normalize_current(data.get("current") or {}), **freshness(data)}
+                    if display_name:
+                        update["location"] = display_name
+                    yield sse_event("update", update)
+        finally:
+            LIVE_UPDATES.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Alerts for every gazetteer district, recomputed every ALERT_INTERVAL seconds
+# (in the background when ALERTS_ENABLED, else on the first request after
+# that). Each refresh requests the whole district list from Open-Meteo
+# (mostly cache hits), so keep the interval in line with the upstream quota.
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1") == "1"
+ALERTS = AlertEngine(
+    load_rules(os.getenv("ALERT_RULES_FILE")),
+    places=lambda: [(s, d, lat, lon) for s, d, lat, lon, _ in GAZETTEER.entries() if d],
+    # A sweep of every district isn't demand: keep it out of prefetch and history
+    fetch_many=lambda coords: fetch_forecasts(coords, record=False),
+    hours=int(os.getenv("ALERT_HOURS", "168")),
+    interval=int(os.getenv("ALERT_INTERVAL", "3600")),
+)
+
+
+@app.get("/api/alerts")
+async def weather_alerts(request: Request, state: Optional[str] = None):
+    """Precomputed forecast alerts for the monitored districts of `state` (all states if omitted).
+
+    Districts come from the gazetteer; only those with at least one alert in
+    the forecast window are listed, each with the hours its rules matched.
+    """
+    try:
+        await ALERTS.ensure_fresh()
+    except httpx.HTTPError as e:
+        raise upstream_error(e)
+    etag = make_etag("alerts", ALERTS.generated_at, (state or "").strip().lower())
+    max_age = int(ALERTS.expires_in())
+    unchanged = not_modified(request, etag, max_age)
+    if unchanged:
+        return unchanged
+    return cacheable_json({
+        "state": state,
+        "generated_at": datetime.utcfromtimestamp(ALERTS.generated_at).isoformat(),
+        "places_evaluated": ALERTS.evaluated,
+        "districts": ALERTS.for_state(state),
+    }, etag, max_age)
+
+
+async def _suggest_upstream(q):
+    return await GEOCODER.search(q, count=10)
+
+
 @app.get("/api/geocode/suggest")
 async def geocode_suggest(state: str, q: str):
     """Return geocoding suggestions for a query constrained to India and optionally filtered by admin1 (state).
     Example: /api/geocode/suggest?state=Karnataka&q=Benga
     """
-    if not q:
+    # Normalized first, so whitespace or punctuation alone never goes upstream or into the cache
+    query = normalize_place(q)
+    if not query:
         raise HTTPException(status_code=400, detail="Missing query parameter 'q'")
+    # Answer from the local index when it has enough matches, or when the
+    # query already names a known place in full
+    local = SUGGEST_INDEX.search(q, state)
+    if len(local) >= SUGGEST_MIN_LOCAL or any(normalize_place(s["name"]) == query for s in local):
+        return {"suggestions": local}
     try:
-        geocode_url = "https://geocoding-api.open-meteo.com/v1/search"
-        params = {"name": q, "country": "IN", "count": 10}
-        async with httpx.AsyncClient() as client:
-            r = await client.get(geocode_url, params=params, timeout=10.0)
-            r.raise_for_status()
-            j = r.json()
-            results = j.get("results") or []
-            suggestions = []
-            lower_state = (state or "").strip().lower()
-            for item in results:
-                # item fields: name, latitude, longitude, country, admin1, admin2 (varies)
-                admin1 = (item.get("admin1") or "").strip().lower()
-                name = item.get("name")
-                display = item.get("name")
-                if item.get("admin1"):
-                    display = f"{item.get('name')}, {item.get('admin1')}"
-                # If a state was provided, filter by admin1 equality or substring match
-                if lower_state:
-                    if lower_state in admin1 or admin1 in lower_state:
-                        suggestions.append({"name": name, "display_name": display, "latitude": item.get("latitude"), "longitude": item.get("longitude"), "admin1": item.get("admin1")})
-                else:
+        # Each query goes upstream once; its answer is reused for any state filter
+        results = SUGGEST_UPSTREAM_CACHE.get(query)
+        if results is None:
+            results = await INFLIGHT.do(("suggest", query), lambda: _suggest_upstream(q))
+            SUGGEST_UPSTREAM_CACHE.set(query, results)
+            SUGGEST_INDEX.add_results(results)
+        suggestions = []
+        lower_state = (state or "").strip().lower()
+        for item in results:
+            # item fields: name, latitude, longitude, country, admin1, admin2 (varies)
+            admin1 = (item.get("admin1") or "").strip().lower()
+            name = item.get("name")
+            display = item.get("name")
+            if item.get("admin1"):
+                display = f"{item.get('name')}, {item.get('admin1')}"
+            # If a state was provided, filter by admin1 equality or substring match
+            if lower_state:
+                if lower_state in admin1 or admin1 in lower_state:
                     suggestions.append({"name": name, "display_name": display, "latitude": item.get("latitude"), "longitude": item.get("longitude"), "admin1": item.get("admin1")})
-            return {"suggestions": suggestions}
-    except httpx.HTTPStatusError as e:
-        detail = f"Geocode upstream HTTP error: {e.response.status_code} for {e.request.url}"
+            else:
+                suggestions.append({"name": name, "display_name": display, "latitude": item.get("latitude"), "longitude": item.get("longitude"), "admin1": item.get("admin1")})
+        # Top up with local matches upstream didn't return
+        returned = {(s["name"], s["admin1"]) for s in suggestions}
+        suggestions.extend(s for s in local if (s["name"], s["admin1"]) not in returned)
+        return {"suggestions": suggestions[:10]}
+    except httpx.HTTPError as e:
+        # Local matches are still worth showing while upstream is failing
+        if local:
+            return {"suggestions": local}
+        if isinstance(e, UpstreamUnavailable):
+            raise upstream_error(e)
+        if isinstance(e, httpx.HTTPStatusError):
+            detail = f"Geocode upstream HTTP error: {e.response.status_code} for {e.request.url}"
+        else:
+            detail = f"Geocode upstream unavailable: {e}"
         raise HTTPException(status_code=502, detail=detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+OPENAI_CHAT_URL = f"{providers.OPENAI_BASE_URL}/chat/completions"
+AI_SYSTEM_PROMPT = """You are a helpful, friendly weather assistant. Answer ANY weather-related question naturally and conversationally. 
+
+Provide:
+- Direct answers to the user's specific question
+- Practical advice and recommendations when relevant
+- Safety tips for extreme conditions
+- Clothing suggestions when appropriate
+- Activity recommendations based on weather
+- Context about why the weather is the way it is
+
+Be conversational, helpful, and specific. Use the weather data provided. Keep responses under 200 words but be thorough."""
+NO_LOCATION_ANSWER = {
+    "answer": "I need a location to provide weather insights. Please select a location first, then ask me anything about the weather!",
+    "mode": "rule-based",
+    "provenance": []
+}
+
+
+async def load_ai_weather(req):
+    """Fetch (current, hourly) for the AI assistant, or (None, None) without a usable location."""
+    if req.lat is None or req.lon is None:
+        return None, None
+    try:
+        # Get current weather with full details + hourly forecast
+        data = await fetch_forecast(req.lat, req.lon)
+        return data.get("current") or {}, data.get("hourly") or {}
+    except Exception:
+        return None, None
+
+
+# OpenAI answers reused for the same question about (roughly) the same weather.
+# Entries expire on the forecast cache's update boundary, when the data changes.
+AI_ANSWER_CACHE = ForecastCache(
+    maxsize=int(os.getenv("AI_ANSWER_CACHE_SIZE", "1024")),
+    interval=FORECAST_CACHE.interval,
+)
+_QUERY_FILLER = {"a", "an", "the", "is", "it", "be", "there", "will", "would", "should", "i", "me", "my", "please", "today", "now", "right", "going", "to"}
+
+
+def normalize_question(query):
+    """Reduce a question to its content words so trivial rephrasings share a cache entry."""
+    words = re.findall(r"[a-z0-9]+", query.lower())
+    return " ".join(w for w in words if w not in _QUERY_FILLER)
+
+
+def _quantize(value, step):
+    return None if value is None else round(float(value) / step) * step
+
+
+def weather_fingerprint(weather, hourly_data):
+    """Quantized snapshot of the values build_ai_context() reports."""
+    precip_probs = (hourly_data or {}).get("precipitation_probability", [])[:12]
+    temps = (hourly_data or {}).get("temperature_2m", [])[:12]
+    return (
+        _quantize(weather.get("temperature_2m"), 1),
+        _quantize(weather.get("apparent_temperature"), 1),
+        _quantize(weather.get("relative_humidity_2m"), 5),
+        _quantize(weather.get("wind_speed_10m"), 5),
+        _quantize(weather.get("wind_direction_10m"), 45),
+        _quantize(weather.get("precipitation", 0), 0.5),
+        _quantize(weather.get("cloud_cover", 0), 10),
+        _quantize(weather.get("pressure_msl", 0), 2),
+        weather.get("weather_code"),
+        _quantize(max(precip_probs), 10) if precip_probs else None,
+        (_quantize(min(temps), 1), _quantize(max(temps), 1)) if temps else None,
+    )
+
+
+def ai_answer_key(query, weather, hourly_data):
+    return (normalize_question(query), weather_fingerprint(weather, hourly_data))
+
+
+def build_ai_context(weather, hourly_data):
+    """Build the weather context block sent to OpenAI."""
+    context_parts = [
+        "Current weather conditions:",
+        f"- Temperature: {weather.get('temperature_2m')}°C (feels like {weather.get('apparent_temperature')}°C)",
+        f"- Humidity: {weather.get('relative_humidity_2m')}%",
+        f"- Wind: {weather.get('wind_speed_10m')} km/h from {weather.get('wind_direction_10m')}°",
+        f"- Precipitation: {weather.get('precipitation', 0)} mm",
+        f"- Cloud cover: {weather.get('cloud_cover', 0)}%",
+        f"- Pressure: {weather.get('pressure_msl', 0)} hPa",
+        f"- Weather code: {weather.get('weather_code')}"
+    ]
+    
+    # Add hourly forecast data
+    if hourly_data and hourly_data.get("precipitation_probability"):
+        precip_probs = hourly_data.get("precipitation_probability", [])[:12]
+        max_precip = max(precip_probs) if precip_probs else 0
+        avg_precip = sum(precip_probs) / len(precip_probs) if precip_probs else 0
+        context_parts.append(f"- Precipitation probability (next 12h): max {max_precip}%, avg {avg_precip:.1f}%")
+    
+    if hourly_data and hourly_data.get("temperature_2m"):
+        temps = hourly_data.get("temperature_2m", [])[:12]
+        if temps:
+            max_temp = max(temps)
+            min_temp = min(temps)
+            context_parts.append(f"- Temperature range (next 12h): {min_temp:.1f}°C to {max_temp:.1f}°C")
+    
+    return "\n".join(context_parts)
+
+
+def openai_chat_request(context, query, stream=False):
+    """Return (headers, body) for an OpenAI chat completion about the weather."""
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+    body = {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"{context}\n\nUser question: {query}\n\nProvide a helpful, natural answer."
+            }
+        ],
+        "max_tokens": 300,
+        "temperature": 0.7,
+    }
+    if stream:
+        body["stream"] = True
+    return headers, body
+
+
 @app.post("/api/ai/query")
 async def ai_query(req: AIQuery):
     """Smart AI weather assistant that handles any weather-related question naturally."""
     q = req.query.strip().lower()
-    weather = None
-    hourly_data = None
     
     # Fetch comprehensive weather data if location provided
-    if req.lat is not None and req.lon is not None:
-        try:
-            # Get current weather with full details + hourly forecast
-            url = (
-                f"https://api.open-meteo.com/v1/forecast?latitude={req.lat}&longitude={req.lon}"
-                "&current=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m,wind_direction_10m,pressure_msl,cloud_cover"
-                "&hourly=temperature_2m,precipitation_probability,weather_code,wind_speed_10m"
-                "&forecast_hours=24&timezone=auto"
-            )
-            async with httpx.AsyncClient() as client:
-                r = await client.get(url, timeout=10.0)
-                r.raise_for_status()
-                data = r.json()
-                weather = data.get("current") or {}
-                hourly_data = data.get("hourly") or {}
-        except Exception:
-            weather = None
-            hourly_data = None
+    weather, hourly_data = await load_ai_weather(req)
 
     # If OpenAI API key is available, use it for intelligent, natural responses
     if OPENAI_API_KEY and weather:
+        answer_key = ai_answer_key(req.query, weather, hourly_data)
+        cached = AI_ANSWER_CACHE.get(answer_key)
+        if cached:
+            return {"answer": cached, "mode": "openai", "provenance": ["openai", "open-meteo"], "cached": True}
         try:
-            # Build comprehensive weather context
-            context_parts = [
-                "Current weather conditions:",
-                f"- Temperature: {weather.get('temperature_2m')}°C (feels like {weather.get('apparent_temperature')}°C)",
-                f"- Humidity: {weather.get('relative_humidity_2m')}%",
-                f"- Wind: {weather.get('wind_speed_10m')} km/h from {weather.get('wind_direction_10m')}°",
-                f"- Precipitation: {weather.get('precipitation', 0)} mm",
-                f"- Cloud cover: {weather.get('cloud_cover', 0)}%",
-                f"- Pressure: {weather.get('pressure_msl', 0)} hPa",
-                f"- Weather code: {weather.get('weather_code')}"
-            ]
-            
-            # Add hourly forecast data
-            if hourly_data and hourly_data.get("precipitation_probability"):
-                precip_probs = hourly_data.get("precipitation_probability", [])[:12]
-                max_precip = max(precip_probs) if precip_probs else 0
-                avg_precip = sum(precip_probs) / len(precip_probs) if precip_probs else 0
-                context_parts.append(f"- Precipitation probability (next 12h): max {max_precip}%, avg {avg_precip:.1f}%")
-            
-            if hourly_data and hourly_data.get("temperature_2m"):
-                temps = hourly_data.get("temperature_2m", [])[:12]
-                if temps:
-                    max_temp = max(temps)
-                    min_temp = min(temps)
-                    context_parts.append(f"- Temperature range (next 12h): {min_temp:.1f}°C to {max_temp:.1f}°C")
+            headers, body = openai_chat_request(build_ai_context(weather, hourly_data), req.query)
+            resp = await get_client("openai").post(OPENAI_CHAT_URL, json=body, headers=headers)
+            resp.raise_for_status()
+            j = resp.json()
             
-            context = "\n".join(context_parts)
-            
-            async with httpx.AsyncClient() as client:
-                headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-                body = {
-                    "model": "gpt-3.5-turbo",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": """You are a helpful, friendly weather assistant. Answer ANY weather-related question naturally and conversationally. 
-
-Provide:
-- Direct answers to the user's specific question
-- Practical advice and recommendations when relevant
-- Safety tips for extreme conditions
-- Clothing suggestions when appropriate
-- Activity recommendations based on weather
-- Context about why the weather is the way it is
-
-Be conversational, helpful, and specific. Use the weather data provided. Keep responses under 200 words but be thorough."""
-                        },
-                        {
-                            "role": "user",
-                            "content": f"{context}\n\nUser question: {req.query}\n\nProvide a helpful, natural answer."
-                        }
-                    ],
-                    "max_tokens": 300,
-                    "temperature": 0.7,
-                }
-                resp = await client.post("https://api.openai.com/v1/chat/completions", json=body, headers=headers, timeout=15.0)
-                resp.raise_for_status()
-                j = resp.json()
-                
-                if isinstance(j, dict) and j.get("choices"):
-                    answer = j["choices"][0].get("message", {}).get("content", "").strip()
-                    if answer:
-                        return {"answer": answer, "mode": "openai", "provenance": ["openai", "open-meteo"]}
+            if isinstance(j, dict) and j.get("choices"):
+                answer = j["choices"][0].get("message", {}).get("content", "").strip()
+                if answer:
+                    AI_ANSWER_CACHE.set(answer_key, answer)
+                    return {"answer": answer, "mode": "openai", "provenance": ["openai", "open-meteo"]}
         except Exception as e:
             print(f"OpenAI call failed: {e}")
             # Fall through to rule-based
 
     # Enhanced rule-based responses - handle ANY weather question
     if not weather:
-        return {
-            "answer": "I need a location to provide weather insights. Please select a location first, then ask me anything about the weather!",
-            "mode": "rule-based",
-            "provenance": []
-        }
-    
-    # Extract weather data
-    temp = weather.get("temperature_2m", 0)
-    feels_like = weather.get("apparent_temperature", temp)
-    humidity = weather.get("relative_humidity_2m", 0)
-    wind_speed = weather.get("wind_speed_10m", 0)
-    wind_direction = weather.get("wind_direction_10m", 0)
-    precipitation = weather.get("precipitation", 0)
-    weather_code = weather.get("weather_code", 0)
-    cloud_cover = weather.get("cloud_cover", 0)
-    pressure = weather.get("pressure_msl", 0)
-    
-    # Calculate rain probability and temperature trends from hourly data
-    will_rain = False
-    max_precip_prob = 0
-    avg_precip_prob = 0
-    temp_trend = "stable"
-    
-    if hourly_data:
-        if hourly_data.get("precipitation_probability"):
-            precip_probs = hourly_data.get("precipitation_probability", [])[:12]
-            max_precip_prob = max(precip_probs) if precip_probs else 0
-            avg_precip_prob = sum(precip_probs) / len(precip_probs) if precip_probs else 0
-            will_rain = max_precip_prob > 40
-        
-        if hourly_data.get("temperature_2m"):
-            temps = hourly_data.get("temperature_2m", [])[:6]
-            if len(temps) >= 2:
-                if temps[-1] > temps[0] + 2:
-                    temp_trend = "rising"
-                elif temps[-1] < temps[0] - 2:
-                    temp_trend = "falling"
-    
-    # Intelligent question matching - handle various phrasings
-    answer = None
-    
-    # Rain/precipitation queries (very flexible matching)
-    rain_keywords = ["rain", "raining", "rainy", "umbrella", "wet", "precipitation", "drizzle", "shower", "downpour", "pour"]
-    if any(keyword in q for keyword in rain_keywords):
-        if precipitation > 0:
-            answer = f"Yes, it's currently raining with {precipitation}mm of precipitation. "
-            if max_precip_prob > 60:
-                answer += f"And it's likely to continue - {max_precip_prob}% chance in the next 12 hours. "
-            answer += "I recommend carrying an umbrella and wearing waterproof clothing."
-        elif will_rain:
-            answer = f"Not raining right now, but there's a {max_precip_prob}% chance of rain in the next 12 hours (average {avg_precip_prob:.0f}%). "
-            if max_precip_prob > 70:
-                answer += "Better carry an umbrella - rain is very likely!"
-            else:
-                answer += "You might want to carry an umbrella just in case."
-        else:
-            answer = f"No rain expected! Current conditions are clear with only a {max_precip_prob}% chance of rain. "
-            if cloud_cover > 50:
-                answer += f"Though it's {cloud_cover}% cloudy, precipitation is unlikely."
-            else:
-                answer += "You can leave the umbrella at home."
-    
-    # Temperature queries (flexible)
-    temp_keywords = ["temperature", "hot", "cold", "warm", "cool", "degree", "celsius", "heat", "freeze", "freezing"]
-    if not answer and any(keyword in q for keyword in temp_keywords):
-        answer = f"The temperature is {temp}°C (feels like {feels_like}°C). "
-        
-        if temp_trend == "rising":
-            answer += "It's getting warmer. "
-        elif temp_trend == "falling":
-            answer += "It's getting cooler. "
-        
-        if temp > 35:
-            answer += "Very hot! Stay hydrated, wear light clothing, and avoid direct sun during peak hours. Seek shade and air conditioning."
-        elif temp > 28:
-            answer += "Warm weather. Light, breathable clothing recommended. Don't forget sunscreen and stay hydrated!"
-        elif temp > 20:
-            answer += "Pleasant temperature - perfect for outdoor activities. Light layers recommended."
-        elif temp > 10:
-            answer += "Cool weather. Consider wearing a light jacket or sweater."
-        elif temp > 0:
-            answer += "Cold! Dress warmly with layers, jacket, and possibly a scarf."
-        else:
-            answer += "Freezing temperatures! Bundle up with heavy winter clothing, hat, gloves, and scarf."
-    
-    # Wind queries
-    wind_keywords = ["wind", "windy", "breeze", "breezy", "gust", "blow", "blowing"]
-    if not answer and any(keyword in q for keyword in wind_keywords):
-        # Wind direction compass
-        directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
-        direction_index = round(wind_direction / 22.5) % 16
-        wind_dir_text = directions[direction_index]
-        
-        answer = f"Wind is blowing at {wind_speed} km/h from the {wind_dir_text} ({wind_direction}°). "
-        
-        if wind_speed > 40:
-            answer += "Very windy! Secure loose objects, be cautious outdoors. Not ideal for outdoor activities. Strong winds can be dangerous."
-        elif wind_speed > 25:
-            answer += "Moderately windy. You'll feel a noticeable breeze. Good for kite flying, but secure light objects."
-        elif wind_speed > 10:
-            answer += "Light breeze. Pleasant conditions with gentle wind. Perfect for outdoor activities."
-        else:
-            answer += "Calm conditions with minimal wind. Great for outdoor dining, picnics, or any outdoor activity!"
-    
-    # Clothing/what to wear queries
-    clothing_keywords = ["wear", "clothing", "clothes", "dress", "outfit", "jacket", "coat", "shirt", "pants"]
-    if not answer and any(keyword in q for keyword in clothing_keywords):
-        recommendations = []
-        
-        if temp > 30:
-            recommendations.append("light, breathable fabrics like cotton or linen")
-            recommendations.append("shorts and t-shirts")
-        elif temp > 25:
-            recommendations.append("comfortable summer clothing")
-        elif temp > 20:
-            recommendations.append("light casual wear")
-        elif temp > 15:
-            recommendations.append("light jacket or cardigan")
-        elif temp > 10:
-            recommendations.append("sweater or hoodie")
-        elif temp > 0:
-            recommendations.append("warm jacket and layers")
-        else:
-            recommendations.append("heavy winter coat, hat, gloves, and scarf")
-        
-        if will_rain or precipitation > 0:
-            recommendations.append("waterproof jacket or umbrella")
-        if wind_speed > 20:
-            recommendations.append("windbreaker")
-        if temp > 28 and cloud_cover < 50:
-            recommendations.append("sunglasses, hat, and sunscreen")
-        if humidity > 70:
-            recommendations.append("moisture-wicking fabrics")
-        
-        answer = f"Based on {temp}°C (feels like {feels_like}°C) and current conditions, I recommend: {', '.join(recommendations)}. "
-        if will_rain:
-            answer += f"There's a {max_precip_prob}% chance of rain, so definitely bring rain protection!"
-    
-    # Activity/outdoor queries
-    activity_keywords = ["activity", "activities", "do", "plan", "outdoor", "outside", "go out", "outing", "picnic", "hike", "walk", "run", "exercise", "sport"]
-    if not answer and any(keyword in q for keyword in activity_keywords):
-        if precipitation > 0 or will_rain:
-            answer = f"Rain {'is falling' if precipitation > 0 else 'is likely'} ({max_precip_prob}% chance). Indoor activities recommended: museums, shopping malls, cafes, movie theaters, or indoor sports facilities."
-        elif temp > 35:
-            answer = f"Very hot ({temp}°C). Best activities: swimming, water parks, indoor activities with AC, or wait until evening. If going out, stay in shade, hydrate frequently, and take breaks."
-        elif temp < 5:
-            answer = f"Very cold ({temp}°C). Good for: indoor activities, warm cafes, ice skating (if available), or bundled-up winter walks. Keep outdoor time limited."
-        elif wind_speed > 35:
-            answer = f"Very windy ({wind_speed} km/h). Indoor activities safer. If going out, secure belongings, avoid tall structures, and be cautious near trees."
-        else:
-            answer = f"Great weather! Perfect for: outdoor sports, picnics, hiking, cycling, jogging, sightseeing, or park visits. "
-            if temp > 25:
-                answer += "Morning or evening activities recommended to avoid peak heat."
-            elif temp < 15:
-                answer += "Dress warmly for outdoor activities."
-    
-    # Cloud/sky queries
-    cloud_keywords = ["cloud", "cloudy", "overcast", "sky", "clear", "sunny", "sun"]
-    if not answer and any(keyword in q for keyword in cloud_keywords):
-        if cloud_cover < 20:
-            answer = f"Clear skies with only {cloud_cover}% cloud cover. Perfect sunny weather! "
-            if temp > 28:
-                answer += "Don't forget sunscreen and sunglasses."
-        elif cloud_cover < 50:
-            answer = f"Partly cloudy with {cloud_cover}% cloud cover. Mix of sun and clouds. "
-        elif cloud_cover < 80:
-            answer = f"Mostly cloudy with {cloud_cover}% cloud cover. Limited sunshine. "
-        else:
-            answer = f"Overcast with {cloud_cover}% cloud cover. Very cloudy skies. "
-        
-        if will_rain:
-            answer += f"Rain is possible ({max_precip_prob}% chance)."
-    
-    # Humidity queries
-    humidity_keywords = ["humid", "humidity", "muggy", "sticky", "damp", "moisture"]
-    if not answer and any(keyword in q for keyword in humidity_keywords):
-        answer = f"Humidity is at {humidity}%. "
-        
-        if humidity > 80:
-            answer += "Very humid and uncomfortable. The air feels heavy and sticky. Wear breathable fabrics and stay hydrated."
-        elif humidity > 60:
-            answer += "Moderately humid. You'll notice the moisture in the air. Light, breathable clothing recommended."
-        elif humidity > 40:
-            answer += "Comfortable humidity levels. Not too dry, not too humid."
-        else:
-            answer += "Low humidity - the air is quite dry. Good for outdoor activities, but stay hydrated."
-    
-    # Pressure queries
-    pressure_keywords = ["pressure", "barometric", "atmospheric"]
-    if not answer and any(keyword in q for keyword in pressure_keywords):
-        answer = f"Atmospheric pressure is {pressure} hPa. "
-        
-        if pressure > 1020:
-            answer += "High pressure - typically associated with clear, stable weather."
-        elif pressure > 1010:
-            answer += "Normal pressure - stable weather conditions."
-        else:
-            answer += "Low pressure - often associated with unsettled weather and possible precipitation."
-    
-    # General/summary queries or unmatched questions
-    if not answer:
-        # Provide comprehensive summary for any other weather question
-        conditions = []
-        
-        if temp > 30:
-            conditions.append(f"hot at {temp}°C")
-        elif temp > 20:
-            conditions.append(f"pleasant at {temp}°C")
-        elif temp < 15:
-            conditions.append(f"cool at {temp}°C")
-        else:
-            conditions.append(f"{temp}°C")
-        
-        if humidity > 70:
-            conditions.append(f"{humidity}% humidity (humid)")
-        if wind_speed > 20:
-            conditions.append(f"windy at {wind_speed} km/h")
-        if cloud_cover > 70:
-            conditions.append(f"{cloud_cover}% cloudy")
-        if will_rain:
-            conditions.append(f"{max_precip_prob}% chance of rain")
-        
-        condition_str = ", ".join(conditions) if conditions else "moderate conditions"
-        
-        answer = f"Current weather: {condition_str}. "
-        answer += f"Feels like {feels_like}°C. "
-        
-        if precipitation > 0:
-            answer += f"Currently raining ({precipitation}mm). "
-        elif will_rain:
-            answer += f"Rain possible in next 12 hours ({max_precip_prob}% chance). "
-        
-        if temp_trend == "rising":
-            answer += "Temperature is rising. "
-        elif temp_trend == "falling":
-            answer += "Temperature is falling. "
-        
-        answer += "\n\nFeel free to ask me specific questions about temperature, rain, wind, clothing, activities, or anything else weather-related!"
-    
-    return {"answer": answer, "mode": "rule-based", "provenance": ["open-meteo"]}
+        return NO_LOCATION_ANSWER
+    return rule_based_answer(q, weather, hourly_data)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_openai(context, query):
+    """Yield content deltas from a streaming OpenAI chat completion."""
+    headers, body = openai_chat_request(context, query, stream=True)
+    async with get_client("openai").stream("POST", OPENAI_CHAT_URL, json=body, headers=headers) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            choices = json.loads(payload).get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                yield delta
+
+
+@app.post("/api/ai/query/stream")
+async def ai_query_stream(req: AIQuery):
+    """Server-Sent Events version of /api/ai/query.
+
+    Emits `delta` events with answer text as it is produced, then one `done`
+    event carrying `mode` and `provenance`. Without an OpenAI key (or if the
+    OpenAI stream fails before its first token) the rule-based answer is sent
+    as a single delta straight away.
+    """
+    q = req.query.strip().lower()
 
+    async def events():
+        weather, hourly_data = await load_ai_weather(req)
+        if OPENAI_API_KEY and weather:
+            answer_key = ai_answer_key(req.query, weather, hourly_data)
+            cached = AI_ANSWER_CACHE.get(answer_key)
+            if cached:
+                yield sse_event("delta", {"text": cached})
+                yield sse_event("done", {"mode": "openai", "provenance": ["openai", "open-meteo"], "cached": True})
+                return
+            sent = False
+            parts = []
+            try:
+                async for delta in _stream_openai(build_ai_context(weather, hourly_data), req.query):
+                    sent = True
+                    parts.append(delta)
+                    yield sse_event("delta", {"text": delta})
+                if sent:
+                    AI_ANSWER_CACHE.set(answer_key, "".join(parts).strip())
+                    yield sse_event("done", {"mode": "openai", "provenance": ["openai", "open-meteo"]})
+                    return
+            except Exception as e:
+                print(f"OpenAI stream failed: {e}")
+                if sent:
+                    yield sse_event("error", {"detail": "AI stream interrupted"})
+                    yield sse_event("done", {"mode": "openai", "provenance": ["openai", "open-meteo"]})
+                    return
+        result = rule_based_answer(q, weather, hourly_data) if weather else NO_LOCATION_ANSWER
+        yield sse_event("delta", {"text": result["answer"]})
+        yield sse_event("done", {"mode": result["mode"], "provenance": result["provenance"]})
 
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
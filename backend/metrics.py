@@ -0,0 +1,221 @@
+"""Minimal Prometheus text-format metrics, no client library required.
+
+Counters, gauges and histograms are kept in-process and rendered by the
+/metrics endpoint. Values that already live elsewhere (cache hit counts,
+circuit state) are read at scrape time by registered collectors instead of
+being mirrored here.
+"""
+import bisect
+import math
+import time
+
+# Seconds; spans cache hits (sub-ms) through upstream timeouts (10 s+)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            # per-bucket (non-cumulative) counts, then sum and count
+            entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register `fn() -> iterable of metrics`, rebuilt on every scrape.
+
+        A collector with the same module and name replaces the old one, so a
+        re-imported module (tests, bench_load.py) doesn't report twice.
+        """
+        name = (fn.__module__, fn.__qualname__)
+        self._collectors = [c for c in self._collectors if (c.__module__, c.__qualname__) != name]
+        self._collectors.append(fn)
+        return fn
+
+    def reset(self):
+        """Zero every metric (a fresh start for a benchmark scenario)."""
+        for metric in self._metrics:
+            metric._values.clear()
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for fn in self._collectors:
+            for metric in fn():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "weather_http_request_duration_seconds", "Time to response headers per route.", ("method", "route", "status")
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("weather_http_requests_in_flight", "Requests currently being handled.")
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "weather_upstream_request_duration_seconds", "Outbound call latency per provider.", ("upstream", "outcome")
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "weather_upstream_errors_total", "Failed or rejected outbound calls per provider.", ("upstream", "outcome")
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request to its response headers, labelled
+    by route template (not raw path, to keep label cardinality bounded)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        responded = False
+
+        def observe(status):
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+
+        async def send_wrapper(message):
+            nonlocal responded
+            if message["type"] == "http.response.start" and not responded:
+                responded = True
+                observe(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not responded:
+                observe(500)
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+
+
+def observe_upstream(name, seconds, outcome):
+    """GuardedTransport callback; outcome is ok, error, transport_error, open or saturated."""
+    if outcome in ("open", "saturated"):
+        UPSTREAM_ERRORS.inc(upstream=name, outcome=outcome)
+        return
+    UPSTREAM_SECONDS.observe(seconds, upstream=name, outcome=outcome)
+    if outcome != "ok":
+        UPSTREAM_ERRORS.inc(upstream=name, outcome=outcome)
+
+
+def cache_metrics(caches):
+    """Metrics for {name: stats()} of ForecastCache-style caches, built per scrape."""
+    hits = Counter("weather_cache_hits_total", "Cache hits since start.", ("cache",))
+    misses = Counter("weather_cache_misses_total", "Cache misses since start.", ("cache",))
+    ratio = Gauge("weather_cache_hit_ratio", "Hits / lookups since start.", ("cache",))
+    size = Gauge("weather_cache_entries", "Entries currently cached.", ("cache",))
+    for name, stats in caches.items():
+        hits.inc(stats["hits"], cache=name)
+        misses.inc(stats["misses"], cache=name)
+        ratio.set(stats["hit_ratio"], cache=name)
+        if "size" in stats:  # unknown for the shared tier
+            size.set(stats["size"], cache=name)
+    return [hits, misses, ratio, size]
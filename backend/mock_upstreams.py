@@ -0,0 +1,190 @@
+"""Local stand-in for Open-Meteo, Open-Meteo geocoding, Nominatim and OpenAI.
+
+Used by bench_load.py through `http_clients.open_clients(transport=...)`, so
+the app runs unmodified while every outbound call is answered in-process.
+Places come from the frontend's indianStates.json, so region lookups,
+admin1 matching and typeahead behave like the real services. Latency,
+jitter, error and timeout rates are configurable per upstream, and every call
+is counted.
+
+Requests are dispatched on the URL path, so the stand-in works whatever base
+URL the app is configured with.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+
+STATES_FILE = Path(__file__).resolve().parents[1] / "frontend" / "src" / "data" / "indianStates.json"
+
+# URL path -> upstream name (matches http_clients.UPSTREAMS)
+ROUTES = {
+    "/v1/forecast": "open-meteo",
+    "/v1/search": "geocoding",
+    "/search": "nominatim",
+    "/v1/chat/completions": "openai",
+}
+
+
+@lru_cache(maxsize=65536)
+def _unit(*parts):
+    """Deterministic float in [0, 1) for `parts`."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+class Places:
+    """The app's state/district list with stable fake coordinates."""
+
+    def __init__(self, states_file=STATES_FILE):
+        with open(states_file, "r", encoding="utf-8") as f:
+            states = json.load(f)
+        self.places = []  # (name, state)
+        for item in states:
+            self.places.append((item["state"], item["state"]))
+            self.places.extend((district, item["state"]) for district in item.get("districts", []))
+        self._by_name = {}
+        for name, state in self.places:
+            self._by_name.setdefault(name.lower(), []).append((name, state))
+
+    @staticmethod
+    def coords(name, state):
+        return round(8 + 26 * _unit("lat", name, state), 4), round(69 + 28 * _unit("lon", name, state), 4)
+
+    def search(self, query, limit):
+        """Exact name first, then "<district> <state>", then name prefixes."""
+        q = query.strip().lower()
+        found = list(self._by_name.get(q, []))
+        if not found:
+            for name, state in self.places:
+                if q == f"{name} {state}".lower():
+                    found.append((name, state))
+        if not found:
+            found = [p for p in self.places if p[0].lower().startswith(q)]
+        return found[:limit]
+
+
+class MockUpstreams:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, timeout_rate=0.0, seed=1, overrides=None):
+        self.defaults = {"latency": latency, "jitter": jitter, "error_rate": error_rate, "timeout_rate": timeout_rate}
+        self.overrides = overrides or {}  # upstream -> {field: value}
+        self.places = Places()
+        self.calls = Counter()
+        self.errors = Counter()
+        self._rng = random.Random(seed)
+
+    def setting(self, upstream, field):
+        return self.overrides.get(upstream, {}).get(field, self.defaults[field])
+
+    def reset(self):
+        self.calls.clear()
+        self.errors.clear()
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        upstream = ROUTES.get(request.url.path)
+        if upstream is None:
+            return httpx.Response(404, json={"error": "unknown path"})
+        self.calls[upstream] += 1
+        delay = self.setting(upstream, "latency") + self._rng.uniform(0, self.setting(upstream, "jitter"))
+        if self._rng.random() < self.setting(upstream, "timeout_rate"):
+            self.errors[upstream] += 1
+            await asyncio.sleep(delay)
+            raise httpx.ReadTimeout("injected timeout", request=request)
+        await asyncio.sleep(delay)
+        if self._rng.random() < self.setting(upstream, "error_rate"):
+            self.errors[upstream] += 1
+            return httpx.Response(503, json={"error": "injected failure"})
+        return getattr(self, "_" + upstream.replace("-", "_"))(request)
+
+    def _open_meteo(self, request):
+        p = request.url.params
+        lats = [float(v) for v in p.get("latitude", "0").split(",")]
+        lons = [float(v) for v in p.get("longitude", "0").split(",")]
+        current_vars = tuple(v for v in p.get("current", "").split(",") if v)
+        hourly_vars = tuple(v for v in p.get("hourly", "").split(",") if v)
+        hours = int(p.get("forecast_hours", "168"))
+        now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        quarter = now - timedelta(minutes=now.minute % 15)
+        bodies = []
+        for lat, lon in zip(lats, lons):
+            body = {"latitude": lat, "longitude": lon, "utc_offset_seconds": 0, "timezone": "GMT"}
+            if current_vars:
+                body["current"] = {"time": quarter.strftime("%Y-%m-%dT%H:%M"), "interval": 900}
+                body["current"].update({v: _value(v, lat, lon, 0) for v in current_vars})
+            if hourly_vars:
+                body["hourly"] = _hourly(round(lat, 2), round(lon, 2), hourly_vars, hours, now.replace(minute=0))
+            bodies.append(body)
+        return httpx.Response(200, json=bodies if len(bodies) > 1 else bodies[0])
+
+    def _geocoding(self, request):
+        p = request.url.params
+        results = []
+        for name, state in self.places.search(p.get("name", ""), int(p.get("count", "10"))):
+            lat, lon = self.places.coords(name, state)
+            results.append({"name": name, "latitude": lat, "longitude": lon, "country_code": "IN", "admin1": state})
+        return httpx.Response(200, json={"results": results} if results else {})
+
+    def _nominatim(self, request):
+        q = request.url.params.get("q", "")
+        name, _, rest = q.partition(", ")
+        state = rest.removesuffix("India").strip(", ") or name
+        lat, lon = self.places.coords(name, state)
+        return httpx.Response(200, json=[{"lat": str(lat), "lon": str(lon), "display_name": f"{name}, {state}, India"}])
+
+    def _openai(self, request):
+        answer = "Expect warm, humid conditions with a chance of afternoon showers."
+        if json.loads(request.content or b"{}").get("stream"):
+            events = "".join(
+                f"data: {json.dumps({'choices': [{'delta': {'content': word + ' '}}]})}\n\n" for word in answer.split()
+            )
+            return httpx.Response(200, text=events + "data: [DONE]\n\n", headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": answer}}], "created": int(time.time())})
+
+
+@lru_cache(maxsize=64)
+def _series(var, hours):
+    return [_value(var, 20.0, 78.0, i) for i in range(2 * hours)]
+
+
+@lru_cache(maxsize=64)
+def _times(start, hours):
+    return [(start + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M") for i in range(hours)]
+
+
+def _hourly(lat, lon, variables, hours, start):
+    # Each location gets a shifted window of one precomputed series, so the
+    # stand-in's own CPU time doesn't dominate the measurements
+    shift = int(_unit(lat, lon) * hours)
+    hourly = {"time": _times(start, hours)}
+    hourly.update({v: _series(v, hours)[shift:shift + hours] for v in variables})
+    return hourly
+
+
+def _value(var, lat, lon, step):
+    """Plausible, deterministic value for an Open-Meteo variable."""
+    u = (_unit(var, round(lat, 2), round(lon, 2)) + 0.37 * step) % 1.0
+    if var in ("temperature_2m", "apparent_temperature"):
+        return round(18 + 0.3 * (35 - lat) + 6 * u, 1)
+    if var in ("relative_humidity_2m", "cloud_cover", "precipitation_probability"):
+        return int(100 * u)
+    if var == "precipitation":
+        return round(max(0.0, 4 * u - 3), 1)
+    if var == "weather_code":
+        return (0, 1, 2, 3, 45, 61, 63, 80, 95)[int(9 * u)]
+    if var == "wind_speed_10m":
+        return round(2 + 25 * u, 1)
+    if var == "wind_direction_10m":
+        return int(360 * u)
+    if var == "pressure_msl":
+        return round(995 + 25 * u, 1)
+    return round(u, 3)
@@ -0,0 +1,134 @@
+"""Background prefetch of hot forecast cache entries.
+
+Traffic is heavily skewed toward a few hundred districts. The scheduler
+keeps a decaying request count per forecast cache key and, every
+`interval` seconds, refreshes the top-K keys whose entries are about to
+expire. Refreshes are grouped by variable set into multi-coordinate
+Open-Meteo calls, capped at `max_calls` upstream calls per cycle, so hot
+requests almost never wait on an upstream fetch.
+
+A key only qualifies with at least `min_requests` requests in the last
+`window` seconds (the previous and current window, counted separately from
+the decaying score), so a place asked for once isn't refreshed all day
+just because few other keys outrank it.
+"""
+import asyncio
+import heapq
+import time
+
+
+class HotKeys:
+    """Request counts per cache key with exponential decay."""
+
+    def __init__(self, half_life=3600, max_keys=10000, window=900):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self.window = window
+        self._counts = {}
+        self._recent = {}  # key -> requests in the current window
+        self._previous = {}  # key -> requests in the window before
+        self._window_started = time.monotonic()
+
+    def record(self, key):
+        self._counts[key] = self._counts.get(key, 0.0) + 1.0
+        self._roll()
+        self._recent[key] = self._recent.get(key, 0) + 1
+
+    def _roll(self):
+        now = time.monotonic()
+        if now - self._window_started >= self.window:
+            # A whole window without requests leaves nothing to carry over
+            self._previous = self._recent if now - self._window_started < 2 * self.window else {}
+            self._recent = {}
+            self._window_started = now
+
+    def recent(self, key):
+        """Requests for `key` in the current and previous window."""
+        self._roll()
+        return self._recent.get(key, 0) + self._previous.get(key, 0)
+
+    def decay(self, elapsed):
+        factor = 0.5 ** (elapsed / self.half_life)
+        self._counts = {k: c * factor for k, c in self._counts.items() if c * factor >= 0.05}
+        if len(self._counts) > self.max_keys:
+            self._counts = dict(heapq.nlargest(self.max_keys, self._counts.items(), key=lambda kv: kv[1]))
+
+    def top(self, k):
+        return [key for key, _ in heapq.nlargest(k, self._counts.items(), key=lambda kv: kv[1])]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class PrefetchScheduler:
+    def __init__(self, cache, fetch_chunks, top_k=200, interval=30, lead=45,
+                 max_calls=10, chunk_size=50, half_life=3600, min_requests=2, window=900):
+        self.cache = cache
+        self.fetch_chunks = fetch_chunks  # async (keys, params) -> {key: data}
+        self.top_k = top_k
+        self.interval = interval
+        self.lead = lead  # refresh entries expiring within this many seconds
+        self.max_calls = max_calls  # upstream call budget per cycle
+        self.chunk_size = chunk_size
+        self.min_requests = min_requests  # per `window` seconds, to be worth a refresh
+        self.hot = HotKeys(half_life=half_life, window=window)
+        self.cycles = 0
+        self.refreshed = 0
+        self.errors = 0
+        self._task = None
+
+    def record(self, key):
+        self.hot.record(key)
+
+    def due(self):
+        """Hot keys whose cache entries expire within `lead`, grouped by params."""
+        groups = {}
+        for key in self.hot.top(self.top_k):
+            if self.hot.recent(key) < self.min_requests:
+                continue
+            remaining = self.cache.expires_in(key)
+            if remaining is None or remaining <= self.lead:
+                groups.setdefault(key[2], []).append(key)
+        return groups
+
+    async def run_once(self):
+        self.cycles += 1
+        calls = 0
+        for params, keys in self.due().items():
+            for i in range(0, len(keys), self.chunk_size):
+                if calls >= self.max_calls:
+                    return
+                chunk = keys[i:i + self.chunk_size]
+                calls += 1
+                try:
+                    self.refreshed += len(await self.fetch_chunks(chunk, dict(params)))
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Prefetch of {len(chunk)} locations failed: {e}")
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.hot.decay(self.interval)
+            await self.run_once()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "tracked": len(self.hot),
+            "cycles": self.cycles,
+            "refreshed": self.refreshed,
+            "errors": self.errors,
+        }
@@ -0,0 +1,217 @@
+"""Upstream providers for forecasts and place search.
+
+Handlers talk to a `ForecastProvider` and `GeocodingProvider` instead of
+building URLs themselves, so where the data comes from is configuration:
+
+- OPEN_METEO_URL: forecast API base URL (default https://api.open-meteo.com).
+  Set OPEN_METEO_SELF_HOSTED=1 to use a self-hosted Open-Meteo instance
+  (https://github.com/open-meteo/open-meteo), by default at
+  http://localhost:8080; it serves the same /v1/forecast API.
+- OPEN_METEO_API_KEY: sent as `apikey`, for the commercial endpoints.
+- GEOCODING_URL, NOMINATIM_URL, OPENAI_BASE_URL: the other upstreams, e.g. a
+  regional mirror or a local stand-in.
+- FORECAST_CURRENT_VARS, FORECAST_HOURLY_VARS, FORECAST_HOURS: the variable
+  set fetched (once) per location.
+- NOMINATIM_RATE, NOMINATIM_BURST, NOMINATIM_QUEUE, NOMINATIM_MAX_WAIT: how
+  Nominatim calls are paced (see rate_limit.py).
+
+Requests still go through the pooled, guarded clients in http_clients.
+"""
+import os
+from abc import ABC, abstractmethod
+
+from http_clients import get_client
+from rate_limit import INTERACTIVE, TokenBucketDispatcher
+
+DEFAULT_CURRENT_VARS = (
+    "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,"
+    "weather_code,wind_speed_10m,wind_direction_10m,pressure_msl,cloud_cover"
+)
+DEFAULT_HOURLY_VARS = "temperature_2m,relative_humidity_2m,precipitation_probability,weather_code,wind_speed_10m"
+PUBLIC_OPEN_METEO_URL = "https://api.open-meteo.com"
+SELF_HOSTED_OPEN_METEO_URL = "http://localhost:8080"
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+
+class ForecastProvider(ABC):
+    """Fetches forecast payloads in Open-Meteo's response shape."""
+
+    name = "forecast"
+
+    @property
+    @abstractmethod
+    def params(self):
+        """Query parameters identifying the variable set (also the cache key)."""
+
+    @abstractmethod
+    async def fetch(self, lat, lon, params):
+        """The payload for one location."""
+
+    @abstractmethod
+    async def fetch_many(self, coords, params):
+        """One payload per (lat, lon) in `coords`, in order."""
+
+    def describe(self):
+        return {"provider": self.name}
+
+
+class GeocodingProvider(ABC):
+    """Place search returning Open-Meteo geocoding `results` entries."""
+
+    name = "geocoding"
+
+    @abstractmethod
+    async def search(self, name, count=10):
+        """Up to `count` results for the place `name`."""
+
+    def describe(self):
+        return {"provider": self.name}
+
+
+class OpenMeteoForecast(ForecastProvider):
+    name = "open-meteo"
+
+    def __init__(self, base_url=PUBLIC_OPEN_METEO_URL, current_vars=DEFAULT_CURRENT_VARS,
+                 hourly_vars=DEFAULT_HOURLY_VARS, forecast_hours=168, api_key=None, self_hosted=False):
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/v1/forecast"
+        self.current_vars = current_vars
+        self.hourly_vars = hourly_vars
+        self.forecast_hours = forecast_hours
+        self.api_key = api_key
+        self.self_hosted = self_hosted
+
+    @property
+    def params(self):
+        return {"current": self.current_vars, "hourly": self.hourly_vars, "forecast_hours": self.forecast_hours}
+
+    def _query(self, latitude, longitude, params):
+        query = {"latitude": latitude, "longitude": longitude, **params, "timezone": "auto"}
+        if self.api_key:
+            query["apikey"] = self.api_key
+        return query
+
+    async def fetch(self, lat, lon, params):
+        r = await get_client("open-meteo").get(self.url, params=self._query(lat, lon, params))
+        r.raise_for_status()
+        return r.json()
+
+    async def fetch_many(self, coords, params):
+        # Comma-separated coordinates return a list of per-location payloads
+        query = self._query(",".join(str(c[0]) for c in coords), ",".join(str(c[1]) for c in coords), params)
+        r = await get_client("open-meteo").get(self.url, params=query)
+        r.raise_for_status()
+        payload = r.json()
+        return [payload] if isinstance(payload, dict) else payload
+
+    def describe(self):
+        return {"provider": self.name, "base_url": self.base_url, "self_hosted": self.self_hosted}
+
+
+class OpenMeteoGeocoding(GeocodingProvider):
+    name = "open-meteo-geocoding"
+
+    def __init__(self, base_url="https://geocoding-api.open-meteo.com", country="IN"):
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/v1/search"
+        self.country = country
+
+    async def search(self, name, count=10):
+        params = {"name": name, "country": self.country, "count": count}
+        r = await get_client("geocoding").get(self.url, params=params)
+        r.raise_for_status()
+        return r.json().get("results") or []
+
+    def describe(self):
+        return {"provider": self.name, "base_url": self.base_url}
+
+
+class NominatimGeocoding(GeocodingProvider):
+    """Free-text search against Nominatim, mapped to the geocoding result shape.
+
+    Calls are paced by a token-bucket dispatcher to respect the usage policy.
+    """
+
+    name = "nominatim"
+
+    def __init__(self, base_url="https://nominatim.openstreetmap.org", dispatcher=None):
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/search"
+        self.dispatcher = dispatcher or TokenBucketDispatcher("nominatim")
+
+    async def search(self, name, count=1, priority=INTERACTIVE):
+        return await self.dispatcher.submit(lambda: self._search(name, count), priority)
+
+    async def _search(self, name, count):
+        params = {"format": "json", "q": name, "limit": count, "addressdetails": 1}
+        r = await get_client("nominatim").get(self.url, params=params)
+        if r.status_code == 429:
+            self.dispatcher.backoff(_retry_after(r.headers.get("retry-after")))
+        r.raise_for_status()
+        return [
+            {"name": place.get("display_name"), "latitude": float(place.get("lat")),
+             "longitude": float(place.get("lon")), "display_name": place.get("display_name")}
+            for place in r.json()
+        ]
+
+    def describe(self):
+        return {"provider": self.name, "base_url": self.base_url}
+
+    async def close(self):
+        await self.dispatcher.close()
+
+
+def open_meteo_place(result, state):
+    """(lat, lon, display_name) of an Open-Meteo geocoding result."""
+    return (
+        float(result.get("latitude")),
+        float(result.get("longitude")),
+        f"{result.get('name')}, {result.get('admin1', state)}, India",
+    )
+
+
+def admin1_match(results, state):
+    """First result whose admin1 matches `state` (substring either way), as (lat, lon, display_name)."""
+    state_lower = state.lower()
+    for result in results:
+        admin1 = (result.get("admin1") or "").lower()
+        if state_lower in admin1 or admin1 in state_lower:
+            return open_meteo_place(result, state)
+    return None
+
+
+def _retry_after(value, default=30.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default  # absent, or an HTTP date
+
+
+def forecast_provider():
+    """The configured forecast provider (see module docstring)."""
+    self_hosted = os.getenv("OPEN_METEO_SELF_HOSTED", "0") == "1"
+    default_url = SELF_HOSTED_OPEN_METEO_URL if self_hosted else PUBLIC_OPEN_METEO_URL
+    return OpenMeteoForecast(
+        base_url=os.getenv("OPEN_METEO_URL", default_url),
+        current_vars=os.getenv("FORECAST_CURRENT_VARS", DEFAULT_CURRENT_VARS),
+        hourly_vars=os.getenv("FORECAST_HOURLY_VARS", DEFAULT_HOURLY_VARS),
+        forecast_hours=int(os.getenv("FORECAST_HOURS", "168")),
+        api_key=os.getenv("OPEN_METEO_API_KEY"),
+        self_hosted=self_hosted,
+    )
+
+
+def geocoding_provider():
+    return OpenMeteoGeocoding(os.getenv("GEOCODING_URL", "https://geocoding-api.open-meteo.com"))
+
+
+def nominatim_provider():
+    dispatcher = TokenBucketDispatcher(
+        "nominatim",
+        rate=float(os.getenv("NOMINATIM_RATE", "1.0")),
+        burst=int(os.getenv("NOMINATIM_BURST", "1")),
+        max_queue=int(os.getenv("NOMINATIM_QUEUE", "50")),
+        max_wait=float(os.getenv("NOMINATIM_MAX_WAIT", "8")),
+    )
+    return NominatimGeocoding(os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org"), dispatcher)
@@ -0,0 +1,182 @@
+"""Token-bucket dispatcher for rate-limited upstreams (Nominatim).
+
+Nominatim's usage policy allows about one request per second. Instead of
+firing on every cache miss, calls are queued and released at `rate` per
+second (with a small `burst`):
+
+- Interactive lookups jump ahead of background work (gazetteer builds,
+  warmers); when the queue is full, queued background work is shed first.
+- Each queued call has a deadline. A call still waiting at its deadline
+  fails with `QueueTimeout`; once dispatched it runs to completion. Calls
+  whose caller has gone away (cancelled, e.g. a hedged lookup that lost)
+  are dropped without spending a token.
+- A 429 from upstream empties the bucket for Retry-After seconds.
+
+Queue-full and timeout errors are `UpstreamUnavailable`, so callers treat
+them like any other unavailable upstream.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+from resilience import UpstreamUnavailable
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class QueueFull(UpstreamUnavailable):
+    pass
+
+
+class QueueTimeout(UpstreamUnavailable):
+    pass
+
+
+class TokenBucketDispatcher:
+    def __init__(self, name, rate=1.0, burst=1, max_queue=50, max_wait=8.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait  # seconds a call may wait in the queue
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._queue = []  # heap of [priority, seq, queued_at, future, fn, deadline timer]
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self.dispatched = 0
+        self.expired = 0
+        self.abandoned = 0
+        self.rejected = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def submit(self, fn, priority=INTERACTIVE, timeout=None):
+        """Run `fn()` (a coroutine factory) once a token is free; return its result."""
+        loop = asyncio.get_running_loop()
+        if self.depth() >= self.max_queue and not (priority == INTERACTIVE and self._shed_background()):
+            self.rejected += 1
+            raise QueueFull(f"{self.name} queue full ({self.max_queue} waiting)",
+                            retry_after=self.max_queue / self.rate)
+        future = loop.create_future()
+        wait = self.max_wait if timeout is None else timeout
+        # The deadline covers queueing only; _run cancels it once the call starts
+        timer = loop.call_later(wait, self._expire, future, wait)
+        heapq.heappush(self._queue, [priority, next(self._seq), loop.time(), future, fn, timer])
+        self._ensure_running()
+        self._wakeup.set()
+        try:
+            return await future
+        finally:
+            timer.cancel()
+
+    def backoff(self, seconds):
+        """Stop dispatching for `seconds` (e.g. after a 429 with Retry-After)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def depth(self):
+        return sum(1 for entry in self._queue if not entry[3].done())
+
+    def _shed_background(self):
+        """Fail the newest queued background call to make room; True if one was shed."""
+        waiting = [e for e in self._queue if e[0] != INTERACTIVE and not e[3].done()]
+        if not waiting:
+            return False
+        newest = max(waiting, key=lambda e: e[1])
+        newest[3].set_exception(QueueFull(f"{self.name} queue full; background call shed",
+                                          retry_after=self.max_queue / self.rate))
+        self.shed += 1
+        return True
+
+    def _expire(self, future, wait):
+        if not future.done():
+            future.set_exception(QueueTimeout(f"{self.name} queue wait exceeded {wait:.0f}s",
+                                              retry_after=self.depth() / self.rate))
+            self.expired += 1
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            # Settled entries (expired, shed, caller gone) never spend a token
+            while self._queue and self._queue[0][3].done():
+                entry = heapq.heappop(self._queue)
+                if entry[3].cancelled():
+                    self.abandoned += 1
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._refill()
+            if self._tokens < 1:
+                # Sleep until the next token; re-check the head afterwards
+                # since a higher-priority call may have arrived meanwhile
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, queued_at, future, fn, timer = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            timer.cancel()
+            self._tokens -= 1
+            waited = asyncio.get_running_loop().time() - queued_at
+            self.dispatched += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self._start(future, fn)
+
+    @staticmethod
+    def _start(future, fn):
+        task = asyncio.ensure_future(fn())
+
+        def settle(t):
+            if future.done():
+                return
+            if t.cancelled():
+                future.cancel()
+            elif t.exception() is not None:
+                future.set_exception(t.exception())
+            else:
+                future.set_result(t.result())
+
+        task.add_done_callback(settle)
+        # Caller gave up mid-call: stop the request too
+        future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for entry in self._queue:
+            if not entry[3].done():
+                entry[3].cancel()
+        self._queue.clear()
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "queued": self.depth(),
+            "dispatched": self.dispatched,
+            "expired": self.expired,
+            "abandoned": self.abandoned,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "avg_wait": round(self.wait_total / self.dispatched, 3) if self.dispatched else 0.0,
+            "max_wait": round(self.wait_max, 3),
+        }
@@ -0,0 +1,209 @@
+"""Per-upstream circuit breaker and adaptive concurrency limit.
+
+Every outbound request goes through a `GuardedTransport` (installed by
+http_clients), so handlers need no changes to benefit:
+
+- `CircuitBreaker` opens after `failures` consecutive failures (transport
+  errors, timeouts, 5xx/429) and then rejects calls immediately for
+  `reset_after` seconds. After that one half-open probe is let through; its
+  outcome closes or re-opens the circuit.
+- `AIMDLimiter` caps concurrent requests per upstream. The limit grows by
+  about one per round trip while calls succeed within `latency_target` and
+  halves on a failure or a slow call, so a degrading provider gets fewer
+  slots instead of tying up the event loop for the full timeout.
+
+Rejected calls raise `UpstreamUnavailable`, an httpx.TransportError, so the
+existing `except httpx.HTTPError` paths (stale-if-error) handle them; its
+`retry_after` lets handlers answer 503 with Retry-After instead of a 502.
+"""
+import asyncio
+import time
+from collections import deque
+
+import httpx
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """Raised instead of calling an upstream whose circuit is open or whose slots are full."""
+
+    def __init__(self, message, *, request=None, retry_after=1):
+        super().__init__(message, request=request)
+        self.retry_after = max(1, int(retry_after + 0.999))  # whole seconds, for Retry-After
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures=5, reset_after=30.0):
+        self.failure_threshold = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._probing = False
+
+    def allow(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def is_open(self):
+        """True while calls are being rejected outright (no probe due yet)."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_after
+
+    def retry_in(self):
+        """Seconds until the next half-open probe may be let through."""
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def release_probe(self):
+        """Give up a half-open probe slot without a verdict (call never reached upstream)."""
+        self._probing = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class AIMDLimiter:
+    def __init__(self, max_limit, min_limit=1, latency_target=2.0, max_wait=10.0):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.max_wait = max_wait  # how long a call may queue for a slot
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters = deque()  # futures; a freed slot is handed to the oldest
+
+    async def acquire(self):
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return True  # handed a slot just as the wait ran out
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._free_slot()  # the caller is gone; pass the slot on
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        return True
+
+    def release(self, latency, ok):
+        """Free a slot; `ok=None` (e.g. cancelled by the caller) leaves the limit alone.
+
+        Synchronous on purpose: it runs in `finally` blocks of cancelled tasks.
+        """
+        if ok is None:
+            pass
+        elif ok and latency <= self.latency_target:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        else:
+            self.limit = max(float(self.min_limit), self.limit / 2)
+        self._free_slot()
+
+    def _free_slot(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def stats(self):
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+        }
+
+
+def is_failure(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+
+class GuardedTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport with an upstream's breaker and limiter.
+
+    For streamed responses the slot is released once headers arrive.
+    `observe(name, seconds, outcome)` is called per call with outcome one of
+    ok, error (5xx/429), transport_error, open or saturated (rejected).
+    """
+
+    def __init__(self, name, transport, breaker, limiter, observe=None):
+        self.name = name
+        self.transport = transport
+        self.breaker = breaker
+        self.limiter = limiter
+        self.observe = observe or (lambda name, seconds, outcome: None)
+
+    async def handle_async_request(self, request):
+        if not self.breaker.allow():
+            self.observe(self.name, 0.0, "open")
+            raise UpstreamUnavailable(f"{self.name} circuit open", request=request,
+                                      retry_after=self.breaker.retry_in())
+        if not await self.limiter.acquire():
+            self.breaker.release_probe()
+            self.observe(self.name, 0.0, "saturated")
+            raise UpstreamUnavailable(f"{self.name} concurrency limit reached", request=request)
+        started = time.perf_counter()
+        ok = None
+        outcome = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            ok = not is_failure(response)
+            outcome = "ok" if ok else "error"
+            return response
+        except httpx.TransportError:
+            ok = False
+            outcome = "transport_error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if ok is None:
+                self.breaker.release_probe()
+            elif ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            if outcome is not None:
+                self.observe(self.name, elapsed, outcome)
+            self.limiter.release(elapsed, ok)
+
+    async def aclose(self):
+        await self.transport.aclose()
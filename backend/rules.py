@@ -0,0 +1,379 @@
+"""Rule-based answer engine for /api/ai/query.
+
+This is the fallback when OpenAI is unavailable, so it has to stay cheap
+under full traffic. Intent keywords (plus their listed inflections) are
+compiled once at import into a word -> intent lexicon, so classifying a
+question is one tokenizing regex pass and a dict lookup per word. Matching
+is whole-word ("do" no longer fires on "window", nor "run" on "sunrise"),
+and classify() returns every matched intent in INTENT_KEYWORDS order;
+rule_based_answer() answers with the first, like the original chain of
+keyword checks did, and its response shape is unchanged.
+
+Benchmark: `python bench_rules.py`; expected intents: tests/test_rules.py.
+"""
+import re
+
+# Intent -> keywords, in precedence order: the first intent a question matches answers it
+INTENT_KEYWORDS = {
+    "rain": ["rain", "raining", "rainy", "umbrella", "wet", "precipitation", "drizzle", "shower", "downpour", "pour"],
+    "temperature": ["temperature", "hot", "cold", "warm", "cool", "degree", "celsius", "heat", "freeze", "freezing"],
+    "wind": ["wind", "windy", "breeze", "breezy", "gust", "blow", "blowing"],
+    "clothing": ["wear", "clothing", "clothes", "dress", "outfit", "jacket", "coat", "shirt", "pants"],
+    "activity": ["activity", "activities", "do", "plan", "outdoor", "outside", "go out", "outing", "picnic", "hike", "hiking", "walk", "run", "running", "exercise", "sport"],
+    "cloud": ["cloud", "cloudy", "overcast", "sky", "clear", "sunny", "sun"],
+    "humidity": ["humid", "humidity", "muggy", "sticky", "damp", "moisture"],
+    "pressure": ["pressure", "barometric", "atmospheric"],
+}
+_PRECEDENCE = {intent: rank for rank, intent in enumerate(INTENT_KEYWORDS)}
+
+# Inflected forms that still carry the keyword's meaning, listed explicitly:
+# blind suffixing also turned "does" into "do", "weary" into "wear" and
+# "planes" into "plan", and missed "drizzling" and "sunnier".
+INFLECTIONS = {
+    "rain": ["rains", "rained", "rainier", "rainiest", "rainfall"],
+    "umbrella": ["umbrellas"],
+    "wet": ["wetter", "wettest"],
+    "drizzle": ["drizzles", "drizzled", "drizzling", "drizzly"],
+    "shower": ["showers", "showery", "showering"],
+    "downpour": ["downpours"],
+    "pour": ["pours", "poured", "pouring"],
+    "temperature": ["temperatures"],
+    "hot": ["hotter", "hottest"],
+    "cold": ["colder", "coldest"],
+    "warm": ["warmer", "warmest", "warming", "warmth"],
+    "cool": ["cooler", "coolest", "cooling"],
+    "degree": ["degrees"],
+    "heat": ["heatwave"],
+    "freeze": ["freezes", "froze", "frozen"],
+    "wind": ["winds", "windier", "windiest"],
+    "breeze": ["breezes"],
+    "breezy": ["breezier"],
+    "gust": ["gusts", "gusty", "gusting"],
+    "blow": ["blows", "blew", "blown"],
+    "wear": ["wears", "wearing", "wore"],
+    "dress": ["dresses", "dressed", "dressing"],
+    "outfit": ["outfits"],
+    "jacket": ["jackets"],
+    "coat": ["coats"],
+    "shirt": ["shirts"],
+    "plan": ["plans", "planned", "planning"],
+    "outdoor": ["outdoors"],
+    "outing": ["outings"],
+    "picnic": ["picnics"],
+    "hike": ["hikes", "hiked"],
+    "walk": ["walks", "walked", "walking"],
+    "run": ["runs"],
+    "exercise": ["exercises", "exercising"],
+    "sport": ["sports"],
+    "cloud": ["clouds", "clouded"],
+    "cloudy": ["cloudier"],
+    "sky": ["skies"],
+    "clear": ["clearer", "clearing"],
+    "sunny": ["sunnier", "sunniest"],
+    "sun": ["sunshine"],
+    "muggy": ["muggier"],
+    "sticky": ["stickier"],
+}
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def _build_lexicon():
+    """Map every keyword and its listed inflections to its intent."""
+    words = {}
+    phrases = {}
+    for intent, keywords in reversed(list(INTENT_KEYWORDS.items())):
+        # Reversed so that a word listed under two intents maps to the earlier one
+        for keyword in keywords:
+            tokens = keyword.split()
+            if len(tokens) > 1:
+                phrases[tuple(tokens)] = intent
+                continue
+            for word in [keyword, *INFLECTIONS.get(keyword, ())]:
+                words[word] = intent
+    return words, phrases
+
+
+_LEXICON, _PHRASES = _build_lexicon()
+_PHRASE_STARTS = {phrase[0] for phrase in _PHRASES}
+
+
+def classify(question):
+    """Return [(intent, hits)] for every matched intent, in precedence order.
+
+    Matching is per whole word, so "do" no longer fires on "window" nor
+    "run" on "sunrise".
+    """
+    hits = {}
+    tokens = _WORD_RE.findall(question.lower())
+    for i, token in enumerate(tokens):
+        intent = _LEXICON.get(token)
+        if intent is None and token in _PHRASE_STARTS:
+            intent = _PHRASES.get(tuple(tokens[i:i + 2]))
+        if intent is not None:
+            hits[intent] = hits.get(intent, 0) + 1
+    if len(hits) < 2:
+        return list(hits.items())
+    return sorted(hits.items(), key=lambda item: _PRECEDENCE[item[0]])
+
+
+class Conditions:
+    """Current values plus rain chance and temperature trend from the hourly forecast."""
+
+    def __init__(self, weather, hourly_data):
+        self.temp = weather.get("temperature_2m", 0)
+        self.feels_like = weather.get("apparent_temperature", self.temp)
+        self.humidity = weather.get("relative_humidity_2m", 0)
+        self.wind_speed = weather.get("wind_speed_10m", 0)
+        self.wind_direction = weather.get("wind_direction_10m", 0)
+        self.precipitation = weather.get("precipitation", 0)
+        self.weather_code = weather.get("weather_code", 0)
+        self.cloud_cover = weather.get("cloud_cover", 0)
+        self.pressure = weather.get("pressure_msl", 0)
+
+        # Calculate rain probability and temperature trends from hourly data
+        self.will_rain = False
+        self.max_precip_prob = 0
+        self.avg_precip_prob = 0
+        self.temp_trend = "stable"
+
+        if hourly_data:
+            if hourly_data.get("precipitation_probability"):
+                precip_probs = hourly_data.get("precipitation_probability", [])[:12]
+                self.max_precip_prob = max(precip_probs) if precip_probs else 0
+                self.avg_precip_prob = sum(precip_probs) / len(precip_probs) if precip_probs else 0
+                self.will_rain = self.max_precip_prob > 40
+
+            if hourly_data.get("temperature_2m"):
+                temps = hourly_data.get("temperature_2m", [])[:6]
+                if len(temps) >= 2:
+                    if temps[-1] > temps[0] + 2:
+                        self.temp_trend = "rising"
+                    elif temps[-1] < temps[0] - 2:
+                        self.temp_trend = "falling"
+
+
+def _answer_rain(c):
+    """Rain/precipitation queries."""
+    if c.precipitation > 0:
+        answer = f"Yes, it's currently raining with {c.precipitation}mm of precipitation. "
+        if c.max_precip_prob > 60:
+            answer += f"And it's likely to continue - {c.max_precip_prob}% chance in the next 12 hours. "
+        answer += "I recommend carrying an umbrella and wearing waterproof clothing."
+    elif c.will_rain:
+        answer = f"Not raining right now, but there's a {c.max_precip_prob}% chance of rain in the next 12 hours (average {c.avg_precip_prob:.0f}%). "
+        if c.max_precip_prob > 70:
+            answer += "Better carry an umbrella - rain is very likely!"
+        else:
+            answer += "You might want to carry an umbrella just in case."
+    else:
+        answer = f"No rain expected! Current conditions are clear with only a {c.max_precip_prob}% chance of rain. "
+        if c.cloud_cover > 50:
+            answer += f"Though it's {c.cloud_cover}% cloudy, precipitation is unlikely."
+        else:
+            answer += "You can leave the umbrella at home."
+    return answer
+
+
+def _answer_temperature(c):
+    """Temperature queries."""
+    answer = f"The temperature is {c.temp}°C (feels like {c.feels_like}°C). "
+
+    if c.temp_trend == "rising":
+        answer += "It's getting warmer. "
+    elif c.temp_trend == "falling":
+        answer += "It's getting cooler. "
+
+    if c.temp > 35:
+        answer += "Very hot! Stay hydrated, wear light clothing, and avoid direct sun during peak hours. Seek shade and air conditioning."
+    elif c.temp > 28:
+        answer += "Warm weather. Light, breathable clothing recommended. Don't forget sunscreen and stay hydrated!"
+    elif c.temp > 20:
+        answer += "Pleasant temperature - perfect for outdoor activities. Light layers recommended."
+    elif c.temp > 10:
+        answer += "Cool weather. Consider wearing a light jacket or sweater."
+    elif c.temp > 0:
+        answer += "Cold! Dress warmly with layers, jacket, and possibly a scarf."
+    else:
+        answer += "Freezing temperatures! Bundle up with heavy winter clothing, hat, gloves, and scarf."
+    return answer
+
+
+def _answer_wind(c):
+    """Wind queries."""
+    # Wind direction compass
+    directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+    direction_index = round(c.wind_direction / 22.5) % 16
+    wind_dir_text = directions[direction_index]
+
+    answer = f"Wind is blowing at {c.wind_speed} km/h from the {wind_dir_text} ({c.wind_direction}°). "
+
+    if c.wind_speed > 40:
+        answer += "Very windy! Secure loose objects, be cautious outdoors. Not ideal for outdoor activities. Strong winds can be dangerous."
+    elif c.wind_speed > 25:
+        answer += "Moderately windy. You'll feel a noticeable breeze. Good for kite flying, but secure light objects."
+    elif c.wind_speed > 10:
+        answer += "Light breeze. Pleasant conditions with gentle wind. Perfect for outdoor activities."
+    else:
+        answer += "Calm conditions with minimal wind. Great for outdoor dining, picnics, or any outdoor activity!"
+    return answer
+
+
+def _answer_clothing(c):
+    """Clothing/what to wear queries."""
+    recommendations = []
+
+    if c.temp > 30:
+        recommendations.append("light, breathable fabrics like cotton or linen")
+        recommendations.append("shorts and t-shirts")
+    elif c.temp > 25:
+        recommendations.append("comfortable summer clothing")
+    elif c.temp > 20:
+        recommendations.append("light casual wear")
+    elif c.temp > 15:
+        recommendations.append("light jacket or cardigan")
+    elif c.temp > 10:
+        recommendations.append("sweater or hoodie")
+    elif c.temp > 0:
+        recommendations.append("warm jacket and layers")
+    else:
+        recommendations.append("heavy winter coat, hat, gloves, and scarf")
+
+    if c.will_rain or c.precipitation > 0:
+        recommendations.append("waterproof jacket or umbrella")
+    if c.wind_speed > 20:
+        recommendations.append("windbreaker")
+    if c.temp > 28 and c.cloud_cover < 50:
+        recommendations.append("sunglasses, hat, and sunscreen")
+    if c.humidity > 70:
+        recommendations.append("moisture-wicking fabrics")
+
+    answer = f"Based on {c.temp}°C (feels like {c.feels_like}°C) and current conditions, I recommend: {', '.join(recommendations)}. "
+    if c.will_rain:
+        answer += f"There's a {c.max_precip_prob}% chance of rain, so definitely bring rain protection!"
+    return answer
+
+
+def _answer_activity(c):
+    """Activity/outdoor queries."""
+    if c.precipitation > 0 or c.will_rain:
+        answer = f"Rain {'is falling' if c.precipitation > 0 else 'is likely'} ({c.max_precip_prob}% chance). Indoor activities recommended: museums, shopping malls, cafes, movie theaters, or indoor sports facilities."
+    elif c.temp > 35:
+        answer = f"Very hot ({c.temp}°C). Best activities: swimming, water parks, indoor activities with AC, or wait until evening. If going out, stay in shade, hydrate frequently, and take breaks."
+    elif c.temp < 5:
+        answer = f"Very cold ({c.temp}°C). Good for: indoor activities, warm cafes, ice skating (if available), or bundled-up winter walks. Keep outdoor time limited."
+    elif c.wind_speed > 35:
+        answer = f"Very windy ({c.wind_speed} km/h). Indoor activities safer. If going out, secure belongings, avoid tall structures, and be cautious near trees."
+    else:
+        answer = f"Great weather! Perfect for: outdoor sports, picnics, hiking, cycling, jogging, sightseeing, or park visits. "
+        if c.temp > 25:
+            answer += "Morning or evening activities recommended to avoid peak heat."
+        elif c.temp < 15:
+            answer += "Dress warmly for outdoor activities."
+    return answer
+
+
+def _answer_cloud(c):
+    """Cloud/sky queries."""
+    if c.cloud_cover < 20:
+        answer = f"Clear skies with only {c.cloud_cover}% cloud cover. Perfect sunny weather! "
+        if c.temp > 28:
+            answer += "Don't forget sunscreen and sunglasses."
+    elif c.cloud_cover < 50:
+        answer = f"Partly cloudy with {c.cloud_cover}% cloud cover. Mix of sun and clouds. "
+    elif c.cloud_cover < 80:
+        answer = f"Mostly cloudy with {c.cloud_cover}% cloud cover. Limited sunshine. "
+    else:
+        answer = f"Overcast with {c.cloud_cover}% cloud cover. Very cloudy skies. "
+
+    if c.will_rain:
+        answer += f"Rain is possible ({c.max_precip_prob}% chance)."
+    return answer
+
+
+def _answer_humidity(c):
+    """Humidity queries."""
+    answer = f"Humidity is at {c.humidity}%. "
+
+    if c.humidity > 80:
+        answer += "Very humid and uncomfortable. The air feels heavy and sticky. Wear breathable fabrics and stay hydrated."
+    elif c.humidity > 60:
+        answer += "Moderately humid. You'll notice the moisture in the air. Light, breathable clothing recommended."
+    elif c.humidity > 40:
+        answer += "Comfortable humidity levels. Not too dry, not too humid."
+    else:
+        answer += "Low humidity - the air is quite dry. Good for outdoor activities, but stay hydrated."
+    return answer
+
+
+def _answer_pressure(c):
+    """Pressure queries."""
+    answer = f"Atmospheric pressure is {c.pressure} hPa. "
+
+    if c.pressure > 1020:
+        answer += "High pressure - typically associated with clear, stable weather."
+    elif c.pressure > 1010:
+        answer += "Normal pressure - stable weather conditions."
+    else:
+        answer += "Low pressure - often associated with unsettled weather and possible precipitation."
+    return answer
+
+
+def _answer_general(c):
+    """General/summary answer for any other weather question."""
+    conditions = []
+
+    if c.temp > 30:
+        conditions.append(f"hot at {c.temp}°C")
+    elif c.temp > 20:
+        conditions.append(f"pleasant at {c.temp}°C")
+    elif c.temp < 15:
+        conditions.append(f"cool at {c.temp}°C")
+    else:
+        conditions.append(f"{c.temp}°C")
+
+    if c.humidity > 70:
+        conditions.append(f"{c.humidity}% humidity (humid)")
+    if c.wind_speed > 20:
+        conditions.append(f"windy at {c.wind_speed} km/h")
+    if c.cloud_cover > 70:
+        conditions.append(f"{c.cloud_cover}% cloudy")
+    if c.will_rain:
+        conditions.append(f"{c.max_precip_prob}% chance of rain")
+
+    condition_str = ", ".join(conditions) if conditions else "moderate conditions"
+
+    answer = f"Current weather: {condition_str}. "
+    answer += f"Feels like {c.feels_like}°C. "
+
+    if c.precipitation > 0:
+        answer += f"Currently raining ({c.precipitation}mm). "
+    elif c.will_rain:
+        answer += f"Rain possible in next 12 hours ({c.max_precip_prob}% chance). "
+
+    if c.temp_trend == "rising":
+        answer += "Temperature is rising. "
+    elif c.temp_trend == "falling":
+        answer += "Temperature is falling. "
+
+    answer += "\n\nFeel free to ask me specific questions about temperature, rain, wind, clothing, activities, or anything else weather-related!"
+    return answer
+
+
+_HANDLERS = {
+    "rain": _answer_rain,
+    "temperature": _answer_temperature,
+    "wind": _answer_wind,
+    "clothing": _answer_clothing,
+    "activity": _answer_activity,
+    "cloud": _answer_cloud,
+    "humidity": _answer_humidity,
+    "pressure": _answer_pressure,
+}
+
+
+def rule_based_answer(q, weather, hourly_data):
+    """Answer `q` from the current weather and next hours without an LLM."""
+    c = Conditions(weather, hourly_data)
+    intents = classify(q)
+    answer = _HANDLERS[intents[0][0]](c) if intents else _answer_general(c)
+    return {"answer": answer, "mode": "rule-based", "provenance": ["open-meteo"]}
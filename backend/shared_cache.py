@@ -0,0 +1,260 @@
+"""Shared cache tier behind the in-process caches.
+
+With `uvicorn --workers N` or several replicas, every process warms its own
+FORECAST_CACHE and geocode memo, so a new forecast is fetched upstream once
+per process. Setting SHARED_CACHE_URL adds a second tier all processes
+share:
+
+- ``redis://host:6379/0`` (or ``rediss://``): any Redis-protocol server
+  (Redis, Valkey, KeyDB, ...). Needs the optional `redis` package.
+- ``memory://``: an in-process fake with the same behaviour, for tests and
+  the load bench.
+
+Values are JSON (orjson when installed) with the entry's expiry and fetch
+time, and are stored with a matching TTL, so a process that takes an entry
+from the shared tier expires it at the same moment as the process that
+fetched it. Backend errors and slow replies (over SHARED_CACHE_TIMEOUT) count
+as misses: the shared tier can make requests faster, never fail them. Writes
+run in the background, so they get the longer SHARED_CACHE_WRITE_TIMEOUT;
+failed writes are counted (`write_errors`) and logged.
+
+With invalidation on, a process that replaces an entry with a more recently
+fetched one publishes the key and fetch time. The other processes mark an
+older local copy expired rather than dropping it, so their next request
+picks the new entry up from the shared tier while the old copy stays
+available for stale-while-revalidate and stale-if-error.
+"""
+import asyncio
+import json
+import time
+import uuid
+
+from fast_json import dumps
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional; memory:// only
+    redis_asyncio = None
+
+
+class MemoryBackend:
+    """In-process stand-in for the Redis commands SharedCache uses."""
+
+    def __init__(self):
+        self._data = {}  # key -> (expires_at, value)
+        self._subscribers = {}  # channel -> [callback]
+
+    async def get(self, key):
+        return self._live(key, time.time())
+
+    async def mget(self, keys):
+        now = time.time()
+        return [self._live(key, now) for key in keys]
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._data[key]
+            return None
+        return entry[1]
+
+    async def set(self, key, value, ttl):
+        """Store `value`; returns the live value it replaced, if any."""
+        now = time.time()
+        previous = self._live(key, now)
+        self._data[key] = (now + ttl, value)
+        return previous
+
+    async def delete(self, key):
+        self._data.pop(key, None)
+
+    async def publish(self, channel, message):
+        for callback in self._subscribers.get(channel, []):
+            callback(message)
+
+    async def subscribe(self, channel, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    async def close(self):
+        self._subscribers.clear()
+
+
+class RedisBackend:
+    def __init__(self, url):
+        if redis_asyncio is None:
+            raise RuntimeError("SHARED_CACHE_URL needs the redis package: pip install redis")
+        self.url = url
+        self._redis = redis_asyncio.from_url(url)
+        self._listeners = []
+
+    async def get(self, key):
+        return await self._redis.get(key)
+
+    async def mget(self, keys):
+        return await self._redis.mget(keys)
+
+    async def set(self, key, value, ttl):
+        # SET ... GET (Redis 6.2+) returns the replaced value in the same round trip
+        return await self._redis.set(key, value, px=max(1, int(ttl * 1000)), get=True)
+
+    async def delete(self, key):
+        await self._redis.delete(key)
+
+    async def publish(self, channel, message):
+        await self._redis.publish(channel, message)
+
+    async def subscribe(self, channel, callback):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        self._listeners.append((pubsub, asyncio.ensure_future(self._listen(pubsub, callback))))
+
+    @staticmethod
+    async def _listen(pubsub, callback):
+        while True:
+            try:
+                async for message in pubsub.listen():
+                    data = message.get("data")
+                    callback(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Shared cache subscription lost, retrying: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        for pubsub, task in self._listeners:
+            task.cancel()
+            await pubsub.aclose()
+        self._listeners.clear()
+        await self._redis.aclose()
+
+
+def open_backend(url):
+    """Backend for SHARED_CACHE_URL, or None when unset."""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown SHARED_CACHE_URL scheme: {url}")
+
+
+def _fetched_at(raw):
+    """Fetch time of a stored value; 0 if it can't be read (anything is newer)."""
+    try:
+        return json.loads(raw)["f"]
+    except (ValueError, TypeError, KeyError):
+        return 0
+
+
+class SharedCache:
+    """One namespace of the shared tier: get/set of (data, expires_at, fetched_at)."""
+
+    def __init__(self, backend, namespace, timeout=0.05, invalidate=False, write_timeout=1.0):
+        self.backend = backend
+        self.namespace = namespace
+        self.timeout = timeout  # seconds before a lookup counts as a miss
+        self.write_timeout = write_timeout  # writes are off the request path, so this can be longer
+        self.invalidate = invalidate  # publish newer entries so other processes expire theirs
+        self.channel = f"{namespace}:invalidate"
+        self.origin = uuid.uuid4().hex[:12]  # tells our own invalidations apart
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.writes = 0
+        self.write_errors = 0
+        self.invalidations = 0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    async def _call(self, coro):
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except Exception as e:
+            self.errors += 1
+            if self.errors == 1 or self.errors % 100 == 0:
+                print(f"Shared cache {self.namespace} error ({self.errors} so far): {e!r}")
+            return None
+
+    async def _write(self, coro):
+        """(True, result), or (False, None) once the write has failed or timed out."""
+        try:
+            return True, await asyncio.wait_for(coro, self.write_timeout)
+        except Exception as e:
+            self.write_errors += 1
+            if self.write_errors == 1 or self.write_errors % 100 == 0:
+                print(f"Shared cache {self.namespace} write failed ({self.write_errors} so far): {e!r}")
+            return False, None
+
+    def _decode(self, raw, now):
+        if raw is None:
+            self.misses += 1
+            return None
+        try:
+            entry = json.loads(raw)
+            expires_at, fetched_at, data = entry["e"], entry["f"], entry["d"]
+        except (ValueError, TypeError, KeyError):
+            self.misses += 1
+            return None
+        if expires_at <= now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, expires_at, fetched_at
+
+    async def get(self, key):
+        """(data, expires_at, fetched_at) for a live entry, else None."""
+        return self._decode(await self._call(self.backend.get(self._key(key))), time.time())
+
+    async def get_many(self, keys):
+        """One get() result per key, in a single round trip."""
+        if not keys:
+            return []
+        raw = await self._call(self.backend.mget([self._key(k) for k in keys]))
+        now = time.time()
+        return [self._decode(r, now) for r in (raw or [None] * len(keys))]
+
+    async def set(self, key, data, expires_at, fetched_at):
+        """Store `data` until `expires_at` (epoch seconds). If invalidating and it
+        replaced an entry fetched earlier, publish the key and `fetched_at`."""
+        ttl = expires_at - time.time()
+        if ttl <= 0:
+            return
+        value = dumps({"e": expires_at, "f": fetched_at, "d": data})
+        stored, previous = await self._write(self.backend.set(self._key(key), value, ttl))
+        if not stored:
+            return
+        self.writes += 1
+        if self.invalidate and previous is not None and _fetched_at(previous) < fetched_at:
+            await self._write(self.backend.publish(self.channel, f"{self.origin} {fetched_at} {key}"))
+
+    async def subscribe(self, callback):
+        """Call `callback(key, fetched_at)` when another process stores a newer entry."""
+        def received(message):
+            origin, _, rest = message.partition(" ")
+            fetched_at, _, key = rest.partition(" ")
+            if origin != self.origin:
+                self.invalidations += 1
+                callback(key, float(fetched_at))
+
+        try:
+            await self.backend.subscribe(self.channel, received)
+        except Exception as e:
+            self.errors += 1
+            print(f"Shared cache {self.namespace} subscribe failed: {e!r}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "invalidations": self.invalidations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
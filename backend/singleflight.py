@@ -0,0 +1,83 @@
+"""Request coalescing for concurrent identical upstream fetches.
+
+While a fetch for a key is in flight, later callers for the same key await
+the same task instead of starting their own, and all of them receive its
+result or its exception. do_many() does the same for a batch of keys
+fetched by one call, registering each key on its own, so single-key and
+batch callers share each other's fetches.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Run `fn()` once for `key` and share the outcome with concurrent callers."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.shared += 1
+        # Shield so one caller disconnecting doesn't cancel the fetch for the rest
+        return await asyncio.shield(task)
+
+    async def do_many(self, keys, fn):
+        """Run `fn(missing)` once for the keys not already in flight and share each key's outcome.
+
+        `fn` returns {key: value or exception}. Keys another caller is
+        fetching are awaited instead. Returns {key: value or exception} for
+        every key, like gather(return_exceptions=True).
+        """
+        waiting = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            task = self._inflight.get(key)
+            if task is None:
+                missing.append(key)
+            else:
+                waiting[key] = task
+                self.shared += 1
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in missing}
+            for key, future in futures.items():
+                self._inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self._forget(key, f))
+            batch = asyncio.ensure_future(fn(missing))
+            batch.add_done_callback(lambda t: self._settle(futures, t))
+            waiting.update(futures)
+            self.started += 1
+        outcomes = await asyncio.gather(*(asyncio.shield(t) for t in waiting.values()), return_exceptions=True)
+        return dict(zip(waiting, outcomes))
+
+    @staticmethod
+    def _settle(futures, batch):
+        """Hand each key's share of a finished do_many() call to its future."""
+        if batch.cancelled():
+            for future in futures.values():
+                future.cancel()
+            return
+        error = batch.exception()
+        results = {} if error is not None else batch.result()
+        for key, future in futures.items():
+            value = results.get(key, error or KeyError(key))
+            if isinstance(value, BaseException):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "started": self.started, "shared": self.shared}
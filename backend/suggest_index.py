@@ -0,0 +1,169 @@
+"""Local typeahead index for /api/geocode/suggest.
+
+Place names are kept per state (admin1) in sorted arrays of normalized keys,
+so a prefix query is a bisect plus a short scan rather than a WAN round-trip.
+Every word start of a name is indexed ("east garo hills" also matches "garo").
+A trigram index adds typo tolerance ("bengluru" still finds "Bengaluru").
+
+The index is seeded from the gazetteer and grows with every upstream
+geocoding result the app sees. Seeded places stay; at most `max_learned`
+places learned from upstream are kept, and the one learned (or last seen
+again) longest ago makes way for a new one.
+"""
+import bisect
+import re
+import unicodedata
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+@lru_cache(maxsize=4096)
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    def __init__(self, fuzzy_threshold=0.5, fuzzy_below=3, max_learned=20000):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.fuzzy_below = fuzzy_below  # only go fuzzy when prefix hits are scarce
+        self.max_learned = max_learned
+        self._items = {}  # item id -> suggestion dict, shaped like the endpoint's output
+        self._norm_names = {}  # item id -> normalized name
+        self._seen = {}  # (normalized name, normalized admin1) -> item id
+        self._learned = OrderedDict()  # ids of evictable (upstream) items, oldest first
+        self._next_id = 0
+        self._by_state = defaultdict(list)  # normalized admin1 -> sorted [(key, item_id)]
+        self._grams = defaultdict(set)  # (admin1, trigram) -> item ids
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, name, latitude, longitude, admin1=None, display_name=None, learned=False):
+        """Index a place; `learned` ones (from upstream) count towards `max_learned`."""
+        if not name or latitude is None or longitude is None:
+            return
+        norm = normalize(name)
+        state = normalize(admin1)
+        if not norm:
+            return
+        item_id = self._seen.get((norm, state))
+        if item_id is not None:
+            if item_id in self._learned:
+                self._learned.move_to_end(item_id)
+            return
+        item_id = self._next_id
+        self._next_id += 1
+        self._seen[(norm, state)] = item_id
+        self._items[item_id] = {
+            "name": name,
+            "display_name": display_name or (f"{name}, {admin1}" if admin1 else name),
+            "latitude": latitude,
+            "longitude": longitude,
+            "admin1": admin1,
+        }
+        self._norm_names[item_id] = norm
+        keys = self._by_state[state]
+        for key in self._word_keys(norm):
+            bisect.insort(keys, (key, item_id))
+        for gram in trigrams(norm):
+            self._grams[(state, gram)].add(item_id)
+        if learned:
+            self._learned[item_id] = None
+            if len(self._learned) > self.max_learned:
+                self._evict(next(iter(self._learned)))
+
+    @staticmethod
+    def _word_keys(norm):
+        """The name from each word start on ("east garo hills", "garo hills", "hills")."""
+        for match in re.finditer(r"\b", norm):
+            start = match.start()
+            if start < len(norm) and norm[start] != " ":
+                yield norm[start:]
+
+    def _evict(self, item_id):
+        del self._learned[item_id]
+        norm = self._norm_names.pop(item_id)
+        state = normalize(self._items.pop(item_id)["admin1"])
+        del self._seen[(norm, state)]
+        keys = self._by_state[state]
+        for key in self._word_keys(norm):
+            del keys[bisect.bisect_left(keys, (key, item_id))]
+        if not keys:
+            del self._by_state[state]
+        for gram in trigrams(norm):
+            ids = self._grams[(state, gram)]
+            ids.discard(item_id)
+            if not ids:
+                del self._grams[(state, gram)]
+        self.evicted += 1
+
+    def add_results(self, results):
+        """Index Open-Meteo geocoding `results` entries."""
+        for item in results:
+            self.add(item.get("name"), item.get("latitude"), item.get("longitude"), item.get("admin1"), learned=True)
+
+    def stats(self):
+        return {
+            "entries": len(self._items),
+            "learned": len(self._learned),
+            "max_learned": self.max_learned,
+            "evicted": self.evicted,
+        }
+
+    def _states(self, state):
+        """Indexed admin1 keys matching `state` with the endpoint's substring rule."""
+        wanted = normalize(state)
+        if not wanted:
+            return list(self._by_state)
+        return [s for s in self._by_state if wanted in s or (s and s in wanted)]
+
+    def search(self, q, state=None, limit=10):
+        query = normalize(q)
+        if not query:
+            return []
+        states = self._states(state)
+        found = []
+        seen = set()
+        for s in states:
+            keys = self._by_state[s]
+            i = bisect.bisect_left(keys, (query, -1))
+            while i < len(keys) and keys[i][0].startswith(query):
+                item_id = keys[i][1]
+                if item_id not in seen:
+                    seen.add(item_id)
+                    # Whole-name prefix matches rank above mid-name word matches
+                    found.append((0 if self._norm_names[item_id].startswith(query) else 1, item_id))
+                i += 1
+        if len(found) < self.fuzzy_below and len(query) >= 4:
+            found.extend(self._fuzzy(query, states, seen))
+        found.sort(key=lambda f: (f[0], len(self._norm_names[f[1]]), self._norm_names[f[1]]))
+        return [dict(self._items[item_id]) for _, item_id in found[:limit]]
+
+    def _fuzzy(self, query, states, seen):
+        query_grams = trigrams(query)
+        counts = defaultdict(int)
+        for state in states:
+            for gram in query_grams:
+                for item_id in self._grams.get((state, gram), ()):
+                    counts[item_id] += 1
+        matches = []
+        # Require about half the query's trigrams before scoring a candidate
+        needed = max(1, len(query_grams) // 2)
+        for item_id, shared in counts.items():
+            if shared < needed or item_id in seen:
+                continue
+            # Compare against the name prefix of the same length as the query
+            head = self._norm_names[item_id][:len(query) + 1]
+            score = len(query_grams & trigrams(head)) / len(query_grams)
+            if score >= self.fuzzy_threshold:
+                matches.append((2 + (1 - score), item_id))
+        return matches
@@ -0,0 +1,64 @@
+"""Shared fixtures for the in-process test suite.
+
+Run from backend/ with `python -m pytest tests` (no server or network needed;
+the test_*.py scripts next to main.py still target a running server).
+
+Async tests use the anyio pytest plugin, which ships with httpx: a module
+sets `pytestmark = pytest.mark.anyio` and writes `async def test_...`.
+The `app` fixture imports a fresh copy of main with throwaway state (memory
+geocode store, data under tmp_path, no background tasks) and every upstream
+answered by mock_upstreams; `client` calls it over ASGI.
+"""
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import http_clients  # noqa: E402
+from mock_upstreams import MockUpstreams  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def upstream():
+    return MockUpstreams(latency=0, jitter=0)
+
+
+@pytest.fixture
+async def app(monkeypatch, tmp_path, upstream):
+    for name, value in {
+        "DATA_DIR": str(tmp_path),
+        "GEOCODE_STORE": "memory",
+        "GAZETTEER_FILE": str(tmp_path / "gazetteer.json"),
+        "HISTORY_ENABLED": "0",
+        "PREFETCH_ENABLED": "0",
+        "ALERTS_ENABLED": "0",
+    }.items():
+        monkeypatch.setenv(name, value)
+    # Breakers and limiters outlive clients; start each test with fresh ones
+    monkeypatch.setattr(http_clients, "_breakers", {})
+    monkeypatch.setattr(http_clients, "_limiters", {})
+    sys.modules.pop("main", None)
+    import main
+
+    http_clients.open_clients(transport=upstream.transport())
+    try:
+        yield main
+    finally:
+        await main.GEOCODE_CACHE.flush()
+        await main.NOMINATIM.close()
+        await http_clients.close_clients()
+        sys.modules.pop("main", None)
+
+
+@pytest.fixture
+async def client(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://test") as c:
+        yield c
@@ -0,0 +1,77 @@
+"""Threshold rules over hourly forecasts (alerts.py)."""
+import pytest
+
+import alerts
+from alerts import AlertEngine, AlertRule
+
+pytestmark = pytest.mark.anyio
+
+PLACES = [("Kerala", "Kochi", 10.0, 76.3), ("Kerala", "Idukki", 9.9, 77.1), ("Punjab", "Amritsar", 31.6, 74.9)]
+HOURS = [f"2026-06-01T{h:02d}:00" for h in range(6)]
+
+
+def forecast(temperature, wind=None):
+    return {"hourly": {"time": HOURS, "temperature_2m": temperature, "wind_speed_10m": wind or [0] * 6}}
+
+
+PAYLOADS = [
+    forecast([30, 36, 41, 38, 30, 29]),             # heat peaks into extreme heat
+    forecast([20, 21, 22, None, 21, 20]),           # calm; a missing hour is ignored
+    forecast([3, 4, 10, 12, 11, 10], [30, 30, 26, 10, 5, 5]),  # cold, windy for 3 hours
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(alerts, "np", None)
+    elif alerts.np is None:
+        pytest.skip("numpy not installed")
+    places = list(PLACES)
+
+    async def fetch_many(coords):
+        assert coords == [(p[2], p[3]) for p in places]
+        return PAYLOADS
+
+    return AlertEngine(alerts.DEFAULT_RULES, lambda: places, fetch_many, hours=6)
+
+
+async def test_refresh_groups_by_state(engine):
+    await engine.refresh()
+    (kochi,) = engine.for_state("kerala")
+    assert kochi["district"] == "Kochi"
+    # Heat advisory and extreme heat share a group; only the more severe one is kept
+    assert [(a["id"], a["hours"], a["peak"], a["start"], a["end"]) for a in kochi["alerts"]] == [
+        ("extreme_heat", 1, 41.0, HOURS[2], HOURS[2]),
+    ]
+    (amritsar,) = engine.for_state(" PUNJAB ")
+    assert [a["id"] for a in amritsar["alerts"]] == ["cold", "windy"]
+    assert len(engine.for_state()) == 2 and engine.for_state("Goa") == []
+    assert engine.stats()["places"] == 3 and engine.expires_in() > 0
+
+
+async def test_min_hours(engine):
+    engine.rules = [AlertRule("warm", "Warm", "temperature_2m", 36, min_hours=3)]
+    await engine.refresh()
+    assert [d["district"] for d in engine.for_state()] == ["Kochi"]
+    engine.rules[0].min_hours = 4
+    await engine.refresh()
+    assert engine.for_state() == []
+
+
+async def test_failed_fetches_are_skipped(engine):
+    async def fetch_many(coords):
+        return [PAYLOADS[0], RuntimeError("chunk failed"), PAYLOADS[2]]
+
+    engine.fetch_many = fetch_many
+    await engine.refresh()
+    assert [d["district"] for d in engine.for_state()] == ["Kochi", "Amritsar"]
+    assert engine.stats()["unavailable"] == 1
+
+    async def all_failed(coords):
+        return [RuntimeError("upstream down")] * len(coords)
+
+    engine.fetch_many = all_failed
+    with pytest.raises(RuntimeError):
+        await engine.refresh()
+    assert len(engine.for_state()) == 2  # the previous results stay up
@@ -0,0 +1,78 @@
+"""Multi-location forecasts: /api/weather/batch and fetch_forecasts (main.py)."""
+import asyncio
+
+import httpx
+import pytest
+
+from mock_upstreams import MockUpstreams
+
+pytestmark = pytest.mark.anyio
+
+
+class FlakyUpstreams(MockUpstreams):
+    """Fails any forecast call that includes a latitude in `fail_lats`."""
+
+    def __init__(self):
+        super().__init__(latency=0, jitter=0)
+        self.fail_lats = set()
+
+    async def handle(self, request):
+        lats = request.url.params.get("latitude", "").split(",")
+        if request.url.path == "/v1/forecast" and self.fail_lats.intersection(map(float, filter(None, lats))):
+            self.calls["open-meteo"] += 1
+            return httpx.Response(500, json={"error": "injected failure"})
+        return await super().handle(request)
+
+
+@pytest.fixture
+def upstream():
+    return FlakyUpstreams()
+
+
+COORDS = [(10.0, 70.0), (11.0, 71.0), (12.0, 72.0), (13.0, 73.0)]
+
+
+async def test_failed_chunk_keeps_the_rest(app, client, upstream, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CHUNK_SIZE", 2)
+    upstream.fail_lats.add(12.0)
+    response = await client.post("/api/weather/batch", json={
+        "locations": [{"lat": lat, "lon": lon} for lat, lon in COORDS],
+    })
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [("error" in r) for r in results] == [False, False, True, True]
+    assert results[2]["latitude"] == 12.0 and "500" in results[2]["error"]
+    assert upstream.calls["open-meteo"] == 2
+
+
+async def test_all_chunks_failed_is_an_error(app, client, upstream):
+    upstream.fail_lats.update(lat for lat, _ in COORDS)
+    response = await client.post("/api/weather/batch", json={"locations": [{"lat": 10.0, "lon": 70.0}]})
+    assert response.status_code == 502
+
+
+async def test_fetch_forecasts_returns_errors_in_place(app, upstream, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_CHUNK_SIZE", 1)
+    upstream.fail_lats.add(11.0)
+    payloads = await app.fetch_forecasts(COORDS[:3] + COORDS[:1])
+    assert isinstance(payloads[1], httpx.HTTPStatusError)
+    assert [p["latitude"] for i, p in enumerate(payloads) if i != 1] == [10.0, 12.0, 10.0]
+
+
+async def test_concurrent_callers_share_fetches(app, client, upstream):
+    upstream.defaults["latency"] = 0.1
+    locations = [{"lat": lat, "lon": lon} for lat, lon in COORDS]
+    first = asyncio.ensure_future(client.post("/api/weather/batch", json={"locations": locations}))
+    while app.INFLIGHT.stats()["in_flight"] < len(COORDS):
+        await asyncio.sleep(0.005)
+    others = await asyncio.gather(
+        client.post("/api/weather/batch", json={"locations": locations[1:]}),
+        client.get("/api/weather/current", params={"lat": 12.0, "lon": 72.0}),
+        app.fetch_forecasts(COORDS[:2], record=False),
+    )
+    responses = [await first, *others[:2]]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert responses[1].json()["results"] == responses[0].json()["results"][1:]
+    assert [p["latitude"] for p in others[2]] == [10.0, 11.0]
+    assert upstream.calls["open-meteo"] == 1
+    assert app.INFLIGHT.stats()["shared"] == 3 + 1 + 2
@@ -0,0 +1,61 @@
+"""Conditional GET: ETag / If-None-Match on the weather endpoints (conditional.py)."""
+import time
+
+import pytest
+
+from conditional import etag_matches, make_etag
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = {"lat": 10.0, "lon": 70.0}
+
+
+def seed(app, observed, temperature=20.0):
+    """Cache a fresh forecast observed at `observed` for PARAMS."""
+    key = app.FORECAST_CACHE.key(PARAMS["lat"], PARAMS["lon"], app.FORECAST_PARAMS)
+    data = {"current": {"time": observed, "temperature_2m": temperature}}
+    app.FORECAST_CACHE.set(key, data, expires_at=time.time() + 600)
+
+
+def test_etag_matching():
+    etag = make_etag("2026-06-01T09:45", 10.0, 70.0)
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('W/"other"', etag)
+
+
+async def test_repeat_poll_is_not_modified(app, client, upstream):
+    seed(app, "2026-06-01T09:45")
+    first = await client.get("/api/weather/current", params=PARAMS)
+    etag = first.headers["ETag"]
+    max_age = int(first.headers["Cache-Control"].rsplit("=", 1)[1])
+    assert first.status_code == 200 and 0 < max_age <= 600
+
+    repeat = await client.get("/api/weather/current", params=PARAMS, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert repeat.headers["ETag"] == etag
+    assert upstream.calls["open-meteo"] == 0
+
+
+async def test_new_observation_changes_etag(app, client):
+    seed(app, "2026-06-01T09:45")
+    etag = (await client.get("/api/weather/current", params=PARAMS)).headers["ETag"]
+    seed(app, "2026-06-01T10:00", temperature=21.0)
+    response = await client.get("/api/weather/current", params=PARAMS, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["temperature_c"] == 21.0
+    assert response.headers["ETag"] != etag
+
+
+async def test_etag_covers_response_shape(app, client):
+    seed(app, "2026-06-01T09:45")
+    rows = await client.get("/api/weather/hourly", params=PARAMS)
+    columnar = await client.get("/api/weather/hourly", params={**PARAMS, "format": "columnar"})
+    assert rows.headers["ETag"] != columnar.headers["ETag"]
+    response = await client.get(
+        "/api/weather/hourly", params={**PARAMS, "format": "columnar"}, headers={"If-None-Match": rows.headers["ETag"]}
+    )
+    assert response.status_code == 200
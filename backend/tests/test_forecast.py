@@ -0,0 +1,54 @@
+"""Forecast cache reads: stale-while-revalidate and stale-if-error (main.py)."""
+import asyncio
+import time
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+OLD = {"current": {"time": "2026-06-01T09:45", "temperature_2m": 20.0}}
+
+
+def seed(app, expired_for, lat=10.0, lon=70.0):
+    """Cache OLD for lat/lon as an entry that expired `expired_for` seconds ago."""
+    key = app.FORECAST_CACHE.key(lat, lon, app.FORECAST_PARAMS)
+    now = time.time()
+    app.FORECAST_CACHE.set(key, OLD, expires_at=now - expired_for, fetched_at=now - expired_for - 900)
+    return key
+
+
+async def test_fresh_entry_skips_upstream(app, upstream):
+    first = await app.fetch_forecast(10.0, 70.0)
+    assert await app.fetch_forecast(10.0, 70.0) is first
+    assert upstream.calls["open-meteo"] == 1
+
+
+async def test_recently_expired_is_served_while_refreshing(app, client, upstream):
+    key = seed(app, expired_for=60)
+    response = await client.get("/api/weather/current", params={"lat": 10.0, "lon": 70.0})
+    body = response.json()
+    assert body["stale"] is True and body["age_seconds"] >= 960 and body["temperature_c"] == 20.0
+    assert response.headers["Cache-Control"] == "public, max-age=0"
+    await asyncio.gather(*app.BACKGROUND_TASKS)
+    assert upstream.calls["open-meteo"] == 1
+    assert app.FORECAST_CACHE.get(key)["current"]["time"] != OLD["current"]["time"]
+    assert "stale" not in (await client.get("/api/weather/current", params={"lat": 10.0, "lon": 70.0})).json()
+
+
+async def test_older_entry_only_on_upstream_error(app, client, upstream):
+    seed(app, expired_for=app.FORECAST_STALE_WHILE_REVALIDATE + 60)
+    upstream.overrides["open-meteo"] = {"error_rate": 1.0}
+    response = await client.get("/api/weather/current", params={"lat": 10.0, "lon": 70.0})
+    assert response.status_code == 200 and response.json()["stale"] is True
+    assert upstream.calls["open-meteo"] == 1
+
+    upstream.overrides.clear()
+    seed(app, expired_for=app.FORECAST_STALE_WHILE_REVALIDATE + 60)
+    assert "stale_age" not in await app.fetch_forecast(10.0, 70.0)  # upstream is back: fetched, not stale
+
+
+async def test_too_old_to_serve(app, client, upstream):
+    seed(app, expired_for=app.FORECAST_STALE_IF_ERROR + 60)
+    upstream.overrides["open-meteo"] = {"error_rate": 1.0}
+    response = await client.get("/api/weather/current", params={"lat": 10.0, "lon": 70.0})
+    assert response.status_code == 502
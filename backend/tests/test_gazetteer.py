@@ -0,0 +1,48 @@
+"""Building and loading the offline gazetteer (gazetteer.py)."""
+import json
+import sys
+
+import pytest
+
+import gazetteer
+import http_clients
+from gazetteer import Gazetteer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def states_file(tmp_path, monkeypatch):
+    path = tmp_path / "indianStates.json"
+    path.write_text(json.dumps([{"state": "Kerala", "districts": ["Ernakulam", "Idukki"]}]), encoding="utf-8")
+    monkeypatch.setattr(gazetteer, "STATES_FILE", path)
+    return path
+
+
+async def test_build_then_load(tmp_path, states_file, upstream, monkeypatch):
+    monkeypatch.setattr(http_clients, "_breakers", {})
+    monkeypatch.setattr(http_clients, "_limiters", {})
+    monkeypatch.delitem(sys.modules, "main", raising=False)
+    http_clients.open_clients(transport=upstream.transport())
+    out = tmp_path / "gazetteer.json"
+    assert await gazetteer.build(out, pause=0) == []
+    assert "main" not in sys.modules  # the app (and its stores) stay unopened
+
+    loaded = Gazetteer.load(out)
+    assert len(loaded) == 3 and loaded.source_digest == gazetteer._file_digest(states_file)
+    lat, lon, name = loaded.lookup(" kerala ", "IDUKKI")
+    assert (lat, lon) == upstream.places.coords("Idukki", "Kerala") and name == "Idukki, Kerala, India"
+    assert loaded.lookup("Kerala") is not None and loaded.lookup("Kerala", "Kochi") is None
+
+    # A rebuild only resolves what's missing
+    upstream.reset()
+    http_clients.open_clients(transport=upstream.transport())
+    assert await gazetteer.build(out, pause=0) == []
+    assert sum(upstream.calls.values()) == 0
+
+
+def test_version_mismatch_is_ignored(tmp_path):
+    path = tmp_path / "gazetteer.json"
+    path.write_text(json.dumps({"version": gazetteer.GAZETTEER_VERSION + 1, "entries": [["Goa", None, 15, 74, "Goa"]]}))
+    assert len(Gazetteer.load(path)) == 0
+    assert len(Gazetteer.load(tmp_path / "missing.json")) == 0
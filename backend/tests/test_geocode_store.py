@@ -0,0 +1,57 @@
+"""SQLite and in-memory geocode stores (geocode_store.py)."""
+import pytest
+
+from geocode_store import MemoryGeocodeStore, SqliteGeocodeStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteGeocodeStore(tmp_path / "geocode.sqlite3", memo_size=2)
+    yield store
+    store.close()
+
+
+async def test_row_count_tracks_writes(store, tmp_path):
+    store.set("a", {"latitude": 1.0})
+    store.set("b", {"latitude": 2.0})
+    await store.flush()
+    store.set("a", {"latitude": 3.0})  # replacing a row doesn't add one
+    await store.flush()
+    assert store.stats()["size"] == len(store) == 2
+    reopened = SqliteGeocodeStore(tmp_path / "geocode.sqlite3")
+    assert len(reopened) == 2
+    assert await reopened.get("a") == {"latitude": 3.0}
+    reopened.close()
+
+
+async def test_set_returns_before_the_write(store, tmp_path):
+    store.set("a", {"latitude": 1.0})
+    assert store.stats()["pending_writes"] == 1
+    assert await store.get("a") == {"latitude": 1.0}  # served from the memo meanwhile
+    await store.flush()
+    assert store.stats()["pending_writes"] == 0
+    other = SqliteGeocodeStore(tmp_path / "geocode.sqlite3")  # e.g. another worker
+    assert await other.get("a") == {"latitude": 1.0}
+    other.close()
+
+
+async def test_memo_is_lru(store):
+    for key in "abc":
+        store.set(key, {"key": key})
+    await store.flush()
+    assert list(store._memo) == ["b", "c"]
+    assert await store.get("b") == {"key": "b"}  # now most recent
+    assert await store.get("a") == {"key": "a"}  # evicted from the memo, read from SQLite
+    assert list(store._memo) == ["b", "a"]
+    assert await store.get("missing") is None
+    assert store.stats()["hits"] == 2 and store.stats()["misses"] == 1
+
+
+async def test_memory_store_is_bounded():
+    store = MemoryGeocodeStore(memo_size=2)
+    for key in "abc":
+        store.set(key, {"key": key})
+    await store.flush()
+    assert len(store) == 2 and await store.get("a") is None
@@ -0,0 +1,104 @@
+"""Memory-mapped observation history (history_store.py)."""
+import pytest
+
+from history_store import HistoryStore
+
+VARS = ["temperature_2m", "weather_code"]
+T0 = 1_780_000_000 - 1_780_000_000 % 3600  # on the hour
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def open_store(**kwargs):
+        options = {"variables": VARS, "raw_capacity": 4, "hourly_capacity": 3, "max_locations": 2, **kwargs}
+        store = HistoryStore(tmp_path / "history.bin", **options)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def observe(store, lat, lon, epoch, temperature, code=0):
+    return store.append(lat, lon, epoch, {"temperature_2m": temperature, "weather_code": code})
+
+
+def test_raw_ring_wraps(open_store):
+    store = open_store()
+    for i in range(6):
+        assert observe(store, 10.0, 70.0, T0 + i * 900, float(i))
+    rows = store.query(10.0, 70.0, 0, T0 + 86400)
+    assert rows["time"] == [T0 + i * 900 for i in range(2, 6)]
+    assert rows["temperature_2m"] == [2.0, 3.0, 4.0, 5.0]
+    # Range bounds are binary-searched across the wrap point
+    assert store.query(10.0, 70.0, T0 + 3 * 900, T0 + 5 * 900)["time"] == [T0 + 2700, T0 + 3600]
+
+
+def test_older_observations_are_skipped(open_store):
+    store = open_store()
+    assert observe(store, 10.0, 70.0, T0 + 900, 20.0)
+    assert not observe(store, 10.0, 70.0, T0 + 900, 21.0)
+    assert not observe(store, 10.0, 70.0, T0, 22.0)
+    assert store.query(10.0, 70.0, 0, T0 + 3600)["temperature_2m"] == [20.0]
+    assert store.stats()["skipped"] == 2
+
+
+def test_hourly_ring_wraps(open_store):
+    store = open_store()
+    for i in range(4):
+        observe(store, 10.0, 70.0, T0 + i * 900, 10.0 * (i + 1))
+    for hour in range(1, 4):
+        observe(store, 10.0, 70.0, T0 + hour * 3600, 40.0 + hour)
+    rows = store.query(10.0, 70.0, 0, T0 + 86400, resolution="hourly")
+    # Three hours are kept; the first (the mean of four observations) has rotated out
+    assert rows["time"] == [T0 + h * 3600 for h in (1, 2, 3)]
+    assert rows["temperature_2m"] == [41.0, 42.0, 43.0]
+
+
+def test_hourly_mean_and_last_value(open_store):
+    store = open_store()
+    for i, (temperature, code) in enumerate([(10.0, 1), (20.0, 3), (None, 61), (30.0, 2)]):
+        observe(store, 10.0, 70.0, T0 + i * 900, temperature, code)
+    rows = store.query(10.0, 70.0, 0, T0 + 3600, resolution="hourly")
+    assert rows["time"] == [T0]
+    assert rows["temperature_2m"] == [20.0]  # missing values don't drag the mean
+    assert rows["weather_code"] == [2]  # codes keep the latest value, as an int
+
+
+def test_least_recent_location_is_evicted(open_store):
+    store = open_store()
+    observe(store, 10.0, 70.0, T0 + 900, 1.0)
+    observe(store, 11.0, 71.0, T0, 2.0)
+    observe(store, 12.0, 72.0, T0 + 1800, 3.0, code=0)
+    assert store.query(11.0, 71.0, 0, T0 + 3600) is None
+    assert store.query(12.0, 72.0, 0, T0 + 3600)["temperature_2m"] == [3.0]  # fresh slot, no leftovers
+    assert store.query(10.0, 70.0, 0, T0 + 3600)["temperature_2m"] == [1.0]
+    assert store.stats()["evicted"] == 1 and store.stats()["locations"] == 2
+
+
+def test_layout_change_moves_old_file_aside(open_store, tmp_path):
+    store = open_store()
+    observe(store, 10.0, 70.0, T0, 1.0)
+    store.close()
+    reopened = open_store(variables=VARS + ["wind_speed_10m"])
+    assert (tmp_path / "history.bin.old").exists()
+    assert reopened.query(10.0, 70.0, 0, T0 + 3600) is None
+    observe(reopened, 10.0, 70.0, T0, 1.0)
+    assert reopened.query(10.0, 70.0, 0, T0 + 3600)["wind_speed_10m"] == [None]
+
+
+def test_other_workers_locations_without_rescanning_on_every_miss(open_store, monkeypatch):
+    writer, reader = open_store(), open_store()
+    observe(writer, 10.0, 70.0, T0, 1.0)
+    assert reader.query(10.0, 70.0, 0, T0 + 3600)["temperature_2m"] == [1.0]
+    scans = []
+    monkeypatch.setattr(reader, "_scan", lambda real=reader._scan: scans.append(1) or real())
+    for _ in range(3):
+        assert reader.query(20.0, 80.0, 0, T0 + 3600) is None
+    assert scans == []  # the location table hasn't changed since the last scan
+    observe(writer, 20.0, 80.0, T0, 2.0)
+    assert reader.query(20.0, 80.0, 0, T0 + 3600)["temperature_2m"] == [2.0]
+    assert scans == [1]
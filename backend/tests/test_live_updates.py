@@ -0,0 +1,44 @@
+"""Server-push forecast updates (live_updates.py) and the poller's fetch path."""
+import asyncio
+import time
+
+import pytest
+
+from live_updates import LiveHub
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_pushes_only_new_versions():
+    versions = ["10:00", "10:00", "10:15"]
+
+    async def fetch(key):
+        return {"time": versions[min(hub.polls, len(versions)) - 1]}
+
+    hub = LiveHub(fetch, version=lambda d: d["time"], next_poll=lambda key: 0, min_interval=0.01)
+    subs = [hub.subscribe(["a"]), hub.subscribe(["a"])]
+    while hub.polls < 4:
+        await asyncio.sleep(0.01)
+    assert hub.stats()["locations"] == 1 and hub.stats()["subscribers"] == 2
+    for sub in subs:
+        hub.unsubscribe(sub)
+        assert [sub.queue.get_nowait()[1]["time"] for _ in range(sub.queue.qsize())] == ["10:00", "10:15"]
+    assert hub.stats()["locations"] == 0 and hub.pushes == 4
+    await hub.close()
+
+
+async def test_poll_is_not_demand_and_skips_stale_copy(app, upstream, monkeypatch):
+    monkeypatch.setattr(app, "FORECAST_STALE_WHILE_REVALIDATE", 600)
+    key = app.FORECAST_CACHE.key(10.0, 70.0, app.FORECAST_PARAMS)
+    app.FORECAST_CACHE.set(key, {"current": {"time": "old"}}, expires_at=time.time() - 5, fetched_at=time.time() - 900)
+    sub = app.LIVE_UPDATES.subscribe([key])
+    _, data = await asyncio.wait_for(sub.queue.get(), 1)
+    app.LIVE_UPDATES.unsubscribe(sub)
+    # The poller waited for the refresh instead of pushing the expired copy
+    assert data["current"]["time"] != "old" and "stale_age" not in data
+    assert upstream.calls["open-meteo"] == 1
+    assert app.PREFETCH.hot.top(10) == []
+    # An ordinary request for the same key still counts
+    await app.fetch_forecast(10.0, 70.0)
+    assert app.PREFETCH.hot.top(10) == [key]
+    await app.LIVE_UPDATES.close()
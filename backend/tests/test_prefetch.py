@@ -0,0 +1,78 @@
+"""Background prefetch of hot forecast keys (prefetch.py)."""
+import time
+
+import pytest
+
+from prefetch import HotKeys, PrefetchScheduler
+
+pytestmark = pytest.mark.anyio
+
+PARAMS = (("current", "temperature_2m"),)
+
+
+class Cache:
+    """Stand-in for ForecastCache.expires_in()."""
+
+    def __init__(self, expiring=()):
+        self.expiring = set(expiring)
+
+    def expires_in(self, key):
+        return 10 if key in self.expiring else 600
+
+
+def keys(n, params=PARAMS):
+    return [(10.0 + i, 70.0, params) for i in range(n)]
+
+
+def test_hot_keys_rank_and_window():
+    hot = HotKeys(window=900)
+    a, b = keys(2)
+    for _ in range(3):
+        hot.record(a)
+    hot.record(b)
+    assert hot.top(1) == [a] and hot.recent(a) == 3 and hot.recent(b) == 1
+
+    hot._window_started -= 900  # one window later: still counted as the previous window
+    assert hot.recent(a) == 3
+    hot._window_started -= 900
+    assert hot.recent(a) == 0
+    assert hot.top(2) == [a, b]  # the decaying score is separate
+
+
+def test_due_needs_recent_demand_and_near_expiry():
+    a, b, c = keys(3)
+    scheduler = PrefetchScheduler(Cache(expiring=[a, b]), None, min_requests=2)
+    for key in (a, a, b, c, c):
+        scheduler.record(key)
+    # b was asked for only once; c isn't close to expiry
+    assert scheduler.due() == {PARAMS: [a]}
+
+
+async def test_run_once_chunks_within_call_budget():
+    hot = keys(7)
+    calls = []
+
+    async def fetch_chunks(chunk, params):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise RuntimeError("upstream down")
+        return {key: {} for key in chunk}
+
+    scheduler = PrefetchScheduler(Cache(expiring=hot), fetch_chunks, chunk_size=2, max_calls=3, min_requests=1)
+    for key in hot:
+        scheduler.record(key)
+    await scheduler.run_once()
+    assert [len(chunk) for chunk in calls] == [2, 2, 2]
+    assert scheduler.stats() == {"tracked": 7, "cycles": 1, "refreshed": 4, "errors": 1}
+
+
+async def test_refreshes_expiring_forecast(app, upstream):
+    key = app.FORECAST_CACHE.key(10.0, 70.0, app.FORECAST_PARAMS)
+    now = time.time()
+    app.FORECAST_CACHE.set(key, {"current": {"time": "2026-06-01T09:45"}}, expires_at=now + 10, fetched_at=now - 890)
+    app.PREFETCH.record(key)
+    app.PREFETCH.record(key)
+    await app.PREFETCH.run_once()
+    assert upstream.calls["open-meteo"] == 1
+    assert app.FORECAST_CACHE.expires_in(key) > app.PREFETCH.lead
+    assert app.PREFETCH.stats()["refreshed"] == 1
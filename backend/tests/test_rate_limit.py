@@ -0,0 +1,35 @@
+"""Queue deadlines of the Nominatim token-bucket dispatcher (rate_limit.py)."""
+import asyncio
+
+import pytest
+
+from rate_limit import QueueTimeout, TokenBucketDispatcher
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def dispatcher():
+    d = TokenBucketDispatcher("test", rate=1, burst=1, max_wait=0.05)
+    yield d
+    await d.close()
+
+
+async def test_slow_call_outlives_deadline(dispatcher):
+    # max_wait bounds time spent queued, not the upstream call itself
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "done"
+
+    assert await dispatcher.submit(slow) == "done"
+    assert dispatcher.stats()["expired"] == 0
+
+
+async def test_queued_call_expires(dispatcher):
+    async def quick():
+        return "done"
+
+    assert await dispatcher.submit(quick) == "done"  # spends the only token
+    with pytest.raises(QueueTimeout):
+        await dispatcher.submit(quick)
+    assert dispatcher.stats()["expired"] == 1
@@ -0,0 +1,86 @@
+"""AIMD limiter slot accounting and upstream rejections (resilience.py)."""
+import asyncio
+
+import httpx
+import pytest
+
+from resilience import AIMDLimiter, CircuitBreaker, GuardedTransport, UpstreamUnavailable
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowTransport(httpx.AsyncBaseTransport):
+    """Answers 200 after `delay` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    async def handle_async_request(self, request):
+        await asyncio.sleep(self.delay)
+        return httpx.Response(200, request=request)
+
+
+async def test_cancel_while_waiting():
+    limiter = AIMDLimiter(max_limit=1, max_wait=5.0)
+    assert await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0.01)
+    assert limiter.stats()["queued"] == 1
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    limiter.release(0.1, True)
+    assert limiter.in_flight == 0 and not limiter.stats()["queued"]
+    assert await limiter.acquire()
+
+
+async def test_cancel_after_handoff():
+    # The slot is handed over on release, but the waiter is cancelled before it resumes
+    limiter = AIMDLimiter(max_limit=1, max_wait=5.0)
+    assert await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0.01)
+    limiter.release(0.1, True)
+    waiter.cancel()
+    (acquired,) = await asyncio.gather(waiter, return_exceptions=True)
+    if acquired is True:  # wait_for may return the result instead of raising
+        limiter.release(0.1, None)
+    assert limiter.in_flight == 0
+    assert await limiter.acquire()
+
+
+async def test_cancel_in_flight():
+    limiter = AIMDLimiter(max_limit=2, max_wait=0.1)
+    transport = GuardedTransport("slow", SlowTransport(5.0), CircuitBreaker(), limiter)
+    async with httpx.AsyncClient(transport=transport) as client:
+        tasks = [asyncio.ensure_future(client.get("http://upstream.test/")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert limiter.in_flight == 2
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert limiter.in_flight == 0
+        assert limiter.limit == 2  # a cancelled call says nothing about the upstream
+        transport.transport.delay = 0
+        assert (await client.get("http://upstream.test/")).status_code == 200
+
+
+async def test_saturated_limiter_rejects_with_retry_after():
+    limiter = AIMDLimiter(max_limit=1, max_wait=0.05)
+    transport = GuardedTransport("slow", SlowTransport(5.0), CircuitBreaker(), limiter)
+    async with httpx.AsyncClient(transport=transport) as client:
+        busy = asyncio.ensure_future(client.get("http://upstream.test/"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(UpstreamUnavailable) as rejected:
+            await client.get("http://upstream.test/")
+        assert rejected.value.retry_after >= 1
+        busy.cancel()
+        await asyncio.gather(busy, return_exceptions=True)
+
+
+async def test_open_circuit_is_503_with_retry_after(app, client):
+    breaker = app.http_clients.breaker("open-meteo")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    response = await client.get("/api/weather/current", params={"lat": 10, "lon": 20})
+    assert response.status_code == 503
+    assert 1 <= int(response.headers["Retry-After"]) <= breaker.reset_after
@@ -0,0 +1,69 @@
+"""Expected intents for the rule-based answer engine (rules.py)."""
+from rules import classify, rule_based_answer
+
+# question -> matched intents, in precedence order (the first one answers)
+EXPECTED = {
+    "Will it rain today?": ["rain"],
+    "Do I need an umbrella?": ["rain", "activity"],
+    "is it going to pour this evening": ["rain"],
+    "Any showers expected this afternoon?": ["rain"],
+    "how much rainfall today": ["rain"],
+    "is it drizzling": ["rain"],
+    "how hot is it": ["temperature"],
+    "What's the temperature right now?": ["temperature"],
+    "is it cold outside": ["temperature", "activity"],
+    "will it get warmer later": ["temperature"],
+    "How windy is it?": ["wind"],
+    "is there a breeze near the beach": ["wind"],
+    "what should I wear": ["clothing"],
+    "do I need a jacket tonight": ["clothing", "activity"],
+    "what clothes for office today": ["clothing"],
+    "Is it a good day for a picnic?": ["activity"],
+    "can I go out for a run": ["activity"],
+    "good weather for hiking?": ["activity"],
+    "what can we do this weekend": ["activity"],
+    "is it sunny": ["cloud"],
+    "will it be sunnier tomorrow": ["cloud"],
+    "will the sky be clear tonight": ["cloud"],
+    "what does the sky look like": ["cloud"],
+    "how cloudy is it": ["cloud"],
+    "how humid is it": ["humidity"],
+    "it feels sticky, why?": ["humidity"],
+    "what's the barometric pressure": ["pressure"],
+    "will it rain while I walk the dog": ["rain", "activity"],
+    "cold and windy, what should I wear?": ["temperature", "wind", "clothing"],
+    # More keywords for a later intent don't outrank an earlier one
+    "should I wear a jacket, coat or dress in the rain": ["rain", "clothing"],
+    "windy, gusty, blowing hard - is it warm?": ["temperature", "wind"],
+    "plan a hike, walk or run if it's cloudy": ["activity", "cloud"],
+    # Words that only look like keywords
+    "what time is sunrise": [],
+    "should I open the window": [],
+    "what are you doing": [],
+    "I feel weary": [],
+    "watching planes take off": [],
+    "how's the weather": [],
+    "is it safe to drive": [],
+}
+
+
+def test_intents():
+    wrong = {}
+    for question, expected in EXPECTED.items():
+        got = [intent for intent, _ in classify(question)]
+        if got != expected:
+            wrong[question] = (expected, got)
+    assert not wrong, "\n".join(f"{q!r}: expected {e}, got {g}" for q, (e, g) in wrong.items())
+
+
+
+WEATHER = {"temperature_2m": 31, "precipitation": 0, "wind_speed_10m": 30, "cloud_cover": 80}
+
+
+def test_first_intent_answers():
+    # Same answers as the original first-match chain, whatever the keyword counts
+    rain = rule_based_answer("should I wear a jacket, coat or dress in the rain", WEATHER, {})
+    assert rain["answer"].startswith("No rain expected")
+    warm = rule_based_answer("windy, gusty, blowing hard - is it warm?", WEATHER, {})
+    assert warm["answer"].startswith("The temperature is 31")
+    assert set(rain) == {"answer", "mode", "provenance"}  # the /api/ai/query response shape
@@ -0,0 +1,62 @@
+"""Shared cache tier and cross-process invalidation (shared_cache.py)."""
+import asyncio
+import time
+
+import pytest
+
+from forecast_cache import ForecastCache
+from shared_cache import MemoryBackend, SharedCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_get_many_and_expiry():
+    cache = SharedCache(MemoryBackend(), "forecast")
+    now = time.time()
+    await cache.set("a", {"t": 1}, now + 60, now)
+    await cache.set("gone", {"t": 0}, now - 1, now - 60)  # already expired: not stored
+    assert await cache.get_many(["a", "gone"]) == [({"t": 1}, now + 60, now), None]
+    assert cache.stats()["hits"] == 1 and cache.stats()["writes"] == 1
+
+
+async def test_only_newer_entries_are_published():
+    backend = MemoryBackend()
+    here, there = (SharedCache(backend, "forecast", invalidate=True) for _ in range(2))
+    received = []
+    await here.subscribe(lambda key, fetched_at: received.append((key, fetched_at)))
+    now = time.time()
+    await there.set("a", {"t": 1}, now + 60, now)  # nothing replaced, nothing to invalidate
+    await there.set("a", {"t": 1}, now + 60, now)  # same fetch again
+    await there.set("a", {"t": 2}, now + 60, now + 5)
+    await here.set("a", {"t": 3}, now + 60, now + 10)  # our own message
+    assert received == [("a", now + 5)]
+
+
+async def test_failed_writes_are_counted():
+    class SlowBackend(MemoryBackend):
+        async def set(self, key, value, ttl):
+            await asyncio.sleep(1)
+
+    cache = SharedCache(SlowBackend(), "forecast", write_timeout=0.01)
+    await cache.set("a", {"t": 1}, time.time() + 60, time.time())
+    assert cache.stats()["writes"] == 0 and cache.stats()["write_errors"] == 1
+
+
+def test_expire_keeps_the_stale_copy():
+    cache = ForecastCache(interval=900, max_stale=3600)
+    key = cache.key(10.0, 70.0, {})
+    cache.set(key, {"t": 1}, expires_at=time.time() + 600, fetched_at=100.0)
+    assert not cache.expire(key, fetched_before=100.0)  # ours is as new as theirs
+    assert cache.get(key) == {"t": 1}
+    assert cache.expire(key, fetched_before=200.0)
+    assert cache.get(key) is None
+    data, _, expired_for = cache.get_stale(key)
+    assert data == {"t": 1} and expired_for < 1
+
+
+async def test_invalidation_expires_local_forecast(app):
+    key = app.FORECAST_CACHE.key(10.0, 70.0, app.FORECAST_PARAMS)
+    _, fetched_at = app.FORECAST_CACHE.set(key, {"current": {"time": "10:00"}})
+    app._expire_forecast(app._shared_forecast_key(key), fetched_at + 1)
+    assert app.FORECAST_CACHE.get(key) is None
+    assert app.FORECAST_CACHE.get_stale(key)[0] == {"current": {"time": "10:00"}}
@@ -0,0 +1,108 @@
+"""Request coalescing (singleflight.py)."""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await release.wait()
+        return {"temperature": 20}
+
+    callers = [asyncio.ensure_future(flight.do("k", fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+    assert flight.stats() == {"in_flight": 0, "started": 1, "shared": 4}
+
+    await flight.do("k", fetch)  # finished fetches are not reused
+    assert len(calls) == 2
+
+
+async def test_cancelled_caller_leaves_fetch_running():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "done"
+
+    leaving = asyncio.ensure_future(flight.do("k", fetch))
+    staying = asyncio.ensure_future(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await staying == "done"
+    assert leaving.cancelled()
+
+
+async def test_exception_reaches_every_caller():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        raise RuntimeError("upstream down")
+
+    callers = [asyncio.ensure_future(flight.do("k", fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    outcomes = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(e, RuntimeError) for e in outcomes)
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_do_many_joins_keys_in_flight():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    batches = []
+
+    async def fetch(keys):
+        batches.append(keys)
+        await release.wait()
+        return {key: key.upper() if key != "c" else ValueError(key) for key in keys}
+
+    async def single():
+        await release.wait()
+        return "single"
+
+    one = asyncio.ensure_future(flight.do("a", single))
+    first = asyncio.ensure_future(flight.do_many(["a", "b", "c"], fetch))
+    await asyncio.sleep(0)
+    second = asyncio.ensure_future(flight.do_many(["b", "d", "b"], fetch))
+    await asyncio.sleep(0)
+    release.set()
+    assert await one == "single"
+    first, second = await first, await second
+    assert batches == [["b", "c"], ["d"]]
+    assert first["a"] == "single" and first["b"] == "B" and isinstance(first["c"], ValueError)
+    assert second == {"b": "B", "d": "D"}
+    assert flight.stats() == {"in_flight": 0, "started": 3, "shared": 2}
+
+
+async def test_do_many_failure_reaches_every_key():
+    flight = SingleFlight()
+
+    async def fetch(keys):
+        raise RuntimeError("upstream down")
+
+    outcomes = await flight.do_many(["a", "b"], fetch)
+    assert all(isinstance(e, RuntimeError) for e in outcomes.values())
+
+    async def partial(keys):
+        return {"a": 1}
+
+    outcomes = await flight.do_many(["a", "b"], partial)
+    assert outcomes["a"] == 1 and isinstance(outcomes["b"], KeyError)
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,56 @@
+"""Local typeahead index (suggest_index.py) and /api/geocode/suggest."""
+import pytest
+
+from suggest_index import SuggestIndex
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def index():
+    index = SuggestIndex(max_learned=2)
+    index.add("Bengaluru Urban", 12.97, 77.59, "Karnataka")
+    index.add("East Garo Hills", 25.6, 90.6, "Meghalaya")
+    index.add("Belagavi", 15.85, 74.5, "Karnataka")
+    return index
+
+
+def names(results):
+    return [r["name"] for r in results]
+
+
+def test_prefix_word_and_fuzzy_matches(index):
+    assert names(index.search("be", "Karnataka")) == ["Belagavi", "Bengaluru Urban"]
+    assert names(index.search("garo")) == ["East Garo Hills"]
+    assert names(index.search("bengluru", "karnataka")) == ["Bengaluru Urban"]
+    assert index.search("be", "Meghalaya") == [] and index.search("  ") == []
+
+
+def test_learned_places_are_bounded(index):
+    index.add_results([{"name": "Mysuru", "latitude": 12.3, "longitude": 76.6, "admin1": "Karnataka"},
+                       {"name": "Mandya", "latitude": 12.5, "longitude": 76.9, "admin1": "Karnataka"}])
+    index.add_results([{"name": "Mysuru", "latitude": 12.3, "longitude": 76.6, "admin1": "Karnataka"}])  # seen again
+    index.add_results([{"name": "Tura", "latitude": 25.5, "longitude": 90.2, "admin1": "Meghalaya"}])
+    assert names(index.search("m", "Karnataka")) == ["Mysuru"]  # Mandya was the least recently seen
+    assert names(index.search("tura")) == ["Tura"]
+    assert index.search("mandy") == []  # gone from the trigram index too
+    assert index.stats() == {"entries": 5, "learned": 2, "max_learned": 2, "evicted": 1}
+    assert names(index.search("bel")) == ["Belagavi"]  # seeded places are never evicted
+
+
+async def test_blank_query_is_rejected_locally(app, client, upstream):
+    for q in ("", "   ", "?!"):
+        response = await client.get("/api/geocode/suggest", params={"state": "Kerala", "q": q})
+        assert response.status_code == 400
+    assert upstream.calls["geocoding"] == 0
+    assert app.SUGGEST_UPSTREAM_CACHE.stats()["size"] == 0
+
+
+async def test_upstream_answer_is_cached_and_indexed(app, client, upstream):
+    response = await client.get("/api/geocode/suggest", params={"state": "Kerala", "q": "Idukk"})
+    assert response.status_code == 200
+    assert names(response.json()["suggestions"]) == ["Idukki"]
+    again = await client.get("/api/geocode/suggest", params={"state": "Kerala", "q": " idukk "})
+    assert again.json() == response.json()
+    assert upstream.calls["geocoding"] == 1
+    assert app.SUGGEST_INDEX.stats()["learned"] == 1